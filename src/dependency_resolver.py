@@ -0,0 +1,230 @@
+import re
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from mod_info_parser import LocalMod, BASE_GAME_MOD_IDS
+from vsmoddb.models import Mod, ModRelease, Tag
+
+DEFAULT_RESOLVE_WORKERS = 8
+MAX_LEVELS = 64 # a graph deeper than this is almost certainly picks going back and forth
+VERSION_NUMBER_PATTERN = re.compile(r"\d+")
+ANY_VERSION = ("", "*")
+
+
+def parse_version(version:str) -> tuple:
+    # "1.2.0-rc.1" -> ((1, 2), 0, (1,)), pre-releases sort before the release they lead up to
+    core, _, modifier = version.strip().removeprefix("v").partition("-")
+    numbers = [int(number) for number in VERSION_NUMBER_PATTERN.findall(core)]
+    while len(numbers) > 0 and numbers[-1] == 0:
+        numbers.pop()
+    return (tuple(numbers), 0 if modifier else 1, tuple(int(number) for number in VERSION_NUMBER_PATTERN.findall(modifier)))
+
+def satisfies(version:str, constraint:str, exact:bool = False) -> bool:
+    # modinfo dependencies name the lowest version that works, profiles pin one exact version
+    if constraint is None or constraint.strip() in ANY_VERSION:
+        return True
+    if exact:
+        return version == constraint
+    return parse_version(version) >= parse_version(constraint)
+
+
+class PlannedMod:
+    def __init__(self, mod_id_str:str, release:ModRelease | None, installed:LocalMod | None, dependencies:dict[str, str]):
+        self.mod_id_str = mod_id_str
+        self.release = release # None when the installed version already does
+        self.installed = installed
+        self.dependencies = dependencies
+        self.required_by:dict[str | None, str] = {} # dependent mod id (None for the requested mods) -> version constraint
+
+    @property
+    def action(self) -> str:
+        if self.release is None:
+            return "keep"
+        return "install" if self.installed is None else "update"
+
+    @property
+    def version(self) -> str:
+        return self.release.mod_version if self.release is not None else self.installed.version
+
+    def __repr__(self):
+        return f"{self.action} {self.mod_id_str} {self.version}"
+
+
+class InstallPlan:
+    def __init__(self):
+        self.steps:list[PlannedMod] = [] # dependencies before their dependents
+        self.conflicts:list[str] = []
+        self.missing:list[str] = []
+        self.cycles:list[list[str]] = []
+        self.levels = 0 # breadth first rounds it took, each one a batch of concurrent lookups
+
+    @property
+    def ok(self) -> bool:
+        return len(self.conflicts) == 0 and len(self.missing) == 0
+
+    @property
+    def downloads(self) -> list[ModRelease]:
+        return [step.release for step in self.steps if step.release is not None]
+
+
+class DependencyResolver:
+    # walks the dependency graph one level at a time: every mod first seen on a level is looked up in one batch
+    # (fetch_mods, ie. AsyncModDbClient.get_mod_many) and the dependencies of every release picked on it are read
+    # concurrently (read_dependencies, the modinfo of a release), so the walk costs a few round trips per level
+    # Mod lookups and dependency reads are memoised for the lifetime of the resolver
+    def __init__(
+        self,
+        fetch_mods,
+        read_dependencies,
+        game_version:Tag = None,
+        installed:dict[str, LocalMod] = None,
+        max_workers:int = DEFAULT_RESOLVE_WORKERS,
+    ):
+        self.fetch_mods = fetch_mods # (mod id strings) -> [Mod | Exception] in the same order
+        self.read_dependencies = read_dependencies # (ModRelease) -> {mod id string: lowest version}
+        self.game_version = game_version
+        self.installed = installed if installed is not None else {}
+        self.max_workers = max_workers
+        self.mods:dict[str, Mod | Exception] = {}
+        self.release_dependencies:dict[int, dict[str, str]] = {}
+
+    def candidate_releases(self, mod:Mod) -> list[ModRelease]:
+        # newest first, limited to releases made for the game version when there is one
+        if self.game_version is None:
+            return sorted(mod.releases, key=lambda release: release.created, reverse=True)
+        return [entry["release"] for entry in mod.get_releases_for_version(self.game_version)]
+
+    def fits(self, version:str, constraints:dict[str | None, str], exact:bool) -> bool:
+        # only the requested version itself is pinned, whatever dependents ask for is a lowest version
+        return all(satisfies(version, constraint, exact and dependent is None) for dependent, constraint in constraints.items())
+
+    def installed_fit(self, mod_id_str:str, constraints:dict[str | None, str], exact:bool) -> LocalMod | None:
+        installed = self.installed.get(mod_id_str)
+        if installed is not None and self.fits(installed.version, constraints, exact):
+            return installed
+        return None
+
+    def choose(self, mod_id_str:str, constraints:dict[str | None, str], exact:bool, problems:dict[str, tuple[str, str]]) -> PlannedMod | None:
+        problems.pop(mod_id_str, None)
+        installed = self.installed_fit(mod_id_str, constraints, exact)
+        if installed is not None:
+            return PlannedMod(mod_id_str, None, installed, installed.dependencies)
+
+        mod = self.mods.get(mod_id_str)
+        if mod is None or isinstance(mod, Exception):
+            problems[mod_id_str] = ("missing", mod_id_str)
+            return None
+        candidates = self.candidate_releases(mod)
+        if exact and None in constraints:
+            # a pinned version is installed even when its release isn't tagged for the game version
+            candidates += [release for release in mod.releases if release not in candidates]
+        for release in candidates:
+            if self.fits(release.mod_version, constraints, exact):
+                return PlannedMod(mod_id_str, release, self.installed.get(mod_id_str), None)
+
+        wanted = ", ".join(f"{constraint or 'any'} ({dependent or 'requested'})" for dependent, constraint in constraints.items())
+        game_version = f" for {self.game_version.name}" if self.game_version is not None else ""
+        problems[mod_id_str] = ("conflict", f"No release of {mod_id_str}{game_version} satisfies {wanted}")
+        return None
+
+    def resolve(self, requirements:dict[str, str], exact:bool = False) -> InstallPlan:
+        # requirements are {mod id string: version}, exact pins those versions (profiles) instead of treating them as lowest
+        plan = InstallPlan()
+        problems:dict[str, tuple[str, str]] = {} # mod id string -> (kind, message) for mods without a pick
+        constraints:dict[str, dict[str | None, str]] = {mod_id_str: {None: version} for mod_id_str, version in requirements.items()}
+        chosen:dict[str, PlannedMod | None] = {}
+        level = [mod_id_str for mod_id_str in requirements if mod_id_str not in BASE_GAME_MOD_IDS]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="resolve") as executor:
+            while len(level) > 0:
+                plan.levels += 1
+                if plan.levels > MAX_LEVELS:
+                    plan.conflicts.append(f"Gave up after {MAX_LEVELS} levels, still undecided: {', '.join(level)}")
+                    break
+                to_fetch = [
+                    mod_id_str for mod_id_str in level
+                    if mod_id_str not in self.mods and self.installed_fit(mod_id_str, constraints[mod_id_str], exact) is None
+                ]
+                if len(to_fetch) > 0:
+                    self.mods.update(zip(to_fetch, self.fetch_mods(to_fetch)))
+
+                for mod_id_str in level:
+                    # a node picked again drops the constraints its previous release put on others
+                    previous = chosen.get(mod_id_str)
+                    if previous is not None and previous.dependencies is not None:
+                        for dependency in previous.dependencies:
+                            constraints.get(dependency, {}).pop(mod_id_str, None)
+                    chosen[mod_id_str] = self.choose(mod_id_str, constraints[mod_id_str], exact, problems)
+
+                to_read = [
+                    mod_id_str for mod_id_str in level
+                    if chosen[mod_id_str] is not None and chosen[mod_id_str].dependencies is None
+                    and chosen[mod_id_str].release.release_id not in self.release_dependencies
+                ]
+                releases = [chosen[mod_id_str].release for mod_id_str in to_read]
+                for mod_id_str, release, dependencies in zip(to_read, releases, executor.map(self.read_release_dependencies, releases)):
+                    if dependencies is None:
+                        # not memoised, the next resolve tries again
+                        problems[mod_id_str] = ("conflict", f"Could not read the dependencies of {mod_id_str} {release.mod_version}")
+                        continue
+                    self.release_dependencies[release.release_id] = dependencies
+
+                next_level = []
+                for mod_id_str in level:
+                    planned = chosen[mod_id_str]
+                    if planned is None:
+                        continue
+                    if planned.dependencies is None:
+                        planned.dependencies = self.release_dependencies.get(planned.release.release_id, {})
+                    for dependency, constraint in planned.dependencies.items():
+                        if dependency in BASE_GAME_MOD_IDS or dependency == mod_id_str:
+                            continue
+                        constraints.setdefault(dependency, {})[mod_id_str] = constraint
+                        # unseen mods are looked at next level, seen ones again when their pick no longer fits or there was none
+                        if dependency not in chosen or chosen[dependency] is None or not satisfies(chosen[dependency].version, constraint):
+                            if dependency not in next_level:
+                                next_level.append(dependency)
+                level = next_level
+
+        for mod_id_str, planned in chosen.items():
+            if planned is not None:
+                planned.required_by = constraints.get(mod_id_str, {})
+        # mods only needed by a release that was picked over later are left out, along with their problems
+        reached = self.order([mod_id_str for mod_id_str in requirements if mod_id_str not in BASE_GAME_MOD_IDS], chosen, plan)
+        for mod_id_str, (kind, message) in problems.items():
+            if mod_id_str in reached:
+                (plan.missing if kind == "missing" else plan.conflicts).append(message)
+        return plan
+
+    def read_release_dependencies(self, release:ModRelease) -> dict[str, str] | None:
+        try:
+            dependencies = self.read_dependencies(release)
+        except Exception:
+            print(f"Failed to read the dependencies of {release.mod_id_str} {release.mod_version}")
+            traceback.print_exc()
+            return None
+        return {mod_id_str: version for mod_id_str, version in dependencies.items() if mod_id_str not in BASE_GAME_MOD_IDS}
+
+    def order(self, roots:list[str], chosen:dict[str, PlannedMod | None], plan:InstallPlan) -> set[str]:
+        # depth first post order puts dependencies before dependents, an edge back onto the current path is a cycle
+        visiting:list[str] = []
+        done:set[str] = set()
+        reached:set[str] = set()
+
+        def visit(mod_id_str:str):
+            reached.add(mod_id_str)
+            if mod_id_str in done or chosen.get(mod_id_str) is None:
+                return
+            if mod_id_str in visiting:
+                plan.cycles.append(visiting[visiting.index(mod_id_str):] + [mod_id_str])
+                return
+            visiting.append(mod_id_str)
+            for dependency in chosen[mod_id_str].dependencies or {}:
+                visit(dependency)
+            visiting.pop()
+            done.add(mod_id_str)
+            plan.steps.append(chosen[mod_id_str])
+
+        for mod_id_str in roots:
+            visit(mod_id_str)
+        return reached
@@ -0,0 +1,217 @@
+import os
+import sys
+import mmap
+import struct
+import hashlib
+import threading
+import traceback
+from contextlib import contextmanager
+
+if sys.platform == "win32":
+    import msvcrt
+else:
+    import fcntl
+
+ICON_STORE_FILE = "icons.pack"
+RECORD_HEADER = struct.Struct("<20sI") # sha1 of the icon, length of the icon
+# the pack is rewritten once this share of it holds icons no mod uses anymore
+COMPACT_THRESHOLD = 0.25
+
+_stores:dict[str, "IconStore"] = {}
+_stores_lock = threading.Lock()
+
+
+@contextmanager
+def locked_file(location:str):
+    # the cache folder is shared by every running instance, appends and rewrites of the pack happen under this lock
+    with open(location, 'a+b') as f:
+        if sys.platform == "win32":
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if sys.platform == "win32":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def open_icon_store(location:str) -> "IconStore":
+    # one store per file and process, handles find theirs again through here after being unpickled
+    location = os.path.abspath(location)
+    with _stores_lock:
+        store = _stores.get(location)
+        if store is None:
+            store = _stores[location] = IconStore(location)
+        return store
+
+
+class IconHandle:
+    # what a LocalMod keeps instead of the icon bytes, a few ints that pickle to almost nothing
+    def __init__(self, location:str, offset:int, length:int, digest:bytes):
+        self.location = location
+        self.offset = offset
+        self.length = length
+        self.digest = digest
+
+    def read(self) -> bytes | None:
+        return open_icon_store(self.location).read(self)
+
+    def __eq__(self, other):
+        return isinstance(other, IconHandle) and (self.location, self.offset, self.digest) == (other.location, other.offset, other.digest)
+
+    def __hash__(self):
+        return hash((self.location, self.offset, self.digest))
+
+
+class IconStore:
+    # every mod icon packed into one append only file: [sha1][length][png bytes] per icon, read through a memory map
+    # so icons are only paged in while something draws them, identical icons are stored once
+    # handles find their icon again by digest when the pack was rewritten since they were made, in any process
+    def __init__(self, location:str):
+        self.location = location
+        self.offsets:dict[bytes, tuple[int, int]] = {} # sha1 -> (offset, length)
+        self.size = 0 # end of the last whole record walked
+        self.identity:tuple[int, int] | None = None # (st_dev, st_ino) of the pack the offsets were walked in
+        self._map:mmap.mmap | None = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load_offsets(self):
+        # walks the record headers from the end of the last walk, picking up icons other instances appended since
+        # a record cut short by a crash ends the walk and is overwritten by the next add
+        try:
+            f = open(self.location, 'rb')
+        except FileNotFoundError:
+            self.offsets, self.size, self.identity = {}, 0, None
+            return
+        with f:
+            stat = os.fstat(f.fileno())
+            if self.identity != (stat.st_dev, stat.st_ino) or stat.st_size < self.size:
+                # a different file since the last walk, rewritten or deleted and recreated
+                self.offsets, self.size, self.identity = {}, 0, (stat.st_dev, stat.st_ino)
+            f.seek(self.size)
+            while self.size + RECORD_HEADER.size <= stat.st_size:
+                digest, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                if self.size + RECORD_HEADER.size + length > stat.st_size:
+                    break
+                self.offsets.setdefault(digest, (self.size + RECORD_HEADER.size, length))
+                self.size += RECORD_HEADER.size + length
+                f.seek(self.size)
+
+    def add(self, icon:bytes) -> IconHandle:
+        digest = hashlib.sha1(icon).digest()
+        with self._lock:
+            if digest not in self.offsets:
+                os.makedirs(os.path.dirname(self.location), exist_ok=True)
+                with locked_file(self.location + ".lock"):
+                    self.load_offsets()
+                    if digest not in self.offsets:
+                        self.append(digest, icon)
+            offset, length = self.offsets[digest]
+        return IconHandle(self.location, offset, length, digest)
+
+    def append(self, digest:bytes, icon:bytes):
+        # only called under the file lock right after a walk, so anything past the walked end is a torn record
+        with open(self.location, 'r+b' if os.path.exists(self.location) else 'wb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_dev, stat.st_ino)
+            if stat.st_size != self.size:
+                # pages past the new end must not stay mapped
+                self.close_map()
+                f.truncate(self.size)
+            f.seek(self.size)
+            f.write(RECORD_HEADER.pack(digest, len(icon)))
+            f.write(icon)
+        self.offsets[digest] = (self.size + RECORD_HEADER.size, len(icon))
+        self.size += RECORD_HEADER.size + len(icon)
+
+    def read(self, handle:IconHandle) -> bytes | None:
+        # None once no pack holds the icon anymore
+        with self._lock:
+            try:
+                icon = self.read_at(handle.offset, handle)
+                if icon is None:
+                    self.load_offsets()
+                    if handle.digest not in self.offsets:
+                        return None
+                    offset = self.offsets[handle.digest][0]
+                    icon = self.read_at(offset, handle)
+                    if icon is None:
+                        # still mapping the pack from before a rewrite
+                        self.remap()
+                        icon = self.read_at(offset, handle)
+                return icon
+            except (OSError, ValueError, struct.error):
+                traceback.print_exc()
+                return None
+
+    def read_at(self, offset:int, handle:IconHandle) -> bytes | None:
+        if offset < RECORD_HEADER.size:
+            return None
+        if self._map is None or offset + handle.length > len(self._map):
+            self.remap()
+        if self._map is None or offset + handle.length > len(self._map):
+            return None
+        header = self._map[offset - RECORD_HEADER.size:offset]
+        if RECORD_HEADER.unpack(header) != (handle.digest, handle.length):
+            return None
+        return self._map[offset:offset + handle.length]
+
+    def compact(self, digests:set[bytes]) -> bool:
+        # rewrites the pack with only the given icons once enough of it is dead weight, False when it was left alone
+        # icons another instance added and nothing here knows about are dropped too, its mods go back to their zips
+        with self._lock:
+            if not os.path.exists(self.location):
+                return False
+            with locked_file(self.location + ".lock"):
+                self.load_offsets()
+                kept = sorted((offset, length, digest) for digest, (offset, length) in self.offsets.items() if digest in digests)
+                kept_size = sum(RECORD_HEADER.size + length for _, length, _ in kept)
+                if self.size - kept_size <= self.size * COMPACT_THRESHOLD:
+                    return False
+                temp_location = f"{self.location}.{os.getpid()}.tmp"
+                offsets = {}
+                try:
+                    with open(self.location, 'rb') as source, open(temp_location, 'wb') as target:
+                        for offset, length, digest in kept:
+                            source.seek(offset)
+                            target.write(RECORD_HEADER.pack(digest, length))
+                            offsets[digest] = (target.tell(), length)
+                            target.write(source.read(length))
+                    self.close_map()
+                    os.replace(temp_location, self.location)
+                except BaseException:
+                    if os.path.exists(temp_location):
+                        os.remove(temp_location)
+                    raise
+                stat = os.stat(self.location)
+                self.offsets, self.size, self.identity = offsets, kept_size, (stat.st_dev, stat.st_ino)
+                return True
+
+    def remap(self):
+        # the map covers the file as it was when mapped, icons appended later need a new one
+        self.close_map()
+        if not os.path.exists(self.location) or os.path.getsize(self.location) == 0:
+            return
+        self._file = open(self.location, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close_map(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def clear(self):
+        with self._lock:
+            self.close_map()
+            if os.path.exists(self.location):
+                os.remove(self.location)
+            self.offsets, self.size, self.identity = {}, 0, None
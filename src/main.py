@@ -1,11 +1,17 @@
 import sys
+import time
+startup_time = time.perf_counter()
+
 from vsmoddb.client import ModDbClient
 from vsmoddb.models import SearchOrderBy
 from ui.main_window import RootView
 from ui import user_settings, moddb_client
+from ui.mod_index import downloader
 
 from PySide6.QtWidgets import QMainWindow, QWidget, QApplication
-from PySide6.QtCore import Slot
+from PySide6.QtCore import Slot, QTimer
+
+DEBUG = "--debug" in sys.argv
 
 class MainWindow(QMainWindow):
     def __init__(self, parent: QWidget | None = None):
@@ -15,6 +21,12 @@ class MainWindow(QMainWindow):
         self.setCentralWidget(root_view)
         
         self.setWindowTitle("VS Mod Manager")
+        # whatever earlier sessions left in the mod store without a file linking to it
+        downloader.prune_store()
+
+@Slot()
+def report_startup_time():
+    print(f"Time to first window: {time.perf_counter() - startup_time:.3f}s")
 
 @Slot()
 def shutdown():
@@ -26,6 +38,8 @@ if __name__ == "__main__":
     widget = MainWindow()
     widget.resize(800, 600)  # Set the initial window size
     app.aboutToQuit.connect(shutdown)
+    if DEBUG:
+        QTimer.singleShot(0, report_startup_time) # runs once the event loop has painted the first window
     sys.exit(app.exec())
     
     # testing
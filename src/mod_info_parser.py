@@ -1,15 +1,25 @@
 import os
+import sys
+import copy
 import json
+import pickle
+import threading
 import traceback
-from zipfile import ZipFile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from zipfile import ZipFile, BadZipFile
 
 from vsmoddb.models import Mod, Tag, ModRelease
+from icon_store import IconStore, IconHandle
 from httpx import HTTPStatusError
 
 BASE_GAME_MOD_IDS = ['game', 'survival', 'creative']
+# opening a zip is mostly file reads and inflating the icon, both release the gil, so threads scale well enough
+DEFAULT_SCAN_WORKERS = min(16, (os.cpu_count() or 1) * 2)
+SCAN_INDEX_FILE = "scan_index.dat"
 
 class LocalMod:
-    def __init__(self, raw:dict, path:str, icon_bytes:bytes):
+    def __init__(self, raw:dict, path:str, icon:bytes | IconHandle):
         raw = {key.lower():value for key, value in raw.items()}
         
         self.type = raw.get('type', None)
@@ -23,13 +33,26 @@ class LocalMod:
         self.version = raw.get('version', None)
         self.dependencies:dict = {key:value for key, value in raw.get('dependencies', {}).items() if key not in BASE_GAME_MOD_IDS}
         self.website = raw.get('website', None)
-        self.icon:bytes = icon_bytes
+        self.icon:bytes | IconHandle | None = icon # a handle into the icon store once scanned with one
         
         self.install_location = path
         self.current_path = path
         self.is_enabled = False
         self.full_mod_info:Mod | None = None
     
+    def read_icon(self) -> bytes | None:
+        # goes back to the zip when the icon store lost the icon
+        if not isinstance(self.icon, IconHandle):
+            return self.icon
+        icon = self.icon.read()
+        if icon is None:
+            try:
+                with ZipFile(self.current_path, 'r') as zip_ref:
+                    icon = zip_ref.read('modicon.png')
+            except (OSError, KeyError, BadZipFile):
+                traceback.print_exc()
+        return icon
+    
     def fetch_full_mod_info(self, vsmoddb_client):
         if self.full_mod_info is None:
             try:
@@ -59,29 +82,8 @@ class LocalMod:
         else:
             print("No updates available.")
             return None
-    
-    def get_mod_dependencies(self, vsmoddb_client):
-        mods_to_get: list[tuple[LocalMod, ModRelease]]  = []
-        failed_mod_ids: list[str] = []
-        
-        for mod_id_str, version in self.dependencies.items():
-            print(f"Fetching {mod_id_str}")
-            print(f"Version: {version}")
-            try:
-                mod = vsmoddb_client.get_mod(mod_id_str)
-            except HTTPStatusError:
-                failed_mod_ids.append(mod_id_str)
-                continue
-            
-            mod_release = mod.get_release(version)
-            if mod_release is not None:
-                mods_to_get.append((mod, mod_release))
-            else:
-                failed_mod_ids.append(mod_id_str)
-        
-        return mods_to_get, failed_mod_ids
 
-def get_mod_info(mod_path:str) -> LocalMod:
+def get_mod_info(mod_path:str, icon_store:IconStore = None) -> LocalMod:
     if not os.path.exists(mod_path):
         raise FileNotFoundError(f"Mod file {mod_path} does not exist.")
     if not mod_path.endswith('.zip'):
@@ -94,6 +96,8 @@ def get_mod_info(mod_path:str) -> LocalMod:
             icon = zip_ref.read('modicon.png')
         except KeyError:
             icon = None
+        if icon is not None and icon_store is not None:
+            icon = icon_store.add(icon)
         
         return LocalMod(mod_info, mod_path, icon)
 
@@ -103,18 +107,120 @@ def get_mod_info(mod_path:str) -> LocalMod:
 #     mod_info = {}
 #     mod_info['']
     
-def scan_mod_directory(directory:str) -> list[LocalMod]:
-    scanned_mods = []
+def file_signature(entry:os.DirEntry) -> tuple[int, int, int]:
+    # size, mtime and inode, the inode catches a file replaced by a same sized copy (or relinked from the mod store)
+    stat = entry.stat()
+    return (stat.st_size, stat.st_mtime_ns, entry.inode())
+
+class ScanIndex:
+    # parsed LocalMods from earlier scans keyed by path, reused for as long as the file signature still matches
+    # callers get copies, so whatever they change on a LocalMod (install location, enabled) never leaks back in here
+    def __init__(self, location:str = None):
+        self.location = location
+        self.entries:dict[str, tuple[tuple[int, int, int], LocalMod]] = {}
+        self.changed = False
+        self._lock = threading.Lock()
+        
+        if location is not None:
+            self.load_from_file()
     
-    for entry in os.scandir(directory):
-        if entry.is_file() and entry.name.endswith('.zip'):
-            try:
-                local_mod = get_mod_info(entry.path)
-            except:
-                print(f"Failed to scan mod: {entry.path}")
-                traceback.print_exc()
-                # print("Continuing with limited data...")
-                continue
-            scanned_mods.append(local_mod)
+    def load_from_file(self):
+        if not os.path.exists(self.location):
+            return
+        try:
+            with open(self.location, 'rb') as f:
+                self.entries = pickle.load(f)
+        except Exception:
+            print("Failed to load the mod scan index, all mods will be rescanned")
+            traceback.print_exc()
+            self.entries = {}
+    
+    def save_to_file(self):
+        if self.location is None or not self.changed:
+            return
+        os.makedirs(os.path.dirname(self.location), exist_ok=True)
+        with self._lock:
+            temp_location = self.location + ".tmp"
+            with open(temp_location, 'wb') as f:
+                pickle.dump(self.entries, f)
+            os.replace(temp_location, self.location)
+            self.changed = False
+    
+    def lookup(self, mod_path:str, signature:tuple[int, int, int]) -> LocalMod | None:
+        with self._lock:
+            entry = self.entries.get(mod_path)
+        if entry is None or entry[0] != signature:
+            return None
+        return copy.copy(entry[1])
+    
+    def store(self, mod_path:str, signature:tuple[int, int, int], local_mod:LocalMod):
+        with self._lock:
+            self.entries[mod_path] = (signature, copy.copy(local_mod))
+            self.changed = True
+    
+    def prune(self, directory:str, mod_paths:set[str]):
+        # drops entries for files in directory that are gone
+        directory = os.path.normpath(directory)
+        with self._lock:
+            for mod_path in [mod_path for mod_path in self.entries if os.path.dirname(mod_path) == directory and mod_path not in mod_paths]:
+                del self.entries[mod_path]
+                self.changed = True
+    
+    def icon_digests(self) -> set[bytes]:
+        with self._lock:
+            return {local_mod.icon.digest for _, local_mod in self.entries.values() if isinstance(local_mod.icon, IconHandle)}
+
+def scan_mod_file(mod_path:str) -> tuple[LocalMod | None, tuple[Exception, str] | None]:
+    # runs on a pool worker, failures are handed back instead of raised so one broken zip doesn't end the scan
+    try:
+        return get_mod_info(mod_path), None
+    except Exception as e:
+        return None, (e, traceback.format_exc())
+
+def scan_mod_directory(directory:str, max_workers:int = DEFAULT_SCAN_WORKERS, use_processes:bool = False, errors:dict[str, Exception] = None, index:ScanIndex = None, icon_store:IconStore = None) -> list[LocalMod]:
+    # mods come back sorted by path no matter which worker finishes first, mods that failed to scan are left out
+    # and reported in errors ({path: exception}) when given
+    # with an index only new and changed zips are opened, an unchanged directory costs one scandir and no zip reads
+    # with an icon store the icons are moved into it (on this thread, workers may be processes) and mods keep a handle
+    signatures = {
+        os.path.join(os.path.normpath(directory), entry.name): file_signature(entry)
+        for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith('.zip')
+    }
+    
+    indexed_mods:dict[str, LocalMod] = {}
+    if index is not None:
+        index.prune(directory, signatures.keys())
+        for mod_path, signature in signatures.items():
+            local_mod = index.lookup(mod_path, signature)
+            if local_mod is not None:
+                if icon_store is not None and isinstance(local_mod.icon, bytes):
+                    local_mod.icon = icon_store.add(local_mod.icon)
+                    index.store(mod_path, signature, local_mod)
+                indexed_mods[mod_path] = local_mod
+    mod_paths = sorted(mod_path for mod_path in signatures if mod_path not in indexed_mods)
+    
+    if max_workers <= 1 or len(mod_paths) <= 1:
+        results = [scan_mod_file(mod_path) for mod_path in mod_paths]
+    elif use_processes:
+        # for very large directories, LocalMod pickles fine so results can cross the process boundary
+        # spawned rather than forked, forking a process that already runs qt and pool threads can deadlock the children
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results = list(executor.map(scan_mod_file, mod_paths, chunksize=max(1, len(mod_paths) // (max_workers * 4))))
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scan") as executor:
+            results = list(executor.map(scan_mod_file, mod_paths))
+    
+    for mod_path, (local_mod, error) in zip(mod_paths, results):
+        if error is not None:
+            print(f"Failed to scan mod: {mod_path}")
+            print(error[1], end="", file=sys.stderr)
+            if errors is not None:
+                errors[mod_path] = error[0]
+            continue
+        if icon_store is not None and isinstance(local_mod.icon, bytes):
+            local_mod.icon = icon_store.add(local_mod.icon)
+        if index is not None:
+            index.store(mod_path, signatures[mod_path], local_mod)
+        indexed_mods[mod_path] = local_mod
     
-    return scanned_mods
+    return [indexed_mods[mod_path] for mod_path in sorted(indexed_mods)]
@@ -0,0 +1,298 @@
+import os
+import json
+import shutil
+import hashlib
+import zipfile
+import threading
+import traceback
+import uuid
+from concurrent.futures import Future
+
+STORE_DIR_NAME = ".store"
+STORE_INDEX_FILE = "index.json"
+HASH_NAME = "sha256"
+
+
+def hash_file(path:str, hash_name:str = HASH_NAME) -> str:
+    hasher = hashlib.new(hash_name)
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def is_valid_zip(path:str) -> bool:
+    # only reads the central directory, a truncated or garbled download fails here without another pass over the data
+    try:
+        with zipfile.ZipFile(path) as zip_file:
+            return len(zip_file.infolist()) > 0
+    except (zipfile.BadZipFile, OSError):
+        return False
+
+def link_file(source:str, target:str):
+    # hardlink when possible (same volume), symlink next, a plain copy as the last resort
+    if os.path.exists(target):
+        if os.path.samefile(source, target):
+            return
+        os.remove(target)
+    try:
+        os.link(source, target)
+        return
+    except OSError:
+        pass
+    try:
+        os.symlink(source, target)
+        return
+    except OSError:
+        pass
+    shutil.copy2(source, target)
+
+
+class ModStore:
+    # content addressed store for downloaded mod files: objects/<sha256[:2]>/<sha256>.zip
+    # the human named files in the download folder are links into it, index.json remembers which url gave which object
+    def __init__(self, location:str):
+        self.location = location
+        self.objects_location = os.path.join(location, "objects")
+        self.temp_location = os.path.join(location, "tmp")
+        self.index_location = os.path.join(location, STORE_INDEX_FILE)
+        self.index:dict[str, dict[str, object]] = {} # {url: {'sha256', 'size'}}
+        self._lock = threading.Lock()
+        # fetch_to_file calls placing a file hold off prune, which would otherwise drop an object right before it gets linked
+        self._placement = threading.Condition(self._lock)
+        self._placing = 0
+        self._pruning = False
+        # single flight: concurrent fetches of one url wait for the first caller's download, they share its temp file otherwise
+        self._in_flight:dict[str, Future] = {}
+
+        self.load_index()
+
+    def load_index(self):
+        if not os.path.exists(self.index_location):
+            return
+        try:
+            with open(self.index_location, 'r') as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            print("Failed to load the mod store index, downloads will be re-verified")
+            traceback.print_exc()
+            self.index = {}
+
+    def save_index(self):
+        temp_location = self.index_location + ".tmp"
+        with open(temp_location, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(temp_location, self.index_location)
+
+    def object_path(self, digest:str) -> str:
+        return os.path.join(self.objects_location, digest[:2], digest + ".zip")
+
+    def lookup(self, url:str) -> str | None:
+        # the stored object for url, as long as it is still there and has the size it was stored with
+        with self._lock:
+            entry = self.index.get(url)
+        if entry is None:
+            return None
+
+        path = self.object_path(entry[HASH_NAME])
+        try:
+            if os.path.getsize(path) == entry['size']:
+                return path
+        except OSError:
+            pass
+
+        with self._lock:
+            self.index.pop(url, None)
+        return None
+
+    def add(self, url:str, path:str, digest:str) -> str:
+        # moves a verified file into the store and records it for url, an identical object already stored wins
+        object_path = self.object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if os.path.exists(object_path):
+            os.remove(path)
+        else:
+            os.replace(path, object_path)
+
+        with self._lock:
+            self.index[url] = {HASH_NAME: digest, 'size': os.path.getsize(object_path)}
+            self.save_index()
+        return object_path
+
+    def adopt(self, url:str, file_location:str) -> bool:
+        # files downloaded before the store existed are hashed once and linked in, the original name stays in place
+        if not is_valid_zip(file_location):
+            return False
+        digest = hash_file(file_location)
+        object_path = self.object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        if not os.path.exists(object_path):
+            link_file(file_location, object_path)
+
+        with self._lock:
+            self.index[url] = {HASH_NAME: digest, 'size': os.path.getsize(object_path)}
+            self.save_index()
+        link_file(object_path, file_location)
+        return True
+
+    def fetch_to_file(self, client, url:str, file_location:str, start_callback = None, progress_callback = None, end_callback = None) -> bool:
+        # same contract as ModDbClient.fetch_to_file, but anything already in the store is linked without touching the network
+        with self._placement:
+            while self._pruning:
+                self._placement.wait()
+            self._placing += 1
+        try:
+            return self.place(client, url, file_location, start_callback, progress_callback, end_callback)
+        finally:
+            with self._placement:
+                self._placing -= 1
+                self._placement.notify_all()
+
+    def place(self, client, url:str, file_location:str, start_callback = None, progress_callback = None, end_callback = None) -> bool:
+        object_path = self.lookup(url)
+        if object_path is not None:
+            link_file(object_path, file_location)
+            if end_callback:
+                end_callback()
+            return True
+
+        if os.path.exists(file_location):
+            try:
+                if self.adopt(url, file_location):
+                    if end_callback:
+                        end_callback()
+                    return True
+            except OSError:
+                traceback.print_exc()
+
+        object_path = self.fetch_object(client, url, start_callback, progress_callback)
+        if object_path is None:
+            return False
+        try:
+            link_file(object_path, file_location)
+        except OSError:
+            traceback.print_exc()
+            return False
+
+        if end_callback:
+            end_callback()
+        return True
+
+    def fetch_object(self, client, url:str, start_callback = None, progress_callback = None) -> str | None:
+        # the stored object for url, downloaded and verified first if needed, without placing it anywhere
+        object_path = self.lookup(url)
+        if object_path is not None:
+            return object_path
+
+        with self._lock:
+            future = self._in_flight.get(url)
+            owner = future is None
+            if owner:
+                future = self._in_flight[url] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            # another caller may have stored it between the lookup above and taking the url over
+            object_path = self.lookup(url)
+            if object_path is None:
+                object_path = self.download_object(client, url, start_callback, progress_callback)
+            future.set_result(object_path)
+            return object_path
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[url]
+
+    def download_object(self, client, url:str, start_callback = None, progress_callback = None) -> str | None:
+        # the temp name is stable per url so an interrupted download can be resumed from its .part file
+        os.makedirs(self.temp_location, exist_ok=True)
+        temp_path = os.path.join(self.temp_location, uuid.uuid5(uuid.NAMESPACE_URL, url).hex)
+        digests = []
+        if not client.fetch_to_file(url, temp_path, start_callback, progress_callback, hash_callback=digests.append):
+            return None
+
+        if len(digests) == 0:
+            # the client handed back an existing file without downloading it
+            digests.append(hash_file(temp_path))
+        if not is_valid_zip(temp_path):
+            print(f"Downloaded file from {url} is not a valid zip archive (sha256 {digests[0]}), discarding it")
+            os.remove(temp_path)
+            return None
+
+        try:
+            return self.add(url, temp_path, digests[0])
+        except OSError:
+            traceback.print_exc()
+            return None
+
+    def prune(self, link_locations:list[str]) -> int:
+        # drops the objects no file in link_locations links to, along with their index entries, returns how many went
+        # a hardlinked object shares its inode with the named file, a symlinked one is where the named file points
+        with self._placement:
+            if self._placing > 0 or self._pruning:
+                return 0 # files are being placed right now, whatever they leave behind goes next time
+            self._pruning = True
+        try:
+            linked_inodes:set[tuple[int, int]] = set()
+            linked_paths:set[str] = set()
+            for directory in link_locations:
+                if not os.path.isdir(directory):
+                    continue
+                for entry in os.scandir(directory):
+                    if entry.is_symlink():
+                        linked_paths.add(os.path.realpath(entry.path))
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        linked_inodes.add((stat.st_dev, stat.st_ino))
+            
+            removed:set[str] = set()
+            kept:set[str] = set()
+            for object_path in self.list_objects():
+                digest = os.path.basename(object_path).removesuffix(".zip")
+                try:
+                    stat = os.stat(object_path)
+                    if (stat.st_nlink > 1 and (stat.st_dev, stat.st_ino) in linked_inodes) or os.path.realpath(object_path) in linked_paths:
+                        kept.add(digest)
+                        continue
+                    os.remove(object_path)
+                    removed.add(digest)
+                except OSError:
+                    traceback.print_exc()
+                    kept.add(digest)
+            
+            with self._lock:
+                stale = [url for url, entry in self.index.items() if entry[HASH_NAME] not in kept]
+                for url in stale:
+                    del self.index[url]
+                if len(stale) > 0:
+                    self.save_index()
+            for directory in os.listdir(self.objects_location) if os.path.isdir(self.objects_location) else []:
+                try:
+                    os.rmdir(os.path.join(self.objects_location, directory))
+                except OSError:
+                    pass # not empty
+            return len(removed)
+        finally:
+            with self._placement:
+                self._pruning = False
+                self._placement.notify_all()
+
+    def list_objects(self) -> list[str]:
+        if not os.path.isdir(self.objects_location):
+            return []
+        return [
+            os.path.join(self.objects_location, directory, name)
+            for directory in os.listdir(self.objects_location) if os.path.isdir(os.path.join(self.objects_location, directory))
+            for name in os.listdir(os.path.join(self.objects_location, directory)) if name.endswith(".zip")
+        ]
+
+    def verify(self, url:str) -> bool:
+        # full re-hash of the stored object, for explicit integrity checks
+        object_path = self.lookup(url)
+        if object_path is None:
+            return False
+        with self._lock:
+            digest = self.index[url][HASH_NAME]
+        return hash_file(object_path) == digest
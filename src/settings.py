@@ -5,7 +5,8 @@ import pickle
 import traceback
 
 from mod_profiles import ModProfile
-from mod_info_parser import LocalMod, scan_mod_directory
+from mod_info_parser import LocalMod, ScanIndex, scan_mod_directory, SCAN_INDEX_FILE
+from icon_store import open_icon_store, IconHandle, ICON_STORE_FILE
 
 if sys.platform == "win32":
     GAME_SEARCH_PATHS = [
@@ -70,6 +71,8 @@ DEFAULTS = {
     "mod_manager": {
         "download_location": os.path.join(USER_SETTINGS_PATH, "mods"),
         "cache_location": os.path.join(USER_SETTINGS_PATH, "cache"),
+        "json_cache_budget_mb": 64, # in memory budget for api responses
+        "image_cache_budget_mb": 128, # budget for logos, screenshots and other raw bytes, in memory and for the image folder on disk
         "first_launch": True,
         "downloaded_mods": {},
         "profiles": [],
@@ -130,6 +133,8 @@ class UserSettings:
             "mod_manager": {
                 "download_location": self.mod_download_location,
                 "cache_location": self.cache_location,
+                "json_cache_budget_mb": self.json_cache_budget_mb,
+                "image_cache_budget_mb": self.image_cache_budget_mb,
                 "first_launch": self.first_launch,
                 # "downloaded_mods": self.downloaded_mods,
                 "profiles": [profile.export_to_json() for profile in self.profiles],
@@ -144,6 +149,7 @@ class UserSettings:
         if self._mod_info_location is not None:
             with open(self._mod_info_location, 'wb') as f:
                 pickle.dump(self._downloaded_mods, f)
+        self.scan_index.save_to_file()
     
     def load(self, raw:dict):
         game_section = raw.get('game', {})
@@ -157,6 +163,8 @@ class UserSettings:
         self._first_launch = mod_section.get('first_launch', DEFAULTS['mod_manager']['first_launch'])
         self._mod_download_location = mod_section.get('download_location', DEFAULTS['mod_manager']['download_location'])
         self._cache_location = mod_section.get('cache_location', DEFAULTS['mod_manager']['cache_location'])
+        self._json_cache_budget_mb = mod_section.get('json_cache_budget_mb', DEFAULTS['mod_manager']['json_cache_budget_mb'])
+        self._image_cache_budget_mb = mod_section.get('image_cache_budget_mb', DEFAULTS['mod_manager']['image_cache_budget_mb'])
         # self._downloaded_mods = mod_section.get('downloaded_mods', [])
         profiles = mod_section.get('profiles', [])
         if profiles is not None and len(profiles) > 0:
@@ -177,7 +185,9 @@ class UserSettings:
             self._profiles.append(self._active_profile)
         
         self._mod_info_location = os.path.join(self.mod_download_location, 'local_mod_info.dat')
-        self._downloaded_mods = scan_mod_directory(self.mod_download_location)
+        self.scan_index = ScanIndex(os.path.join(self.cache_location, SCAN_INDEX_FILE))
+        self.icon_store = open_icon_store(os.path.join(self.cache_location, ICON_STORE_FILE))
+        self._downloaded_mods = scan_mod_directory(self.mod_download_location, index=self.scan_index, icon_store=self.icon_store)
         
         with open(self._mod_info_location, 'r+b' if os.path.exists(self._mod_info_location) else 'x+b') as f:
             try:
@@ -191,10 +201,17 @@ class UserSettings:
             scanned_mod = self.get_mod_info(mod.mod_id_str)
             if scanned_mod is not None:
                 if scanned_mod.full_mod_info != mod.full_mod_info:
+                    # the saved copy may still carry the icon bytes from before the icon store
+                    mod.icon = scanned_mod.icon
                     index = self.downloaded_mods.index(scanned_mod)
                     self.downloaded_mods[index] = mod
         
-        enabled_mods = scan_mod_directory(os.path.join(self.game_data_path, 'Mods'))
+        enabled_mods = scan_mod_directory(os.path.join(self.game_data_path, 'Mods'), index=self.scan_index, icon_store=self.icon_store)
+        try:
+            self.scan_index.save_to_file()
+        except OSError:
+            print("Failed to save the mod scan index")
+            traceback.print_exc()
         for mod in enabled_mods:
             mod.is_enabled = True
             name = os.path.basename(mod.install_location)
@@ -208,6 +225,14 @@ class UserSettings:
             else:
                 self.downloaded_mods.append(mod)
         
+        # icons of mods that are gone stay in the pack until it is rewritten here
+        try:
+            icon_digests = self.scan_index.icon_digests() | {mod.icon.digest for mod in self.downloaded_mods if isinstance(mod.icon, IconHandle)}
+            self.icon_store.compact(icon_digests)
+        except OSError:
+            print("Failed to compact the icon store")
+            traceback.print_exc()
+        
     
     def load_from_file(self) -> bool:
         raw = get_user_settings()
@@ -276,6 +301,22 @@ class UserSettings:
     def cache_location(self):
         return self._cache_location
     
+    @property
+    def json_cache_budget_mb(self) -> int:
+        return self._json_cache_budget_mb
+    
+    @json_cache_budget_mb.setter
+    def json_cache_budget_mb(self, value:int):
+        self._json_cache_budget_mb = value
+    
+    @property
+    def image_cache_budget_mb(self) -> int:
+        return self._image_cache_budget_mb
+    
+    @image_cache_budget_mb.setter
+    def image_cache_budget_mb(self, value:int):
+        self._image_cache_budget_mb = value
+    
     @property
     def downloaded_mods(self) -> list[LocalMod]:
         return self._downloaded_mods
@@ -284,6 +325,22 @@ class UserSettings:
     def downloaded_mods(self, value:list[LocalMod]):
         self._downloaded_mods = value
     
+    def get_mod_at_path(self, path:str) -> LocalMod | None:
+        path = os.path.normpath(path)
+        for mod in self.downloaded_mods:
+            if os.path.normpath(mod.current_path) == path:
+                return mod
+        return None
+    
+    def put_local_mod(self, local_mod:LocalMod) -> LocalMod | None:
+        # adds local_mod, or puts it in place of the mod at the same path and returns that one
+        existing = self.get_mod_at_path(local_mod.current_path)
+        if existing is None:
+            self.downloaded_mods.append(local_mod)
+        else:
+            self.downloaded_mods[self.downloaded_mods.index(existing)] = local_mod
+        return existing
+    
     def get_mod_info(self, mod_id:str|int) -> LocalMod | None:
         for mod in self.downloaded_mods:
             if mod.mod_id_str == mod_id:
@@ -1,9 +1,18 @@
+import os
 import settings
+from mod_store import ModStore, STORE_DIR_NAME
 from vsmoddb.client import ModDbClient, CachedModDbClient, CacheManager
 from PySide6.QtCore import QThreadPool
+from .image_cache import ImageCache
 
 user_settings = settings.UserSettings()
-moddb_client = CachedModDbClient(CacheManager(user_settings.cache_location))
+moddb_client = CachedModDbClient(CacheManager(
+    user_settings.cache_location,
+    json_budget=user_settings.json_cache_budget_mb * 1024 * 1024,
+    blob_budget=user_settings.image_cache_budget_mb * 1024 * 1024,
+))
+image_cache = ImageCache(os.path.join(user_settings.cache_location, "images"), moddb_client, budget=user_settings.image_cache_budget_mb * 1024 * 1024)
+mod_store = ModStore(os.path.join(user_settings.mod_download_location, STORE_DIR_NAME))
 thread_pool = QThreadPool()
 
 from . import main_window, mod_index, worker
\ No newline at end of file
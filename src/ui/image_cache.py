@@ -0,0 +1,135 @@
+import os
+import shutil
+import hashlib
+import threading
+import traceback
+
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QImage
+
+THUMBNAIL_WIDTHS = (200, 280, 560) # grid placeholder, grid logo and detail view
+ORIGINAL_FILE = "original"
+DEFAULT_IMAGE_CACHE_BUDGET = 128 * 1024 * 1024 # bytes
+
+
+class ImageCache:
+    # images from the mod db kept on disk as <location>/<sha1 of url>/original plus one png per thumbnail width
+    # everything here runs on worker threads, QImage is safe off the gui thread (unlike QPixmap)
+    # the folder is kept under budget bytes by removing the least recently used entries, reads bump an entry's folder mtime
+    def __init__(self, location:str, client, widths:tuple[int, ...] = THUMBNAIL_WIDTHS, budget:int = DEFAULT_IMAGE_CACHE_BUDGET):
+        self.location = location
+        self.client = client
+        self.widths = widths
+        self.budget = budget
+        self.usage:int | None = None # bytes on disk, counted by the first write of this process
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def entry_path(self, url:str) -> str:
+        return os.path.join(self.location, hashlib.sha1(url.encode()).hexdigest())
+
+    def thumbnail_path(self, url:str, width:int) -> str:
+        return os.path.join(self.entry_path(url), f"{width}.png")
+
+    def write_file(self, path:str, data:bytes):
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def touch(self, url:str):
+        try:
+            os.utime(self.entry_path(url))
+        except OSError:
+            pass
+
+    def get_original(self, url:str) -> bytes:
+        path = os.path.join(self.entry_path(url), ORIGINAL_FILE)
+        if os.path.exists(path):
+            self.touch(url)
+            with open(path, 'rb') as f:
+                return f.read()
+
+        # the original is stored here, so it skips the clients response cache
+        data = self.client.fetch_to_memory(url, no_store=True)
+        os.makedirs(self.entry_path(url), exist_ok=True)
+        self.write_file(path, data)
+        self.added(url, len(data))
+        return data
+
+    def get_scaled(self, url:str, width:int) -> QImage | None:
+        # a cached thumbnail is only decoded, never rescaled, the network is only used when the original is missing
+        path = self.thumbnail_path(url, width)
+        if os.path.exists(path):
+            image = QImage(path)
+            if not image.isNull():
+                self.touch(url)
+                return image
+
+        image = QImage.fromData(self.get_original(url))
+        if image.isNull():
+            return None
+
+        result = None
+        written = 0
+        for thumbnail_width in sorted(set(self.widths + (width,))):
+            thumbnail = image.scaledToWidth(thumbnail_width, Qt.TransformationMode.SmoothTransformation)
+            temp_path = f"{self.thumbnail_path(url, thumbnail_width)}.{os.getpid()}.tmp.png"
+            try:
+                if thumbnail.save(temp_path, "PNG"):
+                    written += os.path.getsize(temp_path)
+                    os.replace(temp_path, self.thumbnail_path(url, thumbnail_width))
+            except OSError:
+                traceback.print_exc()
+            if thumbnail_width == width:
+                result = thumbnail
+        self.added(url, written)
+        return result
+
+    def entry_size(self, entry_path:str) -> int:
+        size = 0
+        try:
+            for entry in os.scandir(entry_path):
+                size += entry.stat().st_size
+        except OSError:
+            pass
+        return size
+
+    def entries(self) -> list[os.DirEntry]:
+        try:
+            return [entry for entry in os.scandir(self.location) if entry.is_dir()]
+        except OSError:
+            return []
+
+    def added(self, url:str, size:int):
+        with self._lock:
+            if self.usage is None:
+                # the scan already includes what was just written
+                self.usage = sum(self.entry_size(entry.path) for entry in self.entries())
+            else:
+                self.usage += size
+            if self.usage > self.budget:
+                self.evict(self.entry_path(url))
+
+    def evict(self, keep:str = None):
+        # oldest first, the entry that was just written is kept even if it alone is over budget
+        for entry in sorted(self.entries(), key=lambda entry: entry.stat().st_mtime):
+            if self.usage <= self.budget:
+                break
+            if entry.path == keep:
+                continue
+            size = self.entry_size(entry.path)
+            shutil.rmtree(entry.path, ignore_errors=True)
+            self.usage -= size
+            self.evictions += 1
+
+    def set_budget(self, budget:int):
+        with self._lock:
+            self.budget = budget
+            if self.usage is not None and self.usage > self.budget:
+                self.evict()
+
+    def clear(self):
+        with self._lock:
+            shutil.rmtree(self.location, ignore_errors=True)
+            self.usage = 0
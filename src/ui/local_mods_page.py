@@ -4,7 +4,8 @@ import json
 
 from . import moddb_client, thread_pool, user_settings
 from .worker import Worker, WorkerSignals
-from .mod_index import FlowLayout, ModPreview, downloader
+from .mod_index import FlowLayout, ModPreview, DownloadPriority, downloader, resolve_profile_mods
+from .mod_watcher import ModWatcher
 from mod_info_parser import LocalMod, get_mod_info, scan_mod_directory
 from mod_profiles import ModProfile, enable_mod, disable_mod, clear_game_disabled_mods
 from settings import APP_PATH
@@ -19,6 +20,7 @@ from httpx import HTTPStatusError
 class MissingMod(QFrame):
     def __init__(self, data:tuple[str, str], parent=None):
         super().__init__(parent=parent)
+        self.mod_id = data[0]
         
         self.main_layout =QVBoxLayout()
         self.title = QLabel("<b>Missing Mod:</b>")
@@ -84,6 +86,12 @@ class LocalModsPage(QFrame):
         downloader.signals.finished.connect(self.update_mod_list)
         self.update_mod_list()
         
+        # changes made outside the app only touch the previews they concern
+        self.mod_watcher = ModWatcher(self)
+        self.mod_watcher.mod_added.connect(self.on_mod_added)
+        self.mod_watcher.mod_removed.connect(self.on_mod_removed)
+        self.mod_watcher.mod_changed.connect(self.on_mod_changed)
+        
         self.scroll_area_content.setLayout(self.scroll_area_content_layout)
         self.scroll_area.setWidget(self.scroll_area_content)
         
@@ -113,6 +121,40 @@ class LocalModsPage(QFrame):
             self.scroll_area_content_layout.addWidget(preview)
         self.updating_list = False
 
+    def find_preview(self, mod_path:str) -> ModPreview | None:
+        # by path, the LocalMod a preview was built with may since have been replaced by a freshly parsed one
+        mod_path = os.path.normpath(mod_path)
+        for child in self.scroll_area_content.children():
+            if isinstance(child, ModPreview) and os.path.normpath(child.mod.current_path) == mod_path:
+                return child
+        return None
+    
+    def remove_preview(self, mod:LocalMod):
+        preview = self.find_preview(mod.current_path)
+        if preview is not None:
+            # deleteLater keeps it a child until the event loop runs, so it must not be found again before that
+            preview.setParent(None)
+            preview.deleteLater()
+    
+    @Slot()
+    def on_mod_added(self, mod:LocalMod):
+        for child in self.scroll_area_content.children():
+            if isinstance(child, MissingMod) and child.mod_id == mod.mod_id_str:
+                child.deleteLater()
+        self.remove_preview(mod)
+        self.scroll_area_content_layout.addWidget(ModPreview(mod))
+    
+    @Slot()
+    def on_mod_removed(self, mod:LocalMod):
+        self.remove_preview(mod)
+        if mod.mod_id_str in user_settings.active_profile.mods and user_settings.get_mod_info(mod.mod_id_str) is None:
+            self.scroll_area_content_layout.addWidget(MissingMod((mod.mod_id_str, user_settings.active_profile.mods[mod.mod_id_str])))
+    
+    @Slot()
+    def on_mod_changed(self, old_mod:LocalMod, new_mod:LocalMod):
+        self.remove_preview(old_mod)
+        self.scroll_area_content_layout.addWidget(ModPreview(new_mod))
+    
     def get_missing_mods(self, profile:ModProfile) -> list[tuple[str, str]]:
         mods_to_download = []
         for mod_id, version in profile.mods.items():
@@ -121,30 +163,16 @@ class LocalModsPage(QFrame):
                 mods_to_download.append((mod_id, version))
         return mods_to_download
     
-    def download_mods_required(self, profile:ModProfile, mods:list[tuple[LocalMod, str]] = None):
+    def download_mods_required(self, profile:ModProfile, mods:list[tuple[str, str]] = None):
         if mods is None:
             mods = self.get_missing_mods(profile)
-        failed_mods = []
         downloader.signals.finished.connect(lambda profile=profile: self.on_download_finished(profile=profile))
         
-        for mod_id, version in mods:
-            try:
-                full_mod = moddb_client.get_mod(mod_id)
-            except:
-                print(f"Failed to download mod {mod_id}")
-                failed_mods.append((mod_id, version))
-                continue
-            
-            release = full_mod.get_release(version)
-            if release is None:
-                print(f"Failed to find release for mod {mod_id} version {version}")
-                failed_mods.append((mod_id, version))
-                continue
-            
-            download_path = downloader.release_download_path(release)
-            download_job = downloader.prepare_mod_download(release, download_path)
-            downloader.add_download_job(download_job)
-        downloader.start_download()
+        # the exact versions the profile lists, plus whatever they depend on, in one plan the user confirms first
+        self.resolve_worker = Worker(resolve_profile_mods, dict(mods), profile.game_version)
+        self.resolve_worker.signals.result.connect(lambda plan: downloader.confirm_install_plan(plan, DownloadPriority.BULK, "{count} mods are needed for this profile, install them now?"))
+        self.resolve_worker.signals.error.connect(lambda error: QMessageBox.critical(self, "Error", error[2]))
+        thread_pool.start(self.resolve_worker)
     
     @Slot()
     def on_download_finished(self, profile:ModProfile):
@@ -1,26 +1,62 @@
 import os
+import json
+import asyncio
+import heapq
+import time
+import itertools
 import traceback
+from collections import deque
+from enum import IntEnum
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZipFile
 
-from . import moddb_client, thread_pool, user_settings
-from .worker import Worker, WorkerSignals
+from . import image_cache, moddb_client, mod_store, thread_pool, user_settings
+from .worker import Worker, WorkerSignals, ProgressThrottle
+from .mod_watcher import register_download
 from settings import APP_PATH
 from mod_info_parser import LocalMod, get_mod_info
+from icon_store import IconHandle
+from dependency_resolver import DependencyResolver, InstallPlan, satisfies
 from mod_profiles import enable_mod, disable_mod
 from vsmoddb.models import Mod, Comment, ModRelease, PartialMod, SearchOrderBy, SearchOrderDirection
+from vsmoddb.catalog import ModCatalog, FilterMode
+from vsmoddb.search_index import ModSearchIndex
+from vsmoddb.async_client import AsyncCachedModDbClient
+from vsmoddb.client import RemoteFile
 
 from PySide6.QtWidgets import QStackedWidget, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QLineEdit, QComboBox, QLabel, QPushButton, QScrollArea, QGraphicsPixmapItem, QSizePolicy, QFrame, QProgressDialog, QMessageBox, QLayout, QListWidget, QListWidgetItem, QSplitter
-from PySide6.QtCore import Slot, QSize, QThread, QObject, QThreadPool, QRect, QPoint, Signal
-from PySide6.QtGui import QPixmap, QColor, QPalette, QIcon, QMouseEvent, Qt
+from PySide6.QtCore import Slot, QSize, QThread, QObject, QThreadPool, QRect, QPoint, Signal, QTimer
+from PySide6.QtGui import QPixmap, QImage, QColor, QPalette, QIcon, QMouseEvent, Qt
 from httpx import HTTPStatusError
 
 # TODO: once the groundwork is done, all the temp style sheets will need to be removed and replaced with a proper app level stylesheet
 
+def format_size(size:float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def format_duration(seconds:float) -> str:
+    seconds = int(seconds)
+    if seconds < 60:
+        return f"{seconds}s"
+    if seconds < 3600:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds // 3600}h {seconds // 60 % 60:02d}m"
+
 
 class DownloaderSignals(QObject):
     finished = Signal()
     progress = Signal(int)
     mod_deleted = Signal(object)
 
+class DownloadPriority(IntEnum):
+    # lower runs first
+    USER = 0
+    DEPENDENCY = 1
+    BULK = 2
+
 class ModDownloader(QObject):
     #? This could be refactored to handle more then just downloading once the actual mod index widget is created
     def __init__(self, to_disabled_buttons:list[QPushButton] = None, mod_release:ModRelease|list[ModRelease] = None, max_workers:int = 5, parent:QWidget|None = None):
@@ -28,17 +64,32 @@ class ModDownloader(QObject):
         self.to_disabled_buttons = to_disabled_buttons if to_disabled_buttons else []
         self.mod_release = mod_release
         
-        self.pending_jobs:list[ModDownloader.DownloadJob] = []
+        # pending jobs are a heap of (priority, sequence, job), sequence keeps jobs of the same priority first in first out
+        self.pending_jobs:list[tuple[int, int, ModDownloader.DownloadJob]] = []
+        self.queued_jobs:dict[str, ModDownloader.DownloadJob] = {} # file_name -> pending job
         self.running_jobs:list[ModDownloader.DownloadJob] = []
         self.finished_jobs:list[ModDownloader.DownloadJob] = []
+        self.job_sequence = itertools.count()
         self.progress_dialog = None
+        # dependencies are resolved once per batch, for every mod downloaded in it, before the batch counts as finished
+        self.pending_dependents:dict[str, LocalMod] = {} # mod id string -> downloaded mod still to resolve
+        self.resolve_worker:Worker | None = None
         
+        # downloads get their own pool so a big profile install doesn't hold up logo and api requests on the shared one
         self.max_concurrent_jobs = max_workers
+        self.download_pool = QThreadPool(self)
+        self.download_pool.setMaxThreadCount(max_workers)
         self.signals = DownloaderSignals()
         
+        # the dialog is refreshed on a timer from the per job byte counts, not from every progress signal
+        self.progress_samples:deque[tuple[float, int]] = deque()
+        self.progress_timer = QTimer(self)
+        self.progress_timer.setInterval(250)
+        self.progress_timer.timeout.connect(self.update_progress_dialog)
+        
         if isinstance(mod_release, list):
             for release in mod_release:
-                self.add_download_job(self.prepare_mod_download(release, self.release_download_path(release)))
+                self.add_download_job(self.prepare_mod_download(release, self.release_download_path(release)), DownloadPriority.BULK)
             self.start_download()
         elif isinstance(mod_release, ModRelease):
             self.download_mod_single(mod_release)
@@ -58,9 +109,13 @@ class ModDownloader(QObject):
             self.failed_result = None
             self.file_name = file_name
             self.mod_release = release
+            self.priority = DownloadPriority.USER
+            self.resolved = False # part of an install plan already, its dependencies are in the same plan
         
         def set_result(self, result) -> None:
             self.result = result
+            if result is False:
+                self.failed = True
         
         def set_error_result(self, result) -> None:
             self.failed = True
@@ -77,11 +132,11 @@ class ModDownloader(QObject):
     
     @property
     def total_job_count(self) -> int:
-        return len(self.pending_jobs) + len(self.finished_jobs) + len(self.running_jobs)
+        return self.pending_job_count + len(self.finished_jobs) + len(self.running_jobs)
     
     @property
     def pending_job_count(self) -> int:
-        return len(self.pending_jobs)
+        return len(self.queued_jobs)
     
     @property
     def running_job_count(self) -> int:
@@ -107,18 +162,34 @@ class ModDownloader(QObject):
     def disable_buttons(self, value:list[QPushButton]):
         self.to_disabled_buttons = value
     
+    @property
+    def downloaded_bytes(self) -> int:
+        return sum(job.progress for job in self.running_jobs) + sum(job.progress for job in self.finished_jobs)
+    
+    def expected_bytes(self) -> float:
+        # sizes are only known once a download has started, the rest are guessed from the average of the known ones
+        started_jobs = self.running_jobs + self.finished_jobs
+        known_sizes = [job.progress_start for job in started_jobs if job.progress_start > 0]
+        average_size = sum(known_sizes) / len(known_sizes) if len(known_sizes) > 0 else 0
+        expected = sum(max(job.progress_start, job.progress) if job.progress_start > 0 else average_size for job in started_jobs)
+        return expected + average_size * self.pending_job_count
+    
     def release_download_path(self, mod_release:ModRelease, base_path:str = None):
         return os.path.join(user_settings.mod_download_location if base_path is None else base_path, f"{mod_release.filename}")
     
     
     def prepare_mod_download(self, release:ModRelease, download_path:str, on_result_callback = None):
         download_worker_signals = WorkerSignals()
+        # progress is the total bytes written so far, published at most 10 times a second per job
+        progress_throttle = ProgressThrottle(download_worker_signals.progress.emit)
         download_worker = Worker(
-            moddb_client.fetch_to_file,
+            mod_store.fetch_to_file,
+            moddb_client,
             release.main_file,
             download_path,
             download_worker_signals.progress_start.emit,
-            download_worker_signals.progress.emit,
+            progress_throttle,
+            progress_throttle.flush,
             signals = download_worker_signals
         )
         if on_result_callback is not None:
@@ -126,15 +197,30 @@ class ModDownloader(QObject):
         return ModDownloader.DownloadJob(download_worker, download_worker_signals, download_path, release)
     
     
-    def add_download_job(self, job):
-        self.pending_jobs.append(job)
+    def add_download_job(self, job, priority:DownloadPriority = DownloadPriority.USER):
+        # returns the job that will download the file, which is an already queued or running one for duplicates
+        for running_job in self.running_jobs:
+            if running_job.file_name == job.file_name:
+                return running_job
+        queued_job = self.queued_jobs.get(job.file_name)
+        if queued_job is not None:
+            # a more urgent request moves the waiting job up the queue instead of downloading the file twice
+            if priority < queued_job.priority:
+                queued_job.priority = priority
+                heapq.heappush(self.pending_jobs, (priority, next(self.job_sequence), queued_job))
+            return queued_job
+        
+        job.priority = priority
+        self.queued_jobs[job.file_name] = job
+        heapq.heappush(self.pending_jobs, (priority, next(self.job_sequence), job))
         
         job.signals.finished.connect(lambda: self.download_finished(job))
         job.signals.result.connect(lambda result: job.set_result(result))
-        job.signals.error.connect(lambda error: job.set_error(error))
+        job.signals.error.connect(lambda error: job.set_error_result(error))
         job.signals.progress.connect(lambda progress: job.set_progress(progress))
         job.signals.progress_end.connect(lambda progress: job.set_progress_end(progress))
         job.signals.progress_start.connect(lambda progress: job.set_progress_start(progress))
+        return job
     
     def start_download(self):
         if self.disable_buttons:
@@ -142,23 +228,34 @@ class ModDownloader(QObject):
                 button.setEnabled(False)
         
         if not self.progress_dialog:
-            self.progress_dialog = QProgressDialog("Downloading...", "Cancel", 0, 0)
+            self.progress_dialog = QProgressDialog("Downloading...", "Cancel", 0, 1000)
         
-        self.progress_dialog.setMaximum(self.total_job_count)
-        
-        for job in self.pending_jobs:
-            if self.running_job_count < self.max_concurrent_jobs:
-                job.started = True
-                self.pending_jobs.remove(job)
-                self.running_jobs.append(job)
-                thread_pool.start(job.worker)
+        if not self.progress_timer.isActive():
+            self.progress_samples.clear()
+            self.progress_timer.start()
+        self.fill_slots()
+        self.update_progress_dialog()
+    
+    def fill_slots(self):
+        # starts the most urgent pending jobs until every slot is busy
+        while self.running_job_count < self.max_concurrent_jobs and len(self.pending_jobs) > 0:
+            priority, _sequence, job = heapq.heappop(self.pending_jobs)
+            if job.started or priority != job.priority:
+                # left behind when the job was moved up the queue
+                continue
+            job.started = True
+            del self.queued_jobs[job.file_name]
+            self.running_jobs.append(job)
+            self.download_pool.start(job.worker, -priority)
         
     
     @Slot()
     def download_mod_single(self, release:ModRelease, on_result_callback = None):
         path = self.release_download_path(release)
         job = self.prepare_mod_download(release, path, on_result_callback)
-        self.add_download_job(job)
+        queued_job = self.add_download_job(job)
+        if queued_job is not job and on_result_callback is not None:
+            queued_job.signals.result.connect(on_result_callback)
         self.start_download()
         
     @Slot()
@@ -167,40 +264,127 @@ class ModDownloader(QObject):
         self.running_jobs.remove(finished_job)
         self.finished_jobs.append(finished_job)
         
-        self.progress_dialog.setValue(self.finished_job_count)
         self.signals.progress.emit(self.finished_job_count)
+        # the slot is handed to the next job before the finished download is processed
+        self.fill_slots()
+        
         if not finished_job.failed:
+            local_mod = None
             try:
-                local_mod = get_mod_info(finished_job.file_name)
+                # parsed and registered at most once, the folder watcher may have picked the new file up already
+                local_mod = register_download(finished_job.file_name)
             except:
                 traceback.print_exc()
             if local_mod:
                 if local_mod.full_mod_info is None:
                     local_mod.fetch_full_mod_info(moddb_client)
                 
-                if local_mod not in user_settings.downloaded_mods:
-                    user_settings.downloaded_mods.append(local_mod)
+                if len(local_mod.dependencies) > 0 and not finished_job.resolved:
+                    self.pending_dependents[local_mod.mod_id_str] = local_mod
             else:
                 print(f"Error adding mod to downloaded mods. Mod file path: {finished_job.file_name}")
         
-        if self.pending_job_count > 0 and self.running_job_count < self.max_concurrent_jobs:
-            self.start_download()
+        self.check_batch_finished()
+    
+    def check_batch_finished(self):
+        # the batch only ends once its dependencies are resolved and whatever the plan added has been downloaded too
+        if self.finished_job_count < self.total_job_count or self.resolve_worker is not None:
+            return
+        if len(self.pending_dependents) > 0:
+            self.install_dependencies(list(self.pending_dependents.values()))
+            self.pending_dependents.clear()
+            return
+        self.finish_batch()
+    
+    def finish_batch(self):
+        self.progress_timer.stop()
+        self.progress_dialog.close()
+        if self.failed_job_count > 0 and self.total_job_count > 10:
+            QMessageBox.warning(self.parent(), "Download Complete", f" {self.finished_job_count} mods downloaded and {self.failed_job_count} mods failed to download\n Failed to download: {[job.file_name + "\n" for job in self.gather_failed_jobs]}", QMessageBox.StandardButton.Ok)
+        elif self.total_job_count > 10:
+            QMessageBox.information(self.parent(), "Download Complete", f"{self.finished_job_count} mods downloaded", QMessageBox.StandardButton.Ok)
         
-        if self.finished_job_count == self.total_job_count:
-            self.progress_dialog.close()
-            if self.failed_job_count > 0 and self.total_job_count > 10:
-                QMessageBox.warning(self.parent(), "Download Complete", f" {self.finished_job_count} mods downloaded and {self.failed_job_count} mods failed to download\n Failed to download: {[job.filename + "\n" for job in self.gather_failed_jobs]}", QMessageBox.StandardButton.Ok)
-            elif self.total_job_count > 10:
-                QMessageBox.information(self.parent(), "Download Complete", f"{self.finished_job_count} mods downloaded", QMessageBox.StandardButton.Ok)
-            
-            if self.disable_buttons:
-                for button in self.disable_buttons:
-                    if not button.isEnabled():
-                        button.setEnabled(True)
-            
-            self.finished_jobs.clear()
-            user_settings.save()
-            self.signals.finished.emit()
+        if self.disable_buttons:
+            for button in self.disable_buttons:
+                if not button.isEnabled():
+                    button.setEnabled(True)
+        
+        self.finished_jobs.clear()
+        user_settings.save()
+        self.signals.finished.emit()
+        self.prune_store()
+    
+    @Slot()
+    def update_progress_dialog(self):
+        if self.progress_dialog is None:
+            return
+        
+        now = time.monotonic()
+        downloaded = self.downloaded_bytes
+        expected = max(self.expected_bytes(), downloaded)
+        # throughput over the last five seconds
+        self.progress_samples.append((now, downloaded))
+        while len(self.progress_samples) > 1 and now - self.progress_samples[0][0] > 5:
+            self.progress_samples.popleft()
+        sample_time, sample_bytes = self.progress_samples[0]
+        rate = (downloaded - sample_bytes) / (now - sample_time) if now > sample_time else 0
+        
+        if self.resolve_worker is not None and self.finished_job_count == self.total_job_count:
+            self.progress_dialog.setLabelText("Resolving dependencies...")
+            return
+        text = f"Downloading mods: {self.finished_job_count} of {self.total_job_count} done"
+        if downloaded > 0:
+            text += f"\n{format_size(downloaded)} of ~{format_size(expected)}"
+            if rate > 0:
+                text += f" at {format_size(rate)}/s, about {format_duration((expected - downloaded) / rate)} left"
+        self.progress_dialog.setLabelText(text)
+        self.progress_dialog.setValue(int(1000 * downloaded / expected) if expected > 0 else 0)
+    
+    def install_dependencies(self, local_mods:list[LocalMod]):
+        self.resolve_worker = Worker(resolve_dependencies, local_mods)
+        self.resolve_worker.signals.result.connect(self.confirm_install_plan)
+        self.resolve_worker.signals.error.connect(lambda error: QMessageBox.critical(self.parent(), "Error", f"Failed to resolve dependencies\n{error[2]}"))
+        self.resolve_worker.signals.finished.connect(self.on_resolve_finished)
+        self.update_progress_dialog()
+        thread_pool.start(self.resolve_worker)
+    
+    @Slot()
+    def on_resolve_finished(self):
+        self.resolve_worker = None
+        self.check_batch_finished()
+    
+    @Slot()
+    def confirm_install_plan(self, plan:InstallPlan, priority:DownloadPriority = DownloadPriority.DEPENDENCY, question:str = "{count} mods need to be installed as well, install them now?"):
+        # the plan is shown before anything in it is queued, problems alone are only reported
+        for message in plan.conflicts:
+            print(message)
+        for mod_id in plan.missing:
+            print(f"Dependency {mod_id} was not found on the mod db")
+        for cycle in plan.cycles:
+            print(f"Dependency cycle: {' -> '.join(cycle)}")
+        
+        releases = [step.release for step in plan.steps if step.action == "install"]
+        details = describe_install_plan(plan)
+        if len(releases) > 0:
+            message_box = QMessageBox(QMessageBox.Icon.Question, "Install Mods", question.format(count=len(releases)), QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No, self.parent())
+            message_box.setDetailedText(details)
+            if message_box.exec() != QMessageBox.StandardButton.Yes:
+                self.prune_store()
+                return
+        elif not plan.ok or len(plan.cycles) > 0 or any(step.action == "update" for step in plan.steps):
+            message_box = QMessageBox(QMessageBox.Icon.Warning, "Dependencies", "Not every dependency could be installed", QMessageBox.StandardButton.Ok, self.parent())
+            message_box.setDetailedText(details)
+            message_box.exec()
+        self.queue_install_plan(plan, priority)
+    
+    def queue_install_plan(self, plan:InstallPlan, priority:DownloadPriority = DownloadPriority.DEPENDENCY):
+        # updates are only reported, replacing an installed version is left to the user
+        releases = [step.release for step in plan.steps if step.action == "install"]
+        for release in releases:
+            job = self.add_download_job(self.prepare_mod_download(release, self.release_download_path(release)), priority)
+            job.resolved = True
+        if len(releases) > 0:
+            self.start_download()
     
     def delete_mods(self, mod_list:list[int|str]):
         for mod in mod_list:
@@ -214,10 +398,159 @@ class ModDownloader(QObject):
                 user_settings.downloaded_mods.remove(local_mod)
                 self.signals.mod_deleted.emit(mod)
         user_settings.save()
+        self.prune_store()
+    
+    def prune_store(self):
+        # store objects nothing links to any more are dropped between batches, never while a download still has to link its own
+        if self.total_job_count > 0 or self.resolve_worker is not None:
+            return
+        link_locations = [user_settings.mod_download_location]
+        if user_settings.game_data_path:
+            link_locations.append(os.path.join(user_settings.game_data_path, 'Mods'))
+        thread_pool.start(Worker(mod_store.prune, link_locations))
 
 
 downloader = ModDownloader()
 
+def fetch_mods(mod_ids:list[str]) -> list[Mod | Exception]:
+    # one request per mod, but all in flight at once instead of one after another
+    async def run():
+        async with AsyncCachedModDbClient(moddb_client.cache_manager, moddb_client.registry, metrics=moddb_client.metrics) as client:
+            return await client.get_mod_many(mod_ids, return_exceptions=True)
+    
+    return asyncio.run(run())
+
+def read_release_dependencies(release:ModRelease) -> dict[str, str]:
+    # the api doesn't list dependencies, they come from the modinfo in the release file
+    # unless the release is in the mod store already, only the zip's central directory and the modinfo entry are read
+    # with ranged requests, the whole file is downloaded once the install is accepted
+    object_path = mod_store.lookup(release.main_file)
+    if object_path is not None:
+        return get_mod_info(object_path).dependencies
+    with ZipFile(RemoteFile(moddb_client, release.main_file)) as zip_ref:
+        return LocalMod(json.load(zip_ref.open('modinfo.json')), release.filename, None).dependencies
+
+def make_resolver(game_version:str = None) -> DependencyResolver:
+    installed = {mod.mod_id_str: mod for mod in user_settings.downloaded_mods}
+    game_version = game_version or user_settings.game_version
+    game_version_tag = moddb_client.tag_from_name(f"v{game_version}") if game_version else None
+    return DependencyResolver(fetch_mods, read_release_dependencies, game_version_tag, installed)
+
+def resolve_profile_mods(requirements:dict[str, str], game_version:str = None) -> InstallPlan:
+    # profiles pin the exact version of every mod they list, whatever those depend on is resolved as usual
+    return make_resolver(game_version).resolve(requirements, exact=True)
+
+def resolve_dependencies(local_mods:list[LocalMod]) -> InstallPlan:
+    # one resolve for everything downloaded in a batch, mods of the batch count as installed
+    resolver = make_resolver()
+    requirements:dict[str, str] = {}
+    for local_mod in local_mods:
+        resolver.installed[local_mod.mod_id_str] = local_mod
+    for local_mod in local_mods:
+        for mod_id_str, version in local_mod.dependencies.items():
+            # the highest of the lowest versions asked for covers every mod that asked
+            if mod_id_str not in requirements or not satisfies(requirements[mod_id_str], version):
+                requirements[mod_id_str] = version
+    return resolver.resolve(requirements)
+
+def describe_install_plan(plan:InstallPlan) -> str:
+    lines = []
+    for step in plan.steps:
+        required_by = ", ".join(filter(None, step.required_by)) or "the downloaded mods"
+        if step.action == "install":
+            lines.append(f"install {step.mod_id_str} {step.version} (needed by {required_by})")
+        elif step.action == "update":
+            lines.append(f"{step.mod_id_str} {step.installed.version} is installed, {required_by} needs {step.version} or newer, update it yourself")
+    lines += plan.conflicts
+    lines += [f"{mod_id} was not found on the mod db" for mod_id in plan.missing]
+    lines += [f"dependency cycle: {' -> '.join(cycle)}" for cycle in plan.cycles]
+    return "\n".join(lines)
+
+def fetch_catalog(
+    versions:list[int],
+    orderby:SearchOrderBy,
+    order_direction:SearchOrderDirection,
+    search_index:ModSearchIndex = None,
+    selected_versions:list[int] = None,
+    version_mode:FilterMode = FilterMode.ANY,
+    batch_callback = None,
+) -> tuple[ModCatalog, list[PartialMod], ModSearchIndex | None]:
+    # game version membership has to be fetched per version, the catalog itself is fetched once without filters
+    # membership of every version is kept for the facets, only selected_versions (all of them by default) filter the results
+    with ThreadPoolExecutor(max_workers=max(len(versions), 1)) as executor:
+        members = dict(zip(versions, executor.map(lambda version: set(moddb_client.get_mod_ids(versions=[version])), versions)))
+    selected = [members[version] for version in (selected_versions or versions) if version in members]
+    if version_mode == FilterMode.ALL and len(selected) > 0:
+        allowed = set.intersection(*selected)
+    else:
+        allowed = set().union(*selected)
+    
+    matching_mods = []
+    def on_batch(batch:list[PartialMod]):
+        batch = [mod for mod in batch if mod.mod_id in allowed]
+        matching_mods.extend(batch)
+        if batch_callback is not None and len(batch) > 0:
+            batch_callback(batch)
+    
+    # streamed in the requested order so the first page can be shown before the catalog is complete
+    mods = moddb_client.get_mods(orderby=orderby, order_direction=order_direction, batch_callback=on_batch)
+    catalog = ModCatalog(mods)
+    for version, mod_ids in members.items():
+        catalog.set_version_members(version, mod_ids)
+    
+    if search_index is not None:
+        # the ui keeps searching the index it has, the updated one is swapped in by on_catalog_loaded
+        updated_index = search_index.updated(mods)
+        if updated_index is not search_index:
+            updated_index.save_to_file(user_settings.cache_location)
+        updated_index.typo_lookup # built here rather than on the first search typed into the ui
+        search_index = updated_index
+    return catalog, matching_mods, search_index
+
+def search_mods_remote(
+    text:str,
+    orderby:SearchOrderBy,
+    order_direction:SearchOrderDirection,
+    versions:list[int],
+    mod_tags:list[int],
+    tag_mode:FilterMode,
+    version_mode:FilterMode = FilterMode.ANY,
+    batch_callback = None,
+) -> list[PartialMod]:
+    # the api only ands tags and ors game versions together, the other modes are done on the results instead
+    any_tags = tag_mode == FilterMode.ANY and len(mod_tags) > 1
+    all_versions = version_mode == FilterMode.ALL and len(versions) > 1
+    if not any_tags and not all_versions:
+        return moddb_client.get_mods(mod_tags=mod_tags or None, text=text, orderby=orderby, order_direction=order_direction, versions=versions, batch_callback=batch_callback)
+    
+    wanted = set(mod_tags)
+    on_every_version = None
+    if all_versions:
+        with ThreadPoolExecutor(max_workers=len(versions)) as executor:
+            on_every_version = set.intersection(*executor.map(lambda version: set(moddb_client.get_mod_ids(versions=[version])), versions))
+    def matches(mod:PartialMod) -> bool:
+        if any_tags and not any(tag is not None and tag.id in wanted for tag in mod.tags):
+            return False
+        return on_every_version is None or mod.mod_id in on_every_version
+    
+    def on_batch(batch:list[PartialMod]):
+        batch = [mod for mod in batch if matches(mod)]
+        if batch_callback is not None and len(batch) > 0:
+            batch_callback(batch)
+    
+    mods = moddb_client.get_mods(mod_tags=None if any_tags else mod_tags or None, text=text, orderby=orderby, order_direction=order_direction, versions=versions, batch_callback=on_batch)
+    return [mod for mod in mods if matches(mod)]
+
+def load_local_icon(mod:LocalMod, width:int) -> QImage | None:
+    # runs on a worker, the icon is only read out of the icon store (or the zip) here
+    icon = mod.read_icon()
+    if icon is None:
+        return None
+    image = QImage.fromData(icon)
+    if image.isNull():
+        return None
+    return image.scaledToWidth(width, Qt.TransformationMode.SmoothTransformation)
+
 class ModPreview(QFrame):
     def __init__(self, mod:PartialMod | LocalMod, mod_detail: QWidget = None):
         super().__init__()
@@ -248,7 +581,12 @@ class ModPreview(QFrame):
         self.logo_label = QLabel()
         
         if self.mod_icon != None and self.mod_icon != 'None' and isinstance(self.mod_icon, str):
-            self.fetch_logo_worker = Worker(moddb_client.fetch_to_memory, self.mod_icon)
+            self.fetch_logo_worker = Worker(image_cache.get_scaled, self.mod_icon, 280)
+            self.fetch_logo_worker.signals.result.connect(self.load_logo)
+            self.fetch_logo_worker.signals.error.connect(lambda error: self.load_placeholder_logo())
+            thread_pool.start(self.fetch_logo_worker)
+        elif isinstance(self.mod_icon, IconHandle):
+            self.fetch_logo_worker = Worker(load_local_icon, self.mod, 200)
             self.fetch_logo_worker.signals.result.connect(self.load_logo)
             self.fetch_logo_worker.signals.error.connect(lambda error: self.load_placeholder_logo())
             thread_pool.start(self.fetch_logo_worker)
@@ -325,13 +663,15 @@ class ModPreview(QFrame):
     
     
     @Slot()
-    def load_logo(self, image_data:bytes):
+    def load_logo(self, image:QImage | None):
         try:
-            result = self.logo_image.loadFromData(image_data)
-            if not result:
+            if image is None:
+                self.load_placeholder_logo()
                 return
             
-            self.logo_label.setPixmap(self.logo_image.scaledToWidth(280))
+            # already scaled on the worker thread, only converted here
+            self.logo_image = QPixmap.fromImage(image)
+            self.logo_label.setPixmap(self.logo_image)
         except:
             traceback.print_exc()
         finally:
@@ -531,25 +871,71 @@ class ModIndex(QSplitter):
         self.search_buttons_enabled = True
         self.mods = []
         self.mods_shown = 0
+        self.previews_added = 0
+        self.search_generation = 0
+        self.streamed_mods = None
+        self.catalog:ModCatalog | None = None
+        self.matching_versions_key = None
+        self.matching_versions_cache:list[int] = []
+        self.search_mod_ids:list[int] | None = None # matches of the current text search, for the facet counts
+        self.updating_tag_counts = False
+        self.search_index = ModSearchIndex.load_from_file(user_settings.cache_location)
         self.setSizePolicy(QSizePolicy.Policy.Minimum, QSizePolicy.Policy.Minimum)
         
         self.text_search_box = QLineEdit(placeholderText="Search mods by name or description")
         self.text_search_box.returnPressed.connect(self.search_mods)
+        self.text_search_box.textChanged.connect(lambda text: self.type_search_timer.start())
+        # search as you type, only used once the local catalog can answer without the api
+        self.type_search_timer = QTimer(self)
+        self.type_search_timer.setSingleShot(True)
+        self.type_search_timer.setInterval(200)
+        self.type_search_timer.timeout.connect(self.on_search_text_changed)
         self.search_sort = QComboBox()
         self.search_options = [SearchOrderBy.TRENDING, SearchOrderBy.DOWNLOADS, SearchOrderBy.COMMENTS, SearchOrderBy.FOLLOWS, SearchOrderBy.CREATED, SearchOrderBy.LAST_RELEASED]
         self.search_sort.addItems(["Trending", "Downloads", "Comments", "Follows", "Created", "Last Released"])
         self.search_sort.setCurrentIndex(0)
+        self.search_sort.currentIndexChanged.connect(lambda index: self.search_mods())
         self.search_order = QComboBox()
         self.search_order.addItems(["asc", "desc"])
         self.search_order.setCurrentIndex(1)
+        self.search_order.currentIndexChanged.connect(lambda index: self.search_mods())
         self.search_button = QPushButton("Search")
         self.search_button.setIcon(QIcon(os.path.join(APP_PATH, 'data/icons/input-search.svg')))
         self.search_button.clicked.connect(lambda: self.search_mods())
         
         self.extra_search_container = QFrame()
-        extra_search_layout = QHBoxLayout()
-        
-        # TODO: extra search widgets
+        extra_search_layout = QGridLayout()
+        extra_search_layout.setContentsMargins(0, 0, 0, 0)
+        
+        self.tag_filter_list = QListWidget()
+        self.tag_filter_list.setFlow(QListWidget.Flow.LeftToRight)
+        self.tag_filter_list.setWrapping(True)
+        self.tag_filter_list.setResizeMode(QListWidget.ResizeMode.Adjust)
+        self.tag_filter_list.setMaximumHeight(90)
+        self.tag_filter_list.itemChanged.connect(self.on_tag_filter_changed)
+        self.tag_filter_mode = QComboBox()
+        self.tag_filter_modes = [FilterMode.ALL, FilterMode.ANY]
+        self.tag_filter_mode.addItems(["Match all tags", "Match any tag"])
+        self.tag_filter_mode.currentIndexChanged.connect(lambda index: self.search_mods() if len(self.selected_tags()) > 0 else self.update_facet_counts())
+        extra_search_layout.addWidget(self.tag_filter_list, 0, 0)
+        extra_search_layout.addWidget(self.tag_filter_mode, 0, 1, Qt.AlignmentFlag.AlignTop)
+        self.populate_tag_filters()
+        
+        # releases of the users major.minor game version, all checked by default (any of them, as before)
+        self.version_filter_list = QListWidget()
+        self.version_filter_list.setFlow(QListWidget.Flow.LeftToRight)
+        self.version_filter_list.setWrapping(True)
+        self.version_filter_list.setResizeMode(QListWidget.ResizeMode.Adjust)
+        self.version_filter_list.setMaximumHeight(60)
+        self.version_filter_list.itemChanged.connect(self.on_tag_filter_changed)
+        self.version_filter_mode = QComboBox()
+        self.version_filter_modes = [FilterMode.ANY, FilterMode.ALL]
+        self.version_filter_mode.addItems(["Match any version", "Match all versions"])
+        self.version_filter_mode.currentIndexChanged.connect(lambda index: self.search_mods())
+        extra_search_layout.addWidget(self.version_filter_list, 1, 0)
+        extra_search_layout.addWidget(self.version_filter_mode, 1, 1, Qt.AlignmentFlag.AlignTop)
+        extra_search_layout.setColumnStretch(0, 1)
+        self.populate_version_filters()
         
         self.extra_search_container.setLayout(extra_search_layout)
         
@@ -595,51 +981,241 @@ class ModIndex(QSplitter):
         order_direction:SearchOrderDirection = SearchOrderDirection[self.search_order.currentText().upper()]
         search_query:str = self.text_search_box.text()
         
-        current_version_tag = moddb_client.tag_from_name('v' + user_settings.game_version)
-        matching_versions = [tag.id for tag in moddb_client.versions if tag.minor_version == current_version_tag.minor_version and tag.major_version == current_version_tag.major_version]
+        matching_versions = self.matching_versions()
+        versions = self.selected_versions()
+        version_mode:FilterMode = self.version_filter_modes[self.version_filter_mode.currentIndex()]
+        mod_tags = self.selected_tags()
+        tag_mode:FilterMode = self.tag_filter_modes[self.tag_filter_mode.currentIndex()]
+        
+        # sorting, version and tag filtering can be answered from the local catalog, the api is only asked when it is missing or stale
+        self.search_generation += 1
+        self.streamed_mods = None
+        generation = self.search_generation
+        if self.can_search_locally():
+            scores = None
+            mod_ids = None
+            if search_query.strip() != '':
+                scores = dict(self.search_index.search(search_query))
+                mod_ids = list(scores)
+            self.search_mod_ids = mod_ids
+            bits = self.catalog.filter_bits(versions=versions, version_mode=version_mode, mod_tags=mod_tags, tag_mode=tag_mode, mod_ids=mod_ids)
+            if bits is not None:
+                self.update_facet_counts(bits)
+                if scores is None:
+                    self.update_mods_list(self.catalog.select(bits, search_order, order_direction))
+                else:
+                    self.update_mods_list(self.catalog.select_ranked(bits, scores, search_order, order_direction))
+                return
         
-        self.search_worker = Worker(moddb_client.get_mods, text=search_query, orderby=search_order, order_direction=order_direction, versions=matching_versions)
-        self.search_worker.signals.result.connect(self.update_mods_list)
-        self.search_worker.signals.error.connect(lambda error: QMessageBox.critical(self, "Error", error[2]))
+        # results are streamed in, so the first page shows up while the rest of the list is still downloading
+        signals = WorkerSignals()
+        signals.partial_result.connect(lambda batch, generation=generation: self.on_search_batch(batch, generation))
+        signals.error.connect(lambda error: QMessageBox.critical(self, "Error", error[2]))
+        if search_query == '' and len(mod_tags) == 0:
+            signals.result.connect(lambda result, generation=generation: self.on_catalog_loaded(result, generation))
+            self.search_worker = Worker(fetch_catalog, matching_versions, search_order, order_direction, self.search_index, versions, version_mode, batch_callback=signals.partial_result.emit, signals=signals)
+        else:
+            signals.result.connect(lambda mods, generation=generation: self.on_search_finished(mods, generation))
+            self.search_worker = Worker(search_mods_remote, search_query, search_order, order_direction, versions, mod_tags, tag_mode, version_mode, batch_callback=signals.partial_result.emit, signals=signals)
         thread_pool.start(self.search_worker)
     
+    def matching_versions(self) -> list[int]:
+        # every release of the users major.minor game version, only recomputed when the setting or the version list changes
+        key = (user_settings.game_version, len(moddb_client.versions))
+        if key != self.matching_versions_key:
+            current_version_tag = moddb_client.tag_from_name('v' + user_settings.game_version)
+            if current_version_tag is None: # version list not loaded yet
+                return []
+            self.matching_versions_cache = [tag.id for tag in moddb_client.versions if tag.minor_version == current_version_tag.minor_version and tag.major_version == current_version_tag.major_version]
+            self.matching_versions_key = key
+        return self.matching_versions_cache
+    
+    def populate_tag_filters(self):
+        selected = set(self.selected_tags())
+        self.updating_tag_counts = True
+        self.tag_filter_list.clear()
+        for tag in sorted(moddb_client.tags, key=lambda tag: tag.name.lower()):
+            item = QListWidgetItem(tag.name)
+            item.setData(Qt.ItemDataRole.UserRole, tag.id)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked if tag.id in selected else Qt.CheckState.Unchecked)
+            self.tag_filter_list.addItem(item)
+        self.updating_tag_counts = False
+    
+    def populate_version_filters(self):
+        items = [self.version_filter_list.item(index) for index in range(self.version_filter_list.count())]
+        selected = {item.data(Qt.ItemDataRole.UserRole) for item in items if item.checkState() == Qt.CheckState.Checked} if len(items) > 0 else None
+        self.updating_tag_counts = True
+        self.version_filter_list.clear()
+        # mod tag and game version ids aren't guaranteed to be disjoint, so versions are looked up in their own list
+        version_names = {tag.id: tag.name for tag in moddb_client.versions}
+        for version_id in self.matching_versions():
+            item = QListWidgetItem(version_names[version_id])
+            item.setData(Qt.ItemDataRole.UserRole, version_id)
+            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsUserCheckable)
+            item.setCheckState(Qt.CheckState.Checked if selected is None or version_id in selected else Qt.CheckState.Unchecked)
+            self.version_filter_list.addItem(item)
+        self.updating_tag_counts = False
+    
+    def selected_versions(self) -> list[int]:
+        # with nothing checked the whole major.minor series counts, same as having everything checked in "any" mode
+        if [self.version_filter_list.item(index).data(Qt.ItemDataRole.UserRole) for index in range(self.version_filter_list.count())] != self.matching_versions():
+            self.populate_version_filters()
+        version_ids = []
+        for index in range(self.version_filter_list.count()):
+            item = self.version_filter_list.item(index)
+            if item.checkState() == Qt.CheckState.Checked:
+                version_ids.append(item.data(Qt.ItemDataRole.UserRole))
+        return version_ids if len(version_ids) > 0 else self.matching_versions()
+    
+    def selected_tags(self) -> list[int]:
+        tag_ids = []
+        for index in range(self.tag_filter_list.count()):
+            item = self.tag_filter_list.item(index)
+            if item.checkState() == Qt.CheckState.Checked:
+                tag_ids.append(item.data(Qt.ItemDataRole.UserRole))
+        return tag_ids
+    
+    @Slot()
+    def on_tag_filter_changed(self, item:QListWidgetItem):
+        if not self.updating_tag_counts:
+            self.search_mods()
+    
+    def update_facet_counts(self, bits:int = None):
+        # live "Tag (count)" and "version (count)" labels, both from the catalog bitsets: in "all" mode a count is how many
+        # current results also carry the tag or version, in "any" mode it is how many mods it would match on its own with
+        # the other filters applied
+        if self.catalog is None:
+            return
+        versions = self.selected_versions()
+        version_mode:FilterMode = self.version_filter_modes[self.version_filter_mode.currentIndex()]
+        mod_tags = self.selected_tags()
+        tag_mode:FilterMode = self.tag_filter_modes[self.tag_filter_mode.currentIndex()]
+        if bits is None:
+            bits = self.catalog.filter_bits(versions=versions, version_mode=version_mode, mod_tags=mod_tags, tag_mode=tag_mode, mod_ids=self.search_mod_ids)
+            if bits is None:
+                return
+        
+        tag_bits = bits if tag_mode == FilterMode.ALL else self.catalog.filter_bits(versions=versions, version_mode=version_mode, mod_ids=self.search_mod_ids)
+        if tag_bits is not None:
+            tag_counts = self.catalog.facet_counts(tag_bits)
+            if self.tag_filter_list.count() != len(moddb_client.tags):
+                self.populate_tag_filters()
+            self.set_facet_labels(self.tag_filter_list, {tag.id: tag.name for tag in moddb_client.tags}, tag_counts)
+        
+        version_bits = bits if version_mode == FilterMode.ALL else self.catalog.filter_bits(mod_tags=mod_tags, tag_mode=tag_mode, mod_ids=self.search_mod_ids)
+        self.set_facet_labels(self.version_filter_list, {tag.id: tag.name for tag in moddb_client.versions}, self.catalog.facet_counts(version_bits, self.catalog.version_bits))
+    
+    def set_facet_labels(self, facet_list:QListWidget, names:dict[int, str], counts:dict[int, int]):
+        self.updating_tag_counts = True
+        for index in range(facet_list.count()):
+            item = facet_list.item(index)
+            facet_id = item.data(Qt.ItemDataRole.UserRole)
+            if facet_id not in names:
+                continue
+            item.setText(f"{names[facet_id]} ({counts.get(facet_id, 0)})")
+        self.updating_tag_counts = False
+    
+    def can_search_locally(self) -> bool:
+        return self.catalog is not None and not self.catalog.is_stale() and len(self.search_index) > 0
+    
+    @Slot()
+    def on_search_text_changed(self):
+        if self.can_search_locally():
+            self.search_mods()
+    
     @Slot()
-    def update_mods_list(self, mods:list[Mod] = None):
+    def on_catalog_loaded(self, result:tuple[ModCatalog, list[PartialMod], ModSearchIndex], generation:int):
+        catalog, mods, search_index = result
+        self.catalog = catalog
+        self.search_index = search_index
+        self.on_search_finished(mods, generation)
+        if generation == self.search_generation:
+            self.search_mod_ids = None
+            self.update_facet_counts()
+    
+    @Slot()
+    def on_search_batch(self, batch:list[PartialMod], generation:int):
+        if generation != self.search_generation:
+            return
+        
+        if self.streamed_mods is None:
+            self.streamed_mods = list(batch)
+            self.clear_mods_list(self.streamed_mods)
+            self.show_more_mods()
+        else:
+            self.streamed_mods.extend(batch)
+            self.fill_current_page()
+        
+        self.result_number.setText(f"{len(self.streamed_mods)} results found so far...")
+        self.result_number.show()
+    
+    @Slot()
+    def on_search_finished(self, mods:list[PartialMod], generation:int):
+        if generation != self.search_generation:
+            return
+        
+        if self.streamed_mods is None:
+            # nothing was streamed (empty result), fall back to a normal refresh
+            self.update_mods_list(mods)
+            return
+        
+        self.streamed_mods = None
+        self.mods = mods
+        self.fill_current_page()
+        self.enable_search_buttons()
+        self.result_number.setText(f"{len(self.mods)} results found.")
+        self.result_number.show()
+    
+    def enable_search_buttons(self):
         if not self.search_buttons_enabled:
             self.search_button.setEnabled(True)
             self.search_order.setEnabled(True)
             self.search_sort.setEnabled(True)
             self.search_buttons_enabled = True
+    
+    def clear_mods_list(self, mods:list[PartialMod]):
+        for widget in self.mods_list.children():
+            if isinstance(widget, ModPreview):
+                widget.deleteLater()
+            elif isinstance(widget, QPushButton):
+                self.mods_list_layout.removeWidget(widget)
+        self.mods_shown = 0
+        self.previews_added = 0
+        self.mods = mods
+    
+    def add_mod_previews(self, mods:list[PartialMod]):
+        self.mods_list_layout.removeWidget(self.load_more_mods_button)
+        for mod in mods:
+            widget = ModPreview(mod, self.mod_detail_view)
+            self.mods_list_layout.addWidget(widget)
+        self.previews_added += len(mods)
         
-        if mods is not None or len(self.mods) < 1:
-            for widget in self.mods_list.children():
-                if isinstance(widget, ModPreview):
-                    # try:
-                    #     # downloader.disable_buttons.remove(widget.quick_download_button)
-                    # except:
-                    #     pass
-                    widget.deleteLater()
-                elif isinstance(widget, QPushButton):
-                    self.mods_list_layout.removeWidget(widget)
-            self.mods_shown = 0
-            self.mods = mods
-        
-        previous_shown = self.mods_shown
+        if self.mods_shown <= len(self.mods):
+            self.mods_list_layout.addWidget(self.load_more_mods_button)
+        self.scroll_area.updateGeometry()
+    
+    def show_more_mods(self):
         self.mods_shown += 100
-        mods_to_add = self.mods[previous_shown:self.mods_shown]
+        self.fill_current_page()
+    
+    def fill_current_page(self):
+        # adds previews for mods that arrived after the current page was first shown
+        target = min(self.mods_shown, len(self.mods))
+        self.add_mod_previews(self.mods[self.previews_added:target])
+    
+    @Slot()
+    def update_mods_list(self, mods:list[PartialMod] = None):
+        self.enable_search_buttons()
         
-        for mod in mods_to_add:
-            widget = ModPreview(mod, self.mod_detail_view)
-            # downloader.disable_buttons.append(widget.quick_download_button)
-            self.mods_list_layout.addWidget(widget)
+        if mods is not None or len(self.mods) < 1:
+            self.clear_mods_list(mods)
+        
+        self.show_more_mods()
         
         if mods is not None:
             self.result_number.setText(f"{len(self.mods)} results found.")
             self.result_number.show()
-        if self.mods_shown <= len(self.mods):
-            self.mods_list_layout.addWidget(self.load_more_mods_button)
-        
-        self.scroll_area.updateGeometry()
 
 
 class CommentView(QFrame):
@@ -823,7 +1399,7 @@ class ModDetail(QScrollArea):
         self.primary_image_widget.setMaximumSize(560, 350)
         self.primary_image_widget.setObjectName("mod_view_primary_image")
         
-        self.fetch_image_worker = Worker(moddb_client.fetch_to_memory, self.mod.logo_file)
+        self.fetch_image_worker = Worker(image_cache.get_scaled, self.mod.logo_file, 560)
         self.fetch_image_worker.signals.result.connect(self.load_primary_image)
         thread_pool.start(self.fetch_image_worker)
         
@@ -885,13 +1461,13 @@ class ModDetail(QScrollArea):
             self.show()
     
     @Slot()
-    def load_primary_image(self, image_data:bytes):
+    def load_primary_image(self, image:QImage | None):
         try:
-            result = self.primary_image.loadFromData(image_data)
-            if not result:
+            if image is None:
                 return
             
-            self.primary_image_widget.setPixmap(self.primary_image.scaledToWidth(560))
+            self.primary_image = QPixmap.fromImage(image)
+            self.primary_image_widget.setPixmap(self.primary_image)
         except:
             traceback.print_exc()
         finally:
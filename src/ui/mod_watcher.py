@@ -0,0 +1,169 @@
+import os
+import traceback
+
+from . import thread_pool, user_settings
+from .worker import Worker
+from mod_info_parser import LocalMod, get_mod_info, file_signature
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, QTimer, Signal, Slot
+
+DEBOUNCE_INTERVAL = 300 # ms, a copy or download touches the folder many times before it settles
+
+# path -> signature of the zips the downloader registered itself, the watcher leaves them alone until they change again
+registered_downloads:dict[str, tuple[int, int, int]] = {}
+
+
+def list_mod_files(directory:str) -> dict[str, tuple[int, int, int]]:
+    # path -> signature, stats only, no zip is opened
+    if not os.path.isdir(directory):
+        return {}
+    return {
+        os.path.join(directory, entry.name): file_signature(entry)
+        for entry in os.scandir(directory) if entry.is_file() and entry.name.endswith('.zip')
+    }
+
+def path_signature(mod_path:str) -> tuple[int, int, int]:
+    # same as file_signature, for a path instead of a scandir entry
+    stat = os.stat(mod_path)
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+def register_download(mod_path:str) -> LocalMod:
+    # the downloader's way in: the zip is parsed once, whichever of the two sees it first, and the watcher then skips it
+    mod_path = os.path.normpath(mod_path)
+    signature = path_signature(mod_path)
+    registered_downloads[mod_path] = signature
+    
+    local_mod = user_settings.get_mod_at_path(mod_path)
+    if local_mod is not None and user_settings.scan_index.lookup(mod_path, signature) is not None:
+        # the watcher got to it first
+        return local_mod
+    
+    local_mod = get_mod_info(mod_path, user_settings.icon_store)
+    user_settings.scan_index.store(mod_path, signature, local_mod)
+    user_settings.put_local_mod(local_mod)
+    return local_mod
+
+def is_registered(mod_path:str, signature:tuple[int, int, int]) -> bool:
+    return registered_downloads.get(mod_path) == signature
+
+def parse_mod_files(mod_paths:list[tuple[str, tuple[int, int, int]]]) -> list[tuple[str, tuple[int, int, int], LocalMod | None]]:
+    # runs on a worker, a zip that is still being written fails here and is picked up again by its next change
+    results = []
+    for mod_path, signature in mod_paths:
+        try:
+            local_mod = get_mod_info(mod_path, user_settings.icon_store)
+        except Exception:
+            print(f"Failed to scan mod: {mod_path}")
+            traceback.print_exc()
+            local_mod = None
+        results.append((mod_path, signature, local_mod))
+    return results
+
+
+class ModWatcher(QObject):
+    # keeps user_settings.downloaded_mods in step with the download folder and the game Mods folder while the app runs
+    # every change is diffed against the last listing of its folder, so only added or changed zips get parsed
+    mod_added = Signal(object) # LocalMod
+    mod_removed = Signal(object) # LocalMod
+    mod_changed = Signal(object, object) # old LocalMod, new LocalMod
+
+    def __init__(self, parent:QObject = None):
+        super().__init__(parent)
+        self.download_directory = os.path.normpath(user_settings.mod_download_location)
+        self.game_mods_directory = os.path.normpath(os.path.join(user_settings.game_data_path, 'Mods'))
+        self.listings:dict[str, dict[str, tuple[int, int, int]]] = {
+            directory: list_mod_files(directory) for directory in [self.download_directory, self.game_mods_directory]
+        }
+        self.dirty_directories:set[str] = set()
+        self.parse_worker = None
+
+        self.watcher = QFileSystemWatcher(self)
+        # directories report files being added, removed and renamed, the zips themselves report being written in place
+        self.watcher.addPaths([directory for directory in self.listings if os.path.isdir(directory)])
+        for listing in self.listings.values():
+            if len(listing) > 0:
+                self.watcher.addPaths(list(listing))
+        self.watcher.directoryChanged.connect(self.on_directory_changed)
+        self.watcher.fileChanged.connect(lambda path: self.on_directory_changed(os.path.dirname(path)))
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(DEBOUNCE_INTERVAL)
+        self.debounce_timer.timeout.connect(self.process_changes)
+
+    @Slot()
+    def on_directory_changed(self, directory:str):
+        self.dirty_directories.add(os.path.normpath(directory))
+        self.debounce_timer.start()
+
+    @Slot()
+    def process_changes(self):
+        if self.parse_worker is not None:
+            # one parse at a time, whatever changes meanwhile is handled once it is done
+            self.debounce_timer.start()
+            return
+
+        to_parse = []
+        for directory in self.dirty_directories:
+            if directory not in self.listings:
+                continue
+            old_listing = self.listings[directory]
+            new_listing = list_mod_files(directory)
+            self.listings[directory] = new_listing
+
+            removed = [mod_path for mod_path in old_listing if mod_path not in new_listing]
+            added = [mod_path for mod_path in new_listing if mod_path not in old_listing]
+            changed = [mod_path for mod_path in new_listing if mod_path in old_listing and old_listing[mod_path] != new_listing[mod_path]]
+
+            if len(removed) > 0:
+                self.watcher.removePaths(removed)
+            if len(added) > 0:
+                self.watcher.addPaths(added)
+            user_settings.scan_index.prune(directory, new_listing.keys())
+
+            for mod_path in removed:
+                registered_downloads.pop(mod_path, None)
+                # enabling or disabling a mod renames it away, the app already moved its LocalMod along
+                local_mod = user_settings.get_mod_at_path(mod_path)
+                if local_mod is not None:
+                    user_settings.downloaded_mods.remove(local_mod)
+                    self.mod_removed.emit(local_mod)
+            for mod_path in added:
+                # same for the other end of such a rename, and for downloads that were registered on completion
+                if user_settings.get_mod_at_path(mod_path) is None and not is_registered(mod_path, new_listing[mod_path]):
+                    to_parse.append((mod_path, new_listing[mod_path]))
+            for mod_path in changed:
+                if not is_registered(mod_path, new_listing[mod_path]):
+                    to_parse.append((mod_path, new_listing[mod_path]))
+        self.dirty_directories.clear()
+
+        if len(to_parse) > 0:
+            self.parse_worker = Worker(parse_mod_files, to_parse)
+            self.parse_worker.signals.result.connect(self.apply_parsed_mods)
+            self.parse_worker.signals.finished.connect(self.on_parse_finished)
+            thread_pool.start(self.parse_worker)
+
+    @Slot()
+    def on_parse_finished(self):
+        self.parse_worker = None
+
+    @Slot()
+    def apply_parsed_mods(self, results:list[tuple[str, tuple[int, int, int], LocalMod | None]]):
+        for mod_path, signature, local_mod in results:
+            if local_mod is None or is_registered(mod_path, signature):
+                # the downloader registered the same file while this parse was running
+                continue
+            user_settings.scan_index.store(mod_path, signature, local_mod)
+
+            if os.path.dirname(mod_path) == self.game_mods_directory:
+                local_mod.is_enabled = True
+                local_mod.install_location = os.path.join(user_settings.mod_download_location, os.path.basename(mod_path))
+
+            old_mod = user_settings.get_mod_at_path(mod_path)
+            if old_mod is not None and old_mod.mod_id_str == local_mod.mod_id_str and old_mod.version == local_mod.version:
+                local_mod.full_mod_info = old_mod.full_mod_info
+            user_settings.put_local_mod(local_mod)
+            if old_mod is None:
+                self.mod_added.emit(local_mod)
+            else:
+                self.mod_changed.emit(old_mod, local_mod)
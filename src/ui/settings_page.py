@@ -1,16 +1,37 @@
 import os
+import json
 import traceback
 
-from . import moddb_client, thread_pool, user_settings
+from . import image_cache, moddb_client, thread_pool, user_settings
 from settings import locate_user_settings_path, get_installed_game_version, APP_PATH
 from .worker import Worker, WorkerSignals
+from .mod_index import format_size
+from vsmoddb.metrics import CACHE_OUTCOMES
 from vsmoddb.models import Mod, Comment, ModRelease
 
-from PySide6.QtWidgets import QStackedWidget, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QLineEdit, QComboBox, QLabel, QPushButton, QScrollArea, QGraphicsPixmapItem, QSizePolicy, QFrame, QProgressDialog, QMessageBox, QFormLayout
-from PySide6.QtCore import Slot, QSize, QThread, QObject, QThreadPool, QUrl
+from PySide6.QtWidgets import QStackedWidget, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout, QLineEdit, QComboBox, QLabel, QPushButton, QScrollArea, QGraphicsPixmapItem, QSizePolicy, QFrame, QProgressDialog, QMessageBox, QFormLayout, QSpinBox, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView, QFileDialog
+from PySide6.QtCore import Slot, QSize, QThread, QObject, QThreadPool, QUrl, QTimer, QByteArray, Qt
 from PySide6.QtGui import QPixmap, QColor, QPalette, QDesktopServices, QIcon
 from httpx import HTTPStatusError
 
+def format_latency(seconds:float) -> str:
+    return f"{seconds * 1000:.0f} ms"
+
+# (header, value) for the network table, None is the endpoint name itself
+NETWORK_COLUMNS = [
+    ("Endpoint", None),
+    ("Requests", lambda metrics: str(metrics['requests'])),
+    ("Errors", lambda metrics: str(metrics['errors'])),
+    ("Not Modified", lambda metrics: str(metrics['not_modified'])),
+    ("Transferred", lambda metrics: format_size(metrics['bytes'])),
+    ("Mean", lambda metrics: format_latency(metrics['latency_mean'])),
+    ("p95", lambda metrics: format_latency(metrics['latency_p95'])),
+    ("Max", lambda metrics: format_latency(metrics['latency_max'])),
+] + [
+    (outcome.replace('_', ' ').title(), lambda metrics, outcome=outcome: str(metrics[outcome]))
+    for outcome in CACHE_OUTCOMES
+]
+
 # TODO: this is very similar to the first time launch popup as of now since there is not many settings to be changed
 
 class SettingsPage(QWidget):
@@ -25,9 +46,42 @@ class SettingsPage(QWidget):
         self.reset_cache_button = QPushButton("Reset Cache")
         self.reset_cache_button.setIcon(QIcon(os.path.join(APP_PATH, 'data/icons/refresh.svg')))
         self.reset_cache_button.setMaximumSize(200, 30)
-        self.reset_cache_button.clicked.connect(lambda: moddb_client.cache_manager.clear())
+        self.reset_cache_button.clicked.connect(lambda: self.on_reset_cache_clicked())
+        self.cache_stats_label = QLabel()
+        self.cache_stats_timer = QTimer(self)
+        self.cache_stats_timer.setInterval(1000)
+        self.cache_stats_timer.timeout.connect(self.update_cache_stats)
+        self.reset_cache_container = QWidget()
+        self.reset_cache_container.setLayout(QHBoxLayout())
+        self.reset_cache_container.layout().setContentsMargins(0, 0, 0, 0)
+        self.reset_cache_container.layout().addWidget(self.reset_cache_button)
+        self.reset_cache_container.layout().addWidget(self.cache_stats_label, 1)
         self.layout().addWidget(self.open_settings_folder_button)
-        self.layout().addWidget(self.reset_cache_button)
+        self.layout().addWidget(self.reset_cache_container)
+        
+        self.network_title = QLabel("<h2>Network</h2>")
+        self.layout().addWidget(self.network_title)
+        self.network_table = QTableWidget(0, len(NETWORK_COLUMNS))
+        self.network_table.setHorizontalHeaderLabels([name for name, _value in NETWORK_COLUMNS])
+        self.network_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.network_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.network_table.verticalHeader().setVisible(False)
+        self.network_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.network_table.setMinimumHeight(160)
+        self.layout().addWidget(self.network_table)
+        self.export_metrics_button = QPushButton("Export Metrics")
+        self.export_metrics_button.setMaximumSize(200, 30)
+        self.export_metrics_button.clicked.connect(self.on_export_metrics_clicked)
+        self.reset_metrics_button = QPushButton("Reset Metrics")
+        self.reset_metrics_button.setMaximumSize(200, 30)
+        self.reset_metrics_button.clicked.connect(self.on_reset_metrics_clicked)
+        self.metrics_buttons_container = QWidget()
+        self.metrics_buttons_container.setLayout(QHBoxLayout())
+        self.metrics_buttons_container.layout().setContentsMargins(0, 0, 0, 0)
+        self.metrics_buttons_container.layout().addWidget(self.export_metrics_button)
+        self.metrics_buttons_container.layout().addWidget(self.reset_metrics_button)
+        self.metrics_buttons_container.layout().addStretch(1)
+        self.layout().addWidget(self.metrics_buttons_container)
         
         self.app_settings_title = QLabel("<h2>Mod Manager Settings</h2>")
         self.layout().addWidget(self.app_settings_title)
@@ -41,6 +95,12 @@ class SettingsPage(QWidget):
         self.mod_install_location_line_edit = QLineEdit(user_settings.mod_download_location)
         self.mod_install_location_line_edit.textChanged.connect(lambda text: self.on_anything_changed())
         self.app_settings_container.layout().addRow("Mod Install Location:", self.mod_install_location_line_edit)
+        self.json_cache_budget_spin_box = QSpinBox(minimum=1, maximum=4096, suffix=" MB", value=user_settings.json_cache_budget_mb)
+        self.json_cache_budget_spin_box.valueChanged.connect(lambda value: self.on_anything_changed())
+        self.app_settings_container.layout().addRow("Response Cache Memory:", self.json_cache_budget_spin_box)
+        self.image_cache_budget_spin_box = QSpinBox(minimum=1, maximum=4096, suffix=" MB", value=user_settings.image_cache_budget_mb)
+        self.image_cache_budget_spin_box.valueChanged.connect(lambda value: self.on_anything_changed())
+        self.app_settings_container.layout().addRow("Image Cache Size:", self.image_cache_budget_spin_box)
         
         self.layout().addWidget(self.app_settings_container)
         
@@ -73,6 +133,60 @@ class SettingsPage(QWidget):
         self.save_settings_button.clicked.connect(self.on_save_settings_clicked)
         self.layout().addWidget(self.save_settings_button)
     
+    def showEvent(self, event):
+        self.update_cache_stats()
+        self.cache_stats_timer.start()
+        super().showEvent(event)
+    
+    def hideEvent(self, event):
+        self.cache_stats_timer.stop()
+        super().hideEvent(event)
+    
+    @Slot()
+    def update_cache_stats(self):
+        stats = moddb_client.cache_manager.stats()
+        request_stats = moddb_client.request_stats
+        self.cache_stats_label.setText(" | ".join(
+            [
+                f"{name}: {format_size(stats[kind]['bytes'])} of {format_size(stats[kind]['budget'])} in memory, {stats[kind]['entries']} entries, {stats[kind]['evictions']} evicted"
+                for kind, name in [("json", "Responses"), ("blob", "Images")]
+            ] + [
+                f"Requests: {request_stats['hits']} hits, {request_stats['stale_hits']} stale hits, {request_stats['misses']} misses, {request_stats['coalesced']} coalesced"
+            ]
+        ))
+        self.update_network_table()
+    
+    def update_network_table(self):
+        endpoints = moddb_client.metrics.snapshot()["endpoints"]
+        self.network_table.setRowCount(len(endpoints))
+        for row, (endpoint, metrics) in enumerate(endpoints.items()):
+            for column, (_name, value) in enumerate(NETWORK_COLUMNS):
+                text = endpoint if value is None else value(metrics)
+                item = self.network_table.item(row, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    if column > 0:
+                        item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                    self.network_table.setItem(row, column, item)
+                if item.text() != text:
+                    item.setText(text)
+    
+    @Slot()
+    def on_export_metrics_clicked(self):
+        json_data = json.dumps(moddb_client.metrics.snapshot(), indent=4)
+        QFileDialog.saveFileContent(QByteArray.fromStdString(json_data), "network_metrics.json", self)
+    
+    @Slot()
+    def on_reset_metrics_clicked(self):
+        moddb_client.metrics.reset()
+        self.update_cache_stats()
+    
+    @Slot()
+    def on_reset_cache_clicked(self):
+        moddb_client.cache_manager.clear()
+        image_cache.clear()
+        self.update_cache_stats()
+    
     @Slot()
     def on_anything_changed(self):
         self.save_settings_button.setEnabled(True)
@@ -113,6 +227,13 @@ class SettingsPage(QWidget):
         user_settings.game_path = game_path
         user_settings.game_data_path = game_data_path
         user_settings.mod_download_location = mod_download_location
+        user_settings.json_cache_budget_mb = self.json_cache_budget_spin_box.value()
+        user_settings.image_cache_budget_mb = self.image_cache_budget_spin_box.value()
+        moddb_client.cache_manager.set_budgets(
+            user_settings.json_cache_budget_mb * 1024 * 1024,
+            user_settings.image_cache_budget_mb * 1024 * 1024,
+        )
+        image_cache.set_budget(user_settings.image_cache_budget_mb * 1024 * 1024)
         user_settings.save()
         self.save_settings_button.setEnabled(False)
     
\ No newline at end of file
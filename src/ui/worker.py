@@ -1,13 +1,15 @@
+import time
 import traceback
 from PySide6.QtCore import QRunnable, Signal, Slot, QObject
 
 class WorkerSignals(QObject):
     finished = Signal()
     result = Signal(object)
+    partial_result = Signal(object)
     error = Signal(tuple)
-    progress = Signal(int)
+    progress = Signal(object) # byte counts can pass 2^31
     progress_end = Signal(int)
-    progress_start = Signal(int)
+    progress_start = Signal(object)
 
 class Worker(QRunnable):
     def __init__(self, fn, *args, **kwargs):
@@ -29,4 +31,26 @@ class Worker(QRunnable):
             traceback.print_exc()
             self.signals.error.emit((type(e), e, traceback.format_exc()))
         finally:
-            self.signals.finished.emit()
\ No newline at end of file
+            self.signals.finished.emit()
+
+class ProgressThrottle:
+    # sums progress reported on a worker thread and passes the running total on at most once per interval,
+    # so a download queues a handful of cross thread signals per second instead of one per chunk
+    def __init__(self, emit, interval:float = 0.1):
+        self.emit = emit
+        self.interval = interval
+        self.total = 0
+        self.reported = 0
+        self.last_emit = 0.0
+    
+    def __call__(self, amount:int):
+        self.total += amount
+        now = time.monotonic()
+        if now - self.last_emit >= self.interval:
+            self.last_emit = now
+            self.flush()
+    
+    def flush(self):
+        if self.total != self.reported:
+            self.reported = self.total
+            self.emit(self.total)
@@ -0,0 +1,170 @@
+import asyncio
+import json
+
+from .client import BaseModDbClient, CacheManager, BASE_URL, cache_policy
+from .models import (
+    Tag,
+    Comment,
+    User,
+    ChangeLog,
+    SearchOrderBy,
+    SearchOrderDirection,
+    Mod,
+    PartialMod,
+)
+from .registry import ModDbRegistry
+from .metrics import RequestMetrics, RequestTimer, api_endpoint, url_endpoint
+
+import httpx
+
+DEFAULT_MAX_CONCURRENCY = 10
+
+
+class AsyncModDbClient(BaseModDbClient):
+    def __init__(self, registry:ModDbRegistry = None, max_concurrency:int = DEFAULT_MAX_CONCURRENCY, metrics:RequestMetrics = None):
+        # pass in the registry of an existing ModDbClient to skip refetching tags, versions and authors
+        # and its metrics to have these requests show up next to the ones it made itself
+        super().__init__(registry, metrics)
+        self.max_concurrency = max_concurrency
+        self.__http_client = httpx.AsyncClient(headers=self.headers, base_url=BASE_URL)
+
+    async def __aenter__(self):
+        if len(self.registry.tags) == 0 or len(self.registry.versions) == 0:
+            await self.refresh_registry()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        await self.__http_client.aclose()
+
+    async def refresh_registry(self):
+        await asyncio.gather(
+            self.update_mod_tags(),
+            self.update_game_versions(),
+            self.get_all_users(),
+        )
+
+    async def get_api(self, interface: str, get_params: str = None, *args, **kwargs) -> dict:
+        request = self.__http_client.build_request(
+            "GET", f"/api/{interface}{f"?{get_params}" if get_params != None else ""}"
+        )
+        with RequestTimer(self.metrics, api_endpoint(interface)) as timer:
+            response = await self.__http_client.send(request)
+            timer.size = len(response.content)
+            response.raise_for_status()
+
+        return self.check_response(json.loads(response.text))
+
+    async def get_list_like(
+        self, interface: str, object_key: str, to_run, get_params: str = None, many: bool = False
+    ) -> list:
+        raw_object = await self.get_api(interface, get_params)
+        objects = []
+        if many:
+            to_run(objects, raw_object[object_key])
+            return objects
+        for object in raw_object[object_key]:
+            to_run(objects, object)
+        return objects
+
+    async def update_mod_tags(self) -> list[Tag]:
+        tags = await self.get_list_like("tags", "tags", self.add_tag)
+        self.registry.update(tags=tags)
+        return tags
+
+    async def update_game_versions(self) -> list[Tag]:
+        versions = await self.get_list_like("gameversions", "gameversions", self.add_game_version)
+        self.registry.update(versions=versions)
+        return versions
+
+    async def get_all_users(self) -> list[User]:
+        users = await self.get_list_like("authors", "authors", self.add_user)
+        self.registry.update(authors=users)
+        return users
+
+    async def get_comments(self, asset_id: int) -> list[Comment]:
+        return await self.get_list_like("comments/" + str(asset_id), "comments", self.add_comment)
+
+    async def get_changelogs(self, asset_id: int) -> list[ChangeLog]:
+        return await self.get_list_like("changelogs/" + str(asset_id), "changelogs", self.add_changelog)
+
+    async def get_mods(
+        self,
+        mod_tags: list[Tag] = None,
+        version: Tag = None,
+        versions: list[Tag] = None,
+        author: User = None,
+        text: str = None,
+        orderby: SearchOrderBy = SearchOrderBy.TRENDING,
+        order_direction: SearchOrderDirection = SearchOrderDirection.DESC,
+    ) -> list[PartialMod]:
+        get_params = self.mods_get_params(mod_tags, version, versions, author, text, orderby, order_direction)
+        return await self.get_list_like("mods", "mods", self.add_partial_mods, get_params=get_params, many=True)
+
+    async def get_mod(self, mod_id: int | str) -> Mod:
+        raw_mod = (await self.get_api(f"mod/{mod_id}"))['mod']
+        return self.build_mod(raw_mod)
+
+    async def fetch_to_memory(self, url:str, *args, **kwargs) -> bytes:
+        with RequestTimer(self.metrics, url_endpoint("fetch", url)) as timer:
+            response = await self.__http_client.get(url)
+            timer.size = len(response.content)
+            response.raise_for_status()
+        return response.content
+
+    async def gather_limited(self, to_run, items:list, max_concurrency:int = None, return_exceptions:bool = False) -> list:
+        # runs to_run(item) for every item with at most max_concurrency requests in flight, results keep the order of items
+        semaphore = asyncio.Semaphore(max_concurrency if max_concurrency is not None else self.max_concurrency)
+
+        async def run(item):
+            async with semaphore:
+                return await to_run(item)
+
+        return await asyncio.gather(*[run(item) for item in items], return_exceptions=return_exceptions)
+
+    async def get_mod_many(self, mod_ids:list[int | str], max_concurrency:int = None, return_exceptions:bool = False) -> list[Mod]:
+        return await self.gather_limited(self.get_mod, mod_ids, max_concurrency, return_exceptions)
+
+    async def get_comments_many(self, asset_ids:list[int], max_concurrency:int = None, return_exceptions:bool = False) -> list[list[Comment]]:
+        return await self.gather_limited(self.get_comments, asset_ids, max_concurrency, return_exceptions)
+
+    async def fetch_to_memory_many(self, urls:list[str], max_concurrency:int = None, return_exceptions:bool = False) -> list[bytes]:
+        return await self.gather_limited(self.fetch_to_memory, urls, max_concurrency, return_exceptions)
+
+
+class AsyncCachedModDbClient(AsyncModDbClient):
+    def __init__(self, cache_manager:CacheManager, registry:ModDbRegistry = None, max_concurrency:int = DEFAULT_MAX_CONCURRENCY, metrics:RequestMetrics = None):
+        self.cache_manager = cache_manager
+        super().__init__(registry, max_concurrency, metrics)
+
+    async def get_api(self, interface, get_params = None, *args, **kwargs):
+        # same keys as CachedModDbClient so both clients can share one cache
+        key = f"{interface}_{get_params}"
+        cached = self.cache_manager.lookup(key)
+
+        # batch fetches have nothing to refresh stale entries in the background, so only fresh entries count as hits
+        if cached is not None and cached[1]:
+            self.metrics.record_cache(api_endpoint(interface), "hits")
+            return cached[0]
+
+        self.metrics.record_cache(api_endpoint(interface), "misses")
+        response = await super().get_api(interface, get_params, *args, **kwargs)
+        self.cache_manager.set(key, response, *cache_policy(key))
+
+        return response
+
+    async def fetch_to_memory(self, url, *args, **kwargs):
+        key = f"{url}"
+        cached = self.cache_manager.lookup(key)
+
+        if cached is not None and cached[1]:
+            self.metrics.record_cache(url_endpoint("fetch", url), "hits")
+            return cached[0]
+
+        self.metrics.record_cache(url_endpoint("fetch", url), "misses")
+        response = await super().fetch_to_memory(url, *args, **kwargs)
+        self.cache_manager.set(key, response, *cache_policy(key))
+
+        return response
@@ -0,0 +1,169 @@
+import time
+from array import array
+from enum import Enum
+
+from .models import PartialMod, SearchOrderBy, SearchOrderDirection, User
+
+DEFAULT_MAX_AGE = 60 * 15 # seconds, same as the default cache expiry
+
+
+def to_bitset(positions, size:int) -> int:
+    mask = bytearray((size + 7) // 8)
+    for position in positions:
+        mask[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(mask, 'little')
+
+
+class FilterMode(Enum):
+    ALL = "all"
+    ANY = "any"
+
+
+class ModCatalog:
+    # in memory copy of the /api/mods catalog that can answer sort and filter queries without going back to the api
+    def __init__(self, mods:list[PartialMod], max_age:int = DEFAULT_MAX_AGE):
+        self.mods = mods
+        self.built_at = time.time()
+        self.max_age = max_age
+
+        self.positions:dict[int, int] = {mod.mod_id: position for position, mod in enumerate(mods)}
+        self.columns:dict[SearchOrderBy, array] = {
+            SearchOrderBy.TRENDING: array('q', [mod.trending_points for mod in mods]),
+            SearchOrderBy.DOWNLOADS: array('q', [mod.downloads for mod in mods]),
+            SearchOrderBy.COMMENTS: array('q', [mod.comments for mod in mods]),
+            SearchOrderBy.FOLLOWS: array('q', [mod.follows for mod in mods]),
+            # partial mods don't carry a creation date, asset ids are handed out in creation order so they sort the same way
+            SearchOrderBy.CREATED: array('q', [mod.asset_id for mod in mods]),
+            SearchOrderBy.LAST_RELEASED: array('d', [mod.last_released.timestamp() for mod in mods]),
+        }
+
+        # every tag, author and game version maps to a bitset over catalog positions (bit n set = self.mods[n] matches)
+        tag_positions:dict[int, list[int]] = {}
+        author_positions:dict[int, list[int]] = {}
+        for position, mod in enumerate(mods):
+            for tag in mod.tags:
+                if tag is not None:
+                    tag_positions.setdefault(tag.id, []).append(position)
+            if mod.author is not None:
+                author_positions.setdefault(mod.author.user_id, []).append(position)
+        self.all_bits = (1 << len(mods)) - 1
+        self.tag_bits:dict[int, int] = {tag_id: to_bitset(positions, len(mods)) for tag_id, positions in tag_positions.items()}
+        self.author_bits:dict[int, int] = {author_id: to_bitset(positions, len(mods)) for author_id, positions in author_positions.items()}
+        self.version_bits:dict[int, int] = {}
+
+        self._permutations:dict[SearchOrderBy, list[int]] = {}
+        self._ranks:dict[SearchOrderBy, array] = {}
+
+    def __len__(self):
+        return len(self.mods)
+
+    def is_stale(self) -> bool:
+        return time.time() > self.built_at + self.max_age
+
+    def set_version_members(self, version_id:int, mod_ids:list[int]):
+        # the catalog entries don't list game versions, so membership comes from a separate version filtered request
+        self.version_bits[version_id] = to_bitset([self.positions[mod_id] for mod_id in mod_ids if mod_id in self.positions], len(self.mods))
+
+    def has_versions(self, version_ids:list[int]) -> bool:
+        return all(version_id in self.version_bits for version_id in version_ids)
+
+    def permutation(self, orderby:SearchOrderBy) -> list[int]:
+        # ascending order of catalog positions, computed once per column
+        permutation = self._permutations.get(orderby)
+        if permutation is None:
+            permutation = sorted(range(len(self.mods)), key=self.columns[orderby].__getitem__)
+            self._permutations[orderby] = permutation
+        return permutation
+
+    def ranks(self, orderby:SearchOrderBy) -> array:
+        # catalog position -> its place in the ascending order of a column, the inverse of permutation
+        ranks = self._ranks.get(orderby)
+        if ranks is None:
+            ranks = array('q', bytes(8 * len(self.mods)))
+            for rank, position in enumerate(self.permutation(orderby)):
+                ranks[position] = rank
+            self._ranks[orderby] = ranks
+        return ranks
+
+    def combine(self, bitsets:list[int], mode:FilterMode) -> int:
+        if mode == FilterMode.ANY:
+            result = 0
+            for bits in bitsets:
+                result |= bits
+        else:
+            result = self.all_bits
+            for bits in bitsets:
+                result &= bits
+        return result
+
+    def filter_bits(
+        self,
+        versions:list[int] = None,
+        version_mode:FilterMode = FilterMode.ANY,
+        author:User = None,
+        mod_tags:list[int] = None,
+        tag_mode:FilterMode = FilterMode.ALL,
+        mod_ids:list[int] = None,
+    ) -> int | None:
+        # returns None when the catalog can't answer the query and the api has to be asked instead
+        if versions and not self.has_versions(versions):
+            return None
+
+        bits = self.all_bits
+        if versions:
+            bits &= self.combine([self.version_bits[version_id] for version_id in versions], version_mode)
+        if author is not None:
+            bits &= self.author_bits.get(author.user_id, 0)
+        if mod_tags:
+            bits &= self.combine([self.tag_bits.get(tag_id, 0) for tag_id in mod_tags], tag_mode)
+        if mod_ids is not None:
+            bits &= to_bitset([self.positions[mod_id] for mod_id in mod_ids if mod_id in self.positions], len(self.mods))
+        return bits
+
+    def facet_counts(self, bits:int, facets:dict[int, int] = None) -> dict[int, int]:
+        # how many of the mods in bits carry each tag (or each entry of another facet, ie. version_bits)
+        facets = self.tag_bits if facets is None else facets
+        return {facet_id: (bits & facet_bits).bit_count() for facet_id, facet_bits in facets.items()}
+
+    def select(self, bits:int, orderby:SearchOrderBy = SearchOrderBy.TRENDING, order_direction:SearchOrderDirection = SearchOrderDirection.DESC) -> list[PartialMod]:
+        order = self.permutation(orderby if orderby is not None else SearchOrderBy.TRENDING)
+        if order_direction != SearchOrderDirection.ASC:
+            order = reversed(order)
+
+        if bits == self.all_bits:
+            return [self.mods[position] for position in order]
+        mask = bits.to_bytes((len(self.mods) + 7) // 8, 'little')
+        return [self.mods[position] for position in order if mask[position >> 3] >> (position & 7) & 1]
+
+    def select_ranked(
+        self,
+        bits:int,
+        scores:dict[int, float],
+        orderby:SearchOrderBy = SearchOrderBy.TRENDING,
+        order_direction:SearchOrderDirection = SearchOrderDirection.DESC,
+    ) -> list[PartialMod]:
+        # text search results: best match first, the selected sort order only decides between equally good matches
+        ranks = self.ranks(orderby if orderby is not None else SearchOrderBy.TRENDING)
+        mask = bits.to_bytes((len(self.mods) + 7) // 8, 'little')
+        matches = [(self.positions[mod_id], score) for mod_id, score in scores.items() if mod_id in self.positions]
+        matches = [match for match in matches if mask[match[0] >> 3] >> (match[0] & 7) & 1]
+        # two stable sorts, the second one keeps the order of the first between equal scores
+        matches.sort(key=lambda match: ranks[match[0]], reverse=order_direction != SearchOrderDirection.ASC)
+        matches.sort(key=lambda match: match[1], reverse=True)
+        return [self.mods[position] for position, _score in matches]
+
+    def query(
+        self,
+        orderby:SearchOrderBy = SearchOrderBy.TRENDING,
+        order_direction:SearchOrderDirection = SearchOrderDirection.DESC,
+        versions:list[int] = None,
+        author:User = None,
+        mod_tags:list[int] = None,
+        mod_ids:list[int] = None,
+        version_mode:FilterMode = FilterMode.ANY,
+        tag_mode:FilterMode = FilterMode.ALL,
+    ) -> list[PartialMod] | None:
+        bits = self.filter_bits(versions, version_mode, author, mod_tags, tag_mode, mod_ids)
+        if bits is None:
+            return None
+        return self.select(bits, orderby, order_direction)
@@ -1,8 +1,20 @@
+import io
+import re
+import sys
+import codecs
 import json
+import functools
+import hashlib
 import pickle
 import time
 import traceback
 import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from itertools import repeat
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, Future
 
 from .models import (
     Tag,
@@ -14,30 +26,83 @@ from .models import (
     SearchOrderDirection,
     Mod,
     PartialMod,
+    PartialModColumns,
     ModRelease,
     ModScreenshot,
 )
+from .registry import ModDbRegistry
+from .metrics import RequestMetrics, RequestTimer, api_endpoint, url_endpoint
+from .stream_parser import JsonArrayStreamer
 
 import httpx
 from PySide6.QtWidgets import QProgressBar, QProgressDialog
 
 USER_AGENT = "vs-mod-manager/0.1.0"
 BASE_URL = "https://mods.vintagestory.at"
+REGISTRY_SNAPSHOT_FILE = "registry.dat"
+PARTIAL_DOWNLOAD_SUFFIX = ".part"
+DOWNLOAD_RETRIES = 3
+RANGE_READ_AHEAD = 64 * 1024 # bytes per ranged read, usually enough for a zip's central directory or its modinfo.json
+CACHE_DATABASE_FILE = "cache.db"
+LEGACY_CACHE_FILE = "cache.dat"
+# (cache key pattern, minutes an entry is fresh, extra minutes a stale entry is still served while it is refreshed in the background)
+CACHE_POLICIES:list[tuple[re.Pattern, int, int]] = [
+    (re.compile(r"^(gameversions|tags)_"), 24 * 60, 7 * 24 * 60),
+    (re.compile(r"^authors_"), 6 * 60, 7 * 24 * 60),
+    (re.compile(r"^comments/"), 2, 60),
+    (re.compile(r"^changelogs/"), 30, 24 * 60),
+    (re.compile(r"^mod/"), 15, 24 * 60),
+    (re.compile(r"^mods_"), 15, 24 * 60),
+    (re.compile(r"^https?://"), 7 * 24 * 60, 30 * 24 * 60), # images and other files
+]
+DEFAULT_CACHE_POLICY = (15, 0)
+REVALIDATE_WORKERS = 4
+VALIDATORS_SUFFIX = "#validators"
+HYDRATED_MEMO_SIZE = 64
+DEFAULT_JSON_CACHE_BUDGET = 64 * 1024 * 1024 # bytes
+DEFAULT_BLOB_CACHE_BUDGET = 128 * 1024 * 1024 # bytes
+
+
+def cache_policy(key:str) -> tuple[int, int]:
+    for pattern, fresh, stale in CACHE_POLICIES:
+        if pattern.match(key):
+            return fresh, stale
+    return DEFAULT_CACHE_POLICY
 
 
 class ApiException(Exception):
     pass
 
 
-class ModDbClient:
-    def __init__(self):
+class BaseModDbClient:
+    def __init__(self, registry:ModDbRegistry = None, metrics:RequestMetrics = None):
         self.headers = {"user-agent": USER_AGENT}
-        self.__http_client = httpx.Client(headers=self.headers, base_url=BASE_URL)
+        self.registry = registry if registry is not None else ModDbRegistry()
+        self.metrics = metrics if metrics is not None else RequestMetrics()
 
-        # prefetch all tags and game versions
-        self.tags: list[Tag] = self.update_mod_tags()
-        self.versions: list[Tag] = self.update_game_versions()
-        self.authors = self.get_all_users()
+    @property
+    def tags(self) -> list[Tag]:
+        return self.registry.tags
+
+    @tags.setter
+    def tags(self, value:list[Tag]):
+        self.registry.update(tags=value)
+
+    @property
+    def versions(self) -> list[Tag]:
+        return self.registry.versions
+
+    @versions.setter
+    def versions(self, value:list[Tag]):
+        self.registry.update(versions=value)
+
+    @property
+    def authors(self) -> list[User]:
+        return self.registry.authors
+
+    @authors.setter
+    def authors(self, value:list[User]):
+        self.registry.update(authors=value)
 
     def construct_get_params(self, options: dict[str, list[str] | str]) -> str:
         result = ""
@@ -52,14 +117,7 @@ class ModDbClient:
         result = result.removesuffix("&")
         return result
 
-    def get_api(self, interface: str, get_params: str = None, *args, **kwargs) -> dict:
-        request = self.__http_client.build_request(
-            "GET", f"/api/{interface}{f"?{get_params}" if get_params != None else ""}"
-        )
-        response = self.__http_client.send(request)
-        response.raise_for_status()
-        
-        parsed_response = json.loads(response.text)
+    def check_response(self, parsed_response:dict) -> dict:
         if parsed_response['statuscode'] == '200':
             return parsed_response
         else:
@@ -67,58 +125,59 @@ class ModDbClient:
                 f"Mod Db request returned {parsed_response['statuscode']}"
             )
 
-    def get_list_like(
-        self, interface: str, object_key: str, to_run, get_params: str = None
-    ) -> list:
-        raw_object = self.get_api(interface, get_params)
-        objects = []
-        for object in raw_object[object_key]:
-            to_run(objects, object)
-        return objects
-
-    def update_mod_tags(self) -> list[Tag]:
-        def e(tags, tag):
-            tags.append(
-                Tag(int(tag['tagid']), tag['name'], tag['color'], type=TagType.MOD)
-            )
-
-        return self.get_list_like("tags", "tags", e)
+    # the add_* methods are the row handlers passed to get_list_like, shared between the sync and async clients
+    def add_tag(self, tags:list[Tag], tag:dict):
+        tags.append(
+            Tag(int(tag['tagid']), tag['name'], tag['color'], type=TagType.MOD)
+        )
 
-    def update_game_versions(self) -> list[Tag]:
-        def e(versions, version):
-            versions.append(
-                Tag(
-                    int(version['tagid']),
-                    version['name'],
-                    version['color'],
-                    type=TagType.VERSION,
-                )
+    def add_game_version(self, versions:list[Tag], version:dict):
+        versions.append(
+            Tag(
+                int(version['tagid']),
+                version['name'],
+                version['color'],
+                type=TagType.VERSION,
             )
+        )
 
-        return self.get_list_like("gameversions", "gameversions", e)
-
-    def get_all_users(self) -> list[User]:
-        def e(users, user):
-            users.append(User(int(user['userid']), user['name']))
-
-        return self.get_list_like("authors", "authors", e)
-
-    def get_comments(self, asset_id: int) -> list[Comment]:
-        def e(comments, raw_comment):
-            user = self.user_from_id(raw_comment['userid'])
-            comment = Comment(raw_comment, user)
-            comments.append(comment)
+    def add_user(self, users:list[User], user:dict):
+        users.append(User(int(user['userid']), user['name']))
 
-        return self.get_list_like("comments/" + str(asset_id), "comments", e)
+    def add_comment(self, comments:list[Comment], raw_comment:dict):
+        user = self.user_from_id(raw_comment['userid'])
+        comment = Comment(raw_comment, user)
+        comments.append(comment)
 
-    def get_changelogs(self, asset_id: int) -> list[ChangeLog]:
-        def e(changelogs, raw_changelog):
-            changelog = Comment(raw_changelog)
-            changelogs.append(changelog)
+    def add_changelog(self, changelogs:list[ChangeLog], raw_changelog:dict):
+        changelog = ChangeLog(raw_changelog)
+        changelogs.append(changelog)
 
-        return self.get_list_like("changelogs/" + str(asset_id), "changelogs", e)
+    def add_partial_mod(self, mods:list[PartialMod], raw_mod:dict):
+        self.add_partial_mods(mods, [raw_mod])
 
-    def get_mods(
+    def add_partial_mods(self, mods:list[PartialMod], raw_mods:list[dict]):
+        # batch row handler (get_list_like(..., many=True)), the whole batch shares one PartialModColumns
+        tags = self.tag_lists_from_names(list(map(itemgetter('tags'), raw_mods)))
+        authors = self.users_from_names(list(map(itemgetter('author'), raw_mods)))
+        try:
+            columns = PartialModColumns(raw_mods, tags, authors)
+        except (TypeError, ValueError):
+            # one bad mod fails the whole batch, the mods are checked one by one then so only the bad ones are skipped
+            valid = []
+            for raw_mod, mod_tags, author in zip(raw_mods, tags, authors):
+                try:
+                    raw_mod = PartialModColumns.normalize(raw_mod)
+                    PartialModColumns([raw_mod], [mod_tags], [author])
+                except (TypeError, ValueError):
+                    print(f"Skipping mod {raw_mod.get('modid')} with invalid data")
+                    traceback.print_exc()
+                    continue
+                valid.append((raw_mod, mod_tags, author))
+            columns = PartialModColumns([row[0] for row in valid], [row[1] for row in valid], [row[2] for row in valid])
+        mods.extend(map(PartialMod, repeat(columns, len(columns)), range(len(columns))))
+
+    def mods_get_params(
         self,
         mod_tags: list[Tag] = None,
         version: Tag = None,
@@ -127,15 +186,7 @@ class ModDbClient:
         text: str = None,
         orderby: SearchOrderBy = SearchOrderBy.TRENDING,
         order_direction: SearchOrderDirection = SearchOrderDirection.DESC,
-    ):
-        def e(mods, raw_mod):
-            mod_author = self.user_from_name(raw_mod['author'])
-            tags = []
-            for tag in raw_mod['tags']:
-                tags.append(self.tag_from_name(tag))
-            mod = PartialMod(raw_mod, tags, mod_author)
-            mods.append(mod)
-
+    ) -> str:
         params = {
             "tagids[]": mod_tags if mod_tags != None else None,
             "gv": version.id if version != None else None,
@@ -147,28 +198,19 @@ class ModDbClient:
                 order_direction.value if order_direction != None else None
             ),
         }
+        return self.construct_get_params(params)
 
-        return self.get_list_like(
-            "mods", "mods", e, get_params=self.construct_get_params(params)
-        )
-
-    def get_mod(self, mod_id: int | str):
-        raw_mod = self.get_api(f"mod/{mod_id}")['mod']
-
-        tags = []
-        for tag in raw_mod['tags']:
-            tags.append(self.tag_from_name(tag))
+    def build_mod(self, raw_mod:dict) -> Mod:
+        tags = self.tags_from_names(raw_mod['tags'])
 
         author = self.user_from_name(raw_mod['author'])
 
         releases = []
         for release in raw_mod['releases']:
-            release_tags = []
-            for tag in release['tags']:
-                release_tags.append(self.tag_from_name(tag))
+            release_tags = self.tags_from_names(release['tags'])
             try:
                 releases.append(ModRelease(release, release_tags, raw_mod['modid']))
-            except TypeError:
+            except (TypeError, ValueError):
                 pass
 
         screenshots = []
@@ -177,156 +219,734 @@ class ModDbClient:
 
         mod = Mod(raw_mod, author, tags, releases, screenshots)
         return mod
+
+    def tag_from_id(self, id: int) -> Tag | None:
+        return self.registry.tag_from_id(id)
+
+    def tag_from_name(self, name: str) -> Tag | None:
+        return self.registry.tag_from_name(name)
+
+    def tags_from_names(self, names: list[str]) -> tuple[Tag | None, ...]:
+        return self.registry.tags_from_names(names)
+
+    def tag_lists_from_names(self, name_lists: list[list[str]]) -> list[tuple[Tag | None, ...]]:
+        return self.registry.tag_lists_from_names(name_lists)
+
+    def user_from_id(self, id: int) -> User | None:
+        return self.registry.user_from_id(id)
+
+    def user_from_name(self, name: str) -> User | None:
+        return self.registry.user_from_name(name)
+
+    def users_from_names(self, names: list[str]) -> list[User | None]:
+        return self.registry.users_from_names(names)
+
+
+class ModDbClient(BaseModDbClient):
+    def __init__(self, snapshot_location:str = None, warm_start:bool = True):
+        super().__init__()
+        self.__http_client = httpx.Client(headers=self.headers, base_url=BASE_URL)
+
+        self.snapshot_location = snapshot_location
+        self.registry_refresh_thread = None
+
+        # prefetch all tags and game versions
+        # with a snapshot on disk we start from that and refresh in the background, otherwise we have to wait for the api
+        if warm_start and self.load_registry_snapshot():
+            self.registry_refresh_thread = threading.Thread(target=self.refresh_registry, daemon=True)
+            self.registry_refresh_thread.start()
+        else:
+            self.refresh_registry(raise_errors=True)
+
+    def refresh_registry(self, raise_errors:bool = False) -> bool:
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [
+                executor.submit(self.update_mod_tags),
+                executor.submit(self.update_game_versions),
+                executor.submit(self.get_all_users),
+            ]
+        
+        for future in futures:
+            if future.exception() is not None:
+                if raise_errors:
+                    raise future.exception()
+                print("Failed to refresh mod db tags, versions or authors")
+                traceback.print_exception(future.exception())
+                return False
+        
+        self.save_registry_snapshot()
+        return True
+
+    def save_registry_snapshot(self) -> None:
+        if self.snapshot_location is None:
+            return
+        
+        snapshot = self.registry.snapshot
+        try:
+            with open(os.path.join(self.snapshot_location, REGISTRY_SNAPSHOT_FILE), 'wb') as f:
+                pickle.dump((snapshot.tags, snapshot.versions, snapshot.authors), f)
+        except OSError:
+            traceback.print_exc()
+
+    def load_registry_snapshot(self) -> bool:
+        if self.snapshot_location is None:
+            return False
+        
+        snapshot_path = os.path.join(self.snapshot_location, REGISTRY_SNAPSHOT_FILE)
+        if not os.path.exists(snapshot_path):
+            return False
+        
+        try:
+            with open(snapshot_path, 'rb') as f:
+                tags, versions, authors = pickle.load(f)
+        except Exception:
+            print("Failed to load mod db snapshot")
+            traceback.print_exc()
+            return False
+        
+        if len(tags) == 0 or len(versions) == 0:
+            return False
+        
+        self.registry.update(tags=tags, versions=versions, authors=authors)
+        return True
+
+    def api_url(self, interface: str, get_params: str = None) -> str:
+        return f"/api/{interface}{f"?{get_params}" if get_params != None else ""}"
+    
+    def response_validators(self, response: httpx.Response, body_hash: str) -> dict[str, str | None]:
+        return {
+            "etag": response.headers.get('etag'),
+            "last_modified": response.headers.get('last-modified'),
+            "body_hash": body_hash,
+        }
+    
+    def get_api(self, interface: str, get_params: str = None, *args, **kwargs) -> dict:
+        request = self.__http_client.build_request("GET", self.api_url(interface, get_params))
+        with RequestTimer(self.metrics, api_endpoint(interface)) as timer:
+            response = self.__http_client.send(request)
+            timer.size = len(response.content)
+            response.raise_for_status()
+        
+        return self.check_response(json.loads(response.text))
+    
+    def get_api_conditional(self, interface: str, get_params: str = None, validators: dict = None) -> tuple[dict | None, dict]:
+        # returns (None, validators) when nothing changed since validators were taken: either the server answers 304
+        # or, for servers that send neither an ETag nor Last-Modified, the body hashes the same as before
+        headers = {}
+        if validators is not None:
+            if validators.get('etag'):
+                headers['If-None-Match'] = validators['etag']
+            if validators.get('last_modified'):
+                headers['If-Modified-Since'] = validators['last_modified']
+        
+        request = self.__http_client.build_request("GET", self.api_url(interface, get_params), headers=headers)
+        with RequestTimer(self.metrics, api_endpoint(interface)) as timer:
+            response = self.__http_client.send(request)
+            timer.size = len(response.content)
+            timer.not_modified = response.status_code == 304
+            if response.status_code != 304:
+                response.raise_for_status()
+        if response.status_code == 304:
+            return None, validators
+        
+        body = response.content
+        new_validators = self.response_validators(response, hashlib.sha1(body).hexdigest())
+        if validators is not None and validators.get('body_hash') == new_validators['body_hash']:
+            return None, new_validators
+        return self.check_response(json.loads(body)), new_validators
+
+    def get_list_like(
+        self, interface: str, object_key: str, to_run, get_params: str = None, many: bool = False
+    ) -> list:
+        # many handlers take all the raw objects in one call instead of one call per object
+        raw_object = self.get_api(interface, get_params)
+        objects = []
+        if many:
+            to_run(objects, raw_object[object_key])
+            return objects
+        for object in raw_object[object_key]:
+            to_run(objects, object)
+        return objects
+
+    def stream_api(self, interface: str, object_key: str, get_params: str = None, validators_callback = None):
+        # yields the raw objects under object_key while the response body is still downloading
+        streamer = JsonArrayStreamer(object_key)
+        hasher = hashlib.sha1()
+        with RequestTimer(self.metrics, api_endpoint(interface)) as timer, self.__http_client.stream("GET", self.api_url(interface, get_params)) as response:
+            response.raise_for_status()
+            # decoded by hand so the body hash matches the one get_api_conditional takes over the same bytes
+            decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+            for chunk in response.iter_bytes():
+                hasher.update(chunk)
+                timer.size += len(chunk)
+                yield from streamer.feed(decoder.decode(chunk))
+            yield from streamer.feed(decoder.decode(b"", final=True))
+        
+        self.check_response(streamer.close())
+        if validators_callback is not None:
+            validators_callback(self.response_validators(response, hasher.hexdigest()))
+
+    def stream_list_like(
+        self, interface: str, object_key: str, to_run_many, get_params: str = None, batch_size: int = 100
+    ):
+        # each batch is hydrated in one to_run_many call as soon as its last raw object has arrived
+        raw_objects = []
+        for object in self.stream_api(interface, object_key, get_params):
+            raw_objects.append(object)
+            if len(raw_objects) >= batch_size:
+                objects = []
+                to_run_many(objects, raw_objects)
+                yield objects
+                raw_objects = []
+        if len(raw_objects) > 0:
+            objects = []
+            to_run_many(objects, raw_objects)
+            yield objects
+
+    def update_mod_tags(self) -> list[Tag]:
+        tags = self.get_list_like("tags", "tags", self.add_tag)
+        self.registry.update(tags=tags)
+        return tags
+
+    def update_game_versions(self) -> list[Tag]:
+        versions = self.get_list_like("gameversions", "gameversions", self.add_game_version)
+        self.registry.update(versions=versions)
+        return versions
+
+    def get_all_users(self) -> list[User]:
+        users = self.get_list_like("authors", "authors", self.add_user)
+        self.registry.update(authors=users)
+        return users
+
+    def get_comments(self, asset_id: int) -> list[Comment]:
+        return self.get_list_like("comments/" + str(asset_id), "comments", self.add_comment)
+
+    def get_changelogs(self, asset_id: int) -> list[ChangeLog]:
+        return self.get_list_like("changelogs/" + str(asset_id), "changelogs", self.add_changelog)
+
+    def get_mods(
+        self,
+        mod_tags: list[Tag] = None,
+        version: Tag = None,
+        versions: list[Tag] = None,
+        author: User = None,
+        text: str = None,
+        orderby: SearchOrderBy = SearchOrderBy.TRENDING,
+        order_direction: SearchOrderDirection = SearchOrderDirection.DESC,
+        batch_callback = None,
+        batch_size: int = 100,
+    ):
+        get_params = self.mods_get_params(mod_tags, version, versions, author, text, orderby, order_direction)
+        if batch_callback is None:
+            return self.get_list_like("mods", "mods", self.add_partial_mods, get_params=get_params, many=True)
+        
+        # streamed, batch_callback gets each batch as soon as it is parsed and the full list is still returned at the end
+        mods = []
+        for batch in self.stream_list_like("mods", "mods", self.add_partial_mods, get_params=get_params, batch_size=batch_size):
+            mods.extend(batch)
+            batch_callback(batch)
+        return mods
+
+    def get_mod_ids(self, **filters) -> list[int]:
+        # same filters as get_mods, but only the ids are read so nothing gets hydrated
+        get_params = self.mods_get_params(**filters)
+        return [int(raw_mod['modid']) for raw_mod in self.get_api("mods", get_params)['mods']]
+
+    def get_mod(self, mod_id: int | str):
+        raw_mod = self.get_api(f"mod/{mod_id}")['mod']
+        return self.build_mod(raw_mod)
     
     def fetch_to_memory(self, url:str, *args, **kwargs) -> bytes:
-        response = self.__http_client.get(url)
-        response.raise_for_status()
+        with RequestTimer(self.metrics, url_endpoint("fetch", url)) as timer:
+            response = self.__http_client.get(url)
+            timer.size = len(response.content)
+            response.raise_for_status()
         return response.content
     
-    def fetch_to_file(self, url:str, file_location:str, start_callback = None, progress_callback = None, end_callback = None):
-        try:
-            with open(file_location, 'wb') as file:
-                with self.__http_client.stream("GET", url) as response:
-                    if start_callback:
-                        try:
-                            content_size = int(response.headers.get('content-length'))
-                        except:
-                            start_callback(0)
-                        else:
-                            start_callback(content_size)
+    def fetch_range(self, url:str, start:int, end:int = None) -> tuple[int, bytes, int]:
+        # (offset of the bytes returned, the bytes, size of the whole file), a negative start asks for the last -start bytes
+        # a server ignoring the range sends the whole file, which is handed back as it is
+        requested = f"-{-start}" if start < 0 else f"{start}-{'' if end is None else end}"
+        with RequestTimer(self.metrics, url_endpoint("range", url)) as timer:
+            response = self.__http_client.get(url, headers={"Range": f"bytes={requested}"})
+            timer.size = len(response.content)
+            response.raise_for_status()
+        content_range = re.fullmatch(r"bytes (\d+)-\d+/(\d+)", response.headers.get('content-range', ''))
+        if response.status_code != 206 or content_range is None:
+            return 0, response.content, len(response.content)
+        return int(content_range[1]), response.content, int(content_range[2])
+    
+    def fetch_to_file(self, url:str, file_location:str, start_callback = None, progress_callback = None, end_callback = None, retries:int = DOWNLOAD_RETRIES, hash_callback = None, hash_name:str = "sha256"):
+        # downloads into file_location + .part and only renames it into place once complete,
+        # an existing .part file (from a dropped connection or an earlier run) is resumed with a Range request
+        # hash_callback gets the hex digest of the finished file, hashed while the chunks are written
+        part_location = file_location + PARTIAL_DOWNLOAD_SUFFIX
+        for attempt in range(retries + 1):
+            try:
+                hasher = self.fetch_part(url, part_location, start_callback, progress_callback, attempt == 0, hash_name if hash_callback else None)
+                os.replace(part_location, file_location)
+            except httpx.TransportError:
+                # the partial file is kept, the next attempt picks up where this one stopped
+                traceback.print_exc()
+                continue
+            except:
+                traceback.print_exc()
+                return False
+            
+            if hash_callback:
+                hash_callback(hasher.hexdigest())
+            if end_callback:
+                end_callback()
+            return True
+        return False
+    
+    def fetch_part(self, url:str, part_location:str, start_callback = None, progress_callback = None, first_attempt:bool = True, hash_name:str = None):
+        offset = os.path.getsize(part_location) if os.path.exists(part_location) else 0
+        headers = {"Range": f"bytes={offset}-"} if offset > 0 else None
+        
+        with RequestTimer(self.metrics, url_endpoint("download", url)) as timer, self.__http_client.stream("GET", url, headers=headers) as response:
+            range_not_satisfiable = response.status_code == 416
+            if not range_not_satisfiable:
+                response.raise_for_status()
+                
+                if response.status_code != 206 or not response.headers.get('content-range', '').startswith(f"bytes {offset}-"):
+                    # the server ignored the range, the whole file is being sent again
+                    offset = 0
+                content_length = response.headers.get('content-length')
+                expected_size = offset + int(content_length) if content_length is not None else None
+                
+                # retries only report the bytes they add, the first attempt also reports what was already on disk
+                if start_callback and first_attempt:
+                    start_callback(expected_size if expected_size is not None else 0)
+                if progress_callback and first_attempt and offset > 0:
+                    progress_callback(offset)
+                
+                hasher = self.hash_part(part_location, hash_name, offset)
+                with open(part_location, 'ab' if offset > 0 else 'wb') as file:
                     for chunk in response.iter_bytes():
                         file.write(chunk)
+                        timer.size += len(chunk)
+                        if hasher is not None:
+                            hasher.update(chunk)
                         if progress_callback:
                             progress_callback(len(chunk))
-            if end_callback:
-                end_callback()
-        except:
-            traceback.print_exc()
-            return False
+                    file.flush()
+                    os.fsync(file.fileno())
+                    size = file.tell()
+        
+        if range_not_satisfiable:
+            # "bytes */<size>": a part file of exactly that size was finished but never renamed (ie. the app closed in between)
+            content_range = response.headers.get('content-range', '')
+            total = content_range.removeprefix("bytes */")
+            if content_range.startswith("bytes */") and total.isdigit() and int(total) == offset:
+                if start_callback and first_attempt:
+                    start_callback(offset)
+                if progress_callback and first_attempt:
+                    progress_callback(offset)
+                return self.hash_part(part_location, hash_name, offset)
+            # otherwise the partial file is no longer a prefix of what the server has, start over
+            os.remove(part_location)
+            return self.fetch_part(url, part_location, start_callback, progress_callback, first_attempt, hash_name)
+        
+        if expected_size is not None and size != expected_size:
+            raise httpx.ReadError(f"Download of {url} stopped at {size} of {expected_size} bytes")
+        return hasher
+    
+    def hash_part(self, part_location:str, hash_name:str, offset:int):
+        # only the resumed prefix is read back, everything new is hashed as it arrives
+        hasher = hashlib.new(hash_name) if hash_name else None
+        if hasher is not None and offset > 0:
+            with open(part_location, 'rb') as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                    hasher.update(chunk)
+        return hasher
+
+
+class RemoteFile(io.RawIOBase):
+    # a read only, seekable view of a file on the server that only downloads the parts being read, with ranged requests
+    # ZipFile can read one entry through it: the first request covers the end of the file where the central directory is,
+    # usually one more covers the entry
+    def __init__(self, client:ModDbClient, url:str, read_ahead:int = RANGE_READ_AHEAD):
+        self.client = client
+        self.url = url
+        self.read_ahead = read_ahead
+        self.block_start, self.block, self.size = client.fetch_range(url, -read_ahead)
+        self.position = 0
+    
+    def readable(self) -> bool:
         return True
     
-    def tag_from_id(self, id: int) -> Tag | None:
-        for tag in self.tags:
-            if tag.id == id:
-                return tag
-        for version in self.versions:
-            if version.id == id:
-                return version
-        return None
-
-    def tag_from_name(self, name: str) -> Tag | None:
-        for tag in self.tags:
-            if tag.name == name:
-                return tag
-        for version in self.versions:
-            if version.name == name:
-                return version
-        return None
-
-    def user_from_id(self, id: int) -> User | None:
-        for author in self.authors:
-            if author.user_id == id:
-                return author
-        return None
-
-    def user_from_name(self, name: str) -> User | None:
-        for author in self.authors:
-            if author.name == name:
-                return author
-        return None
+    def seekable(self) -> bool:
+        return True
+    
+    def tell(self) -> int:
+        return self.position
+    
+    def seek(self, offset:int, whence:int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.position = offset
+        return offset
+    
+    def readinto(self, buffer) -> int:
+        count = min(len(buffer), self.size - self.position)
+        if count <= 0:
+            return 0
+        if self.position < self.block_start or self.position + count > self.block_start + len(self.block):
+            end = min(self.position + max(count, self.read_ahead), self.size)
+            self.block_start, self.block, _ = self.client.fetch_range(self.url, self.position, end - 1)
+        start = self.position - self.block_start
+        data = self.block[start:start + count]
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
 
 
 class CacheManager:
-    def __init__(self, cache_location:str = "") -> None:
+    # two layers: a dict for this process and a sqlite database (WAL mode) shared by every process using cache_location
+    # entries are read from the database one key at a time, so startup doesn't depend on how big the cache is
+    # the dict layer is an lru with separate byte budgets for api responses ("json") and raw bytes like images ("blob")
+    # workers on many threads share one manager: the dict layer is guarded by a lock that is only held for dict updates,
+    # pickling and database access happen outside of it (sqlite handles its own locking across threads and processes)
+    def __init__(self, cache_location:str = "", json_budget:int = DEFAULT_JSON_CACHE_BUDGET, blob_budget:int = DEFAULT_BLOB_CACHE_BUDGET) -> None:
         self.cache_location = cache_location
-        self.cache: dict[str, dict[str, object]] = {} # {key: {'object' or 'expires': object }}
-        
-        self.load_from_file()
+        self.memory: dict[str, OrderedDict[str, dict[str, object]]] = {"json": OrderedDict(), "blob": OrderedDict()} # {kind: {key: {'object', 'expires', 'size'}}}
+        self.budgets = {"json": json_budget, "blob": blob_budget}
+        self.usage = {"json": 0, "blob": 0}
+        self.evictions = {"json": 0, "blob": 0}
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+    
+    @property
+    def database_location(self) -> str:
+        return os.path.join(self.cache_location, CACHE_DATABASE_FILE)
+    
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # sqlite connections can't be shared between threads, every thread opens its own on first use
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.database_location, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._init_lock:
+                if not self._initialized:
+                    connection.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL, fresh_until REAL)")
+                    columns = [row[1] for row in connection.execute("PRAGMA table_info(cache)")]
+                    if 'fresh_until' not in columns:
+                        try:
+                            connection.execute("ALTER TABLE cache ADD COLUMN fresh_until REAL")
+                        except sqlite3.OperationalError:
+                            pass # added by another process in the meantime
+                    self._initialized = True
+                    self.load_from_file()
+        return connection
+    
+    def is_persistent(self, key:str) -> bool:
+        # images are only kept for the session, same as before
+        return not key.endswith('.png')
+    
+    def kind(self, object:object) -> str:
+        return "blob" if isinstance(object, (bytes, bytearray)) else "json"
+    
+    def remember(self, key:str, entry:dict[str, object], replace:bool = True):
+        # replace=False is for entries read back from the database, which must not overwrite a newer set() from another thread
+        kind = self.kind(entry['object'])
+        with self._lock:
+            if not replace and any(key in entries for entries in self.memory.values()):
+                return
+            self.forget(key)
+            if entry['size'] > self.budgets[kind]:
+                return
+            self.memory[kind][key] = entry
+            self.usage[kind] += entry['size']
+            self.evict(kind)
+    
+    def forget(self, key:str, entry:dict[str, object] = None):
+        # with entry given, the key is only dropped while it still holds that entry
+        with self._lock:
+            for kind, entries in self.memory.items():
+                if entry is not None and entries.get(key) is not entry:
+                    continue
+                removed = entries.pop(key, None)
+                if removed is not None:
+                    self.usage[kind] -= removed['size']
+    
+    def evict(self, kind:str):
+        # least recently used first, persisted entries can still be read back from the database afterwards
+        with self._lock:
+            entries = self.memory[kind]
+            while self.usage[kind] > self.budgets[kind] and len(entries) > 0:
+                _key, entry = entries.popitem(last=False)
+                self.usage[kind] -= entry['size']
+                self.evictions[kind] += 1
+    
+    def set_budgets(self, json_budget:int = None, blob_budget:int = None):
+        with self._lock:
+            if json_budget is not None:
+                self.budgets["json"] = json_budget
+            if blob_budget is not None:
+                self.budgets["blob"] = blob_budget
+            for kind in self.memory:
+                self.evict(kind)
+    
+    def stats(self) -> dict[str, dict[str, int]]:
+        with self._lock:
+            return {
+                kind: {
+                    "entries": len(self.memory[kind]),
+                    "bytes": self.usage[kind],
+                    "budget": self.budgets[kind],
+                    "evictions": self.evictions[kind],
+                }
+                for kind in self.memory
+            }
     
     def get(self, key: str) -> any:
-        if key not in self.cache:
+        cached = self.lookup(key)
+        return cached[0] if cached is not None else None
+    
+    def lookup(self, key:str) -> tuple[object, bool] | None:
+        # (object, is fresh) for anything that hasn't hit its hard expiry yet
+        entry = None
+        with self._lock:
+            for entries in self.memory.values():
+                entry = entries.get(key)
+                if entry is not None:
+                    entries.move_to_end(key)
+                    break
+        
+        if entry is None and self.is_persistent(key):
+            try:
+                row = self.connection.execute("SELECT value, expires, fresh_until FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    entry = {"object": pickle.loads(row[0]), "expires": row[1], "fresh_until": row[2] if row[2] is not None else row[1], "size": len(row[0])}
+                    self.remember(key, entry, replace=False)
+            except (sqlite3.Error, pickle.UnpicklingError, EOFError, AttributeError):
+                traceback.print_exc()
+        if entry is None:
             return None
-        if time.time() > self.cache[key]['expires']:
-            del self.cache[key]
+        now = time.time()
+        if now > entry['expires']:
+            self.forget(key, entry)
             return None
         
-        return self.cache[key]['object']
+        return entry['object'], now <= entry['fresh_until']
     
-    def set(self, key: str, object: object, expires:int = 15):
-        self.cache[key] = {
+    def set(self, key: str, object: object, expires:int = 15, stale:int = 0):
+        # expires is how long the entry is fresh, stale how much longer it may be served while being refreshed (minutes)
+        fresh_until = time.time() + 60 * expires
+        entry = {
             "object": object,
-            "expires": time.time() + 60 * expires # minutes
+            "fresh_until": fresh_until,
+            "expires": fresh_until + 60 * stale,
+            "size": len(object) if isinstance(object, (bytes, bytearray)) else 0,
         }
+        if self.is_persistent(key):
+            try:
+                value = pickle.dumps(object, protocol=pickle.HIGHEST_PROTOCOL)
+                # the pickled size stands in for the memory an api response takes up
+                entry['size'] = entry['size'] or len(value)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO cache (key, value, expires, fresh_until) VALUES (?, ?, ?, ?)",
+                    (key, value, entry['expires'], entry['fresh_until'])
+                )
+            except (sqlite3.Error, pickle.PicklingError):
+                traceback.print_exc()
+        if entry['size'] == 0:
+            entry['size'] = sys.getsizeof(object)
+        self.remember(key, entry)
     
     def clear(self):
-        self.cache.clear()
-        self.save_to_file()
+        with self._lock:
+            for entries in self.memory.values():
+                entries.clear()
+            self.usage = {"json": 0, "blob": 0}
+        try:
+            self.connection.execute("DELETE FROM cache")
+        except sqlite3.Error:
+            traceback.print_exc()
     
     def save_to_file(self) -> None:
-        to_remove = []
-        for key, value in self.cache.items():
-            if time.time() > value['expires']:
-                to_remove.append(key)
-            if key.endswith('.png'):
-                to_remove.append(key)
-        
-        for item in to_remove:
-            try:
-                del self.cache[item]
-            except KeyError:
-                pass
-        
-        with open(os.path.join(self.cache_location, 'cache.dat'), 'wb') as f:
-            pickle.dump(self.cache, f)
+        # every set is already written through, this only drops expired rows
+        try:
+            self.connection.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        except sqlite3.Error:
+            traceback.print_exc()
 
     def load_from_file(self) -> None:
-        if not os.path.exists(os.path.join(self.cache_location, 'cache.dat')):
+        # one time import of the old pickled cache.dat, renamed first so only one process imports it
+        legacy_location = os.path.join(self.cache_location, LEGACY_CACHE_FILE)
+        migrating_location = legacy_location + ".migrating"
+        try:
+            os.replace(legacy_location, migrating_location)
+        except OSError:
             return
         
-        with open(os.path.join(self.cache_location, 'cache.dat'), 'rb') as f:
-            try:
-                self.cache = pickle.load(f)
-            except EOFError:
-                return
+        try:
+            with open(migrating_location, 'rb') as f:
+                legacy_cache = pickle.load(f)
+            now = time.time()
+            rows = [
+                (key, pickle.dumps(value['object'], protocol=pickle.HIGHEST_PROTOCOL), value['expires'])
+                for key, value in legacy_cache.items() if value['expires'] > now and self.is_persistent(key)
+            ]
+            with self._local.connection:
+                self._local.connection.execute("BEGIN")
+                self._local.connection.executemany("INSERT OR IGNORE INTO cache (key, value, expires) VALUES (?, ?, ?)", rows)
+        except Exception:
+            print("Failed to import the old cache file, it will be discarded")
+            traceback.print_exc()
+        
+        try:
+            os.remove(migrating_location)
+        except OSError:
+            pass
 
 
 class CachedModDbClient(ModDbClient):
-    def __init__(self, cache_manager: CacheManager = CacheManager()) -> None:
+    def __init__(self, cache_manager: CacheManager = CacheManager(), warm_start:bool = True) -> None:
         self.cache_manager = cache_manager
-        super().__init__()
+        self._revalidate_executor = ThreadPoolExecutor(max_workers=REVALIDATE_WORKERS, thread_name_prefix="revalidate")
+        self._revalidating:set[str] = set()
+        self._revalidate_lock = threading.Lock()
+        self.hydrated:OrderedDict[tuple, tuple[dict, list]] = OrderedDict() # (cache key, object key, row handler) -> (raw response, models)
+        self._hydrated_lock = threading.Lock() # only held for the dict updates, hydrating happens outside of it
+        # single flight: concurrent misses for one key wait on the first caller's request instead of sending their own
+        self._in_flight:dict[str, Future] = {}
+        self._in_flight_lock = threading.Lock()
+        super().__init__(snapshot_location=cache_manager.cache_location, warm_start=warm_start)
+    
+    def cached(self, key:str, fetch, endpoint:str) -> object:
+        # fresh entries are returned as they are, stale ones are returned right away and refreshed in the background
+        cached = self.cache_manager.lookup(key)
+        if cached is not None:
+            object, fresh = cached
+            self.metrics.record_cache(endpoint, "hits" if fresh else "stale_hits")
+            if not fresh:
+                self.revalidate(key, fetch)
+            return object
+        
+        with self._in_flight_lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+        self.metrics.record_cache(endpoint, "misses" if owner else "coalesced")
+        if not owner:
+            return future.result()
+        
+        try:
+            response = fetch()
+            self.store(key, response)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._in_flight_lock:
+                del self._in_flight[key]
+    
+    @property
+    def request_stats(self) -> dict[str, int]:
+        return self.metrics.totals()
+    
+    def store(self, key:str, response:object):
+        fresh, stale = cache_policy(key)
+        self.cache_manager.set(key, response, fresh, stale)
+    
+    def revalidate(self, key:str, fetch):
+        with self._revalidate_lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+        self._revalidate_executor.submit(self._revalidate, key, fetch)
+    
+    def _revalidate(self, key:str, fetch):
+        try:
+            self.store(key, fetch())
+        except Exception:
+            print(f"Failed to refresh cached {key}, the stale copy is kept until it expires")
+            traceback.print_exc()
+        finally:
+            with self._revalidate_lock:
+                self._revalidating.discard(key)
     
     def get_api(self, interface, get_params = None, *args, **kwargs):
         key = f"{interface}_{get_params}"
-        cached_response = self.cache_manager.get(key)
+        return self.cached(key, functools.partial(self.fetch_api, key, interface, get_params), api_endpoint(interface))
+    
+    def fetch_api(self, key:str, interface:str, get_params:str = None) -> dict:
+        # while the cache still holds a copy the request is conditional, and when nothing changed the cached
+        # object itself is handed back so anything hydrated from it stays valid (see get_list_like)
+        cached = self.cache_manager.lookup(key)
+        validators = self.cache_manager.get(key + VALIDATORS_SUFFIX) if cached is not None else None
+        response, validators = self.get_api_conditional(interface, get_params, validators)
+        self.store(key + VALIDATORS_SUFFIX, validators)
+        return cached[0] if response is None else response
+    
+    def get_list_like(self, interface, object_key, to_run, get_params = None, many = False):
+        raw_object = self.get_api(interface, get_params)
+        memo_key = (f"{interface}_{get_params}", object_key, getattr(to_run, '__name__', None))
+        with self._hydrated_lock:
+            memo = self.hydrated.get(memo_key)
+            if memo is not None and memo[0] is raw_object:
+                self.hydrated.move_to_end(memo_key)
+                return list(memo[1])
         
-        if cached_response is not None:
-            return cached_response
+        objects = []
+        if many:
+            to_run(objects, raw_object[object_key])
+        else:
+            for object in raw_object[object_key]:
+                to_run(objects, object)
+        with self._hydrated_lock:
+            self.hydrated[memo_key] = (raw_object, objects)
+            self.hydrated.move_to_end(memo_key)
+            while len(self.hydrated) > HYDRATED_MEMO_SIZE:
+                self.hydrated.popitem(last=False)
+        return list(objects)
+    
+    def stream_api(self, interface, object_key, get_params = None, validators_callback = None):
+        key = f"{interface}_{get_params}"
+        cached = self.cache_manager.lookup(key)
         
-        response = super().get_api(interface, get_params, *args, **kwargs)
-        self.cache_manager.set(key, response)
+        if cached is not None:
+            cached_response, fresh = cached
+            self.metrics.record_cache(api_endpoint(interface), "hits" if fresh else "stale_hits")
+            if not fresh:
+                self.revalidate(key, functools.partial(self.fetch_api, key, interface, get_params))
+            yield from cached_response[object_key]
+            return
         
-        return response
+        self.metrics.record_cache(api_endpoint(interface), "misses")
+        objects = []
+        validators = []
+        for object in super().stream_api(interface, object_key, get_params, validators.append):
+            objects.append(object)
+            yield object
+        self.store(key, {"statuscode": "200", object_key: objects})
+        if len(validators) > 0:
+            self.store(key + VALIDATORS_SUFFIX, validators[0])
     
-    def fetch_to_memory(self, url, *args, **kwargs):
+    def fetch_to_memory(self, url, *args, no_store:bool = False, **kwargs):
+        # no_store is for callers that keep their own copy on disk (ie. the image cache), the bytes would be held twice otherwise
+        if no_store:
+            return super().fetch_to_memory(url, *args, **kwargs)
         key = f"{url}"
-        cached_response = self.cache_manager.get(key)
-        
-        if cached_response is not None:
-            return cached_response
-        
-        response = super().fetch_to_memory(url, *args, **kwargs)
-        self.cache_manager.set(key, response)
-        
-        return response
+        return self.cached(key, functools.partial(super().fetch_to_memory, url, *args, **kwargs), url_endpoint("fetch", url))
     
-    def fetch_to_file(self, url, file_location, start_callback=None, progress_callback=None, end_callback=None):
-        key = f"{url}_{file_location}"
-        
-        cached_response = self.cache_manager.get(key)
-        if cached_response and os.path.exists(file_location):
+    def fetch_to_file(self, url, file_location, start_callback=None, progress_callback=None, end_callback=None, *args, **kwargs):
+        # a finished download is only ever renamed into place once complete, so the file itself is the cache entry
+        if os.path.exists(file_location):
             return True
         
-        result = super().fetch_to_file(url, file_location, start_callback, progress_callback, end_callback)
-        self.cache_manager.set(key, result)
-        
-        return result
\ No newline at end of file
+        return super().fetch_to_file(url, file_location, start_callback, progress_callback, end_callback, *args, **kwargs)
\ No newline at end of file
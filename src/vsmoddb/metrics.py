@@ -0,0 +1,138 @@
+import re
+import json
+import time
+import threading
+from bisect import bisect_left
+from urllib.parse import urlsplit
+
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0) # seconds, upper bounds, the last bucket is everything above
+CACHE_OUTCOMES = ("hits", "stale_hits", "misses", "coalesced")
+NUMBER_PATTERN = re.compile(r"(?<=/)\d+(?=/|$)")
+
+
+def api_endpoint(interface:str) -> str:
+    # ids are folded into a placeholder so every mod/<id> request counts towards one endpoint
+    return "api/" + NUMBER_PATTERN.sub("{id}", interface.strip("/"))
+
+def url_endpoint(kind:str, url:str) -> str:
+    # files and images are grouped by host and top level folder, their names are unique per mod
+    parts = urlsplit(url)
+    folder = parts.path.strip("/").split("/", 1)[0]
+    return f"{kind} {parts.netloc}/{folder}" if parts.netloc else f"{kind} /{folder}"
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.not_modified = 0
+        self.bytes = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.cache = {outcome: 0 for outcome in CACHE_OUTCOMES}
+
+    def latency_percentile(self, fraction:float) -> float:
+        # upper bound of the bucket the percentile falls into, the slowest request seen when it is the open ended one
+        rank = fraction * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets):
+            seen += count
+            if seen >= rank and seen > 0:
+                return min(bound, self.latency_max)
+        return self.latency_max
+
+    def to_dict(self) -> dict[str, object]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "not_modified": self.not_modified,
+            "bytes": self.bytes,
+            "latency_mean": self.latency_total / self.requests if self.requests > 0 else 0.0,
+            "latency_p50": self.latency_percentile(0.5),
+            "latency_p95": self.latency_percentile(0.95),
+            "latency_max": self.latency_max,
+            "latency_histogram": {
+                (f"le_{bound}" if index < len(LATENCY_BUCKETS) else "inf"): count
+                for index, (bound, count) in enumerate(zip(LATENCY_BUCKETS + (None,), self.latency_buckets))
+            },
+            **self.cache,
+        }
+
+
+class RequestMetrics:
+    # per endpoint request counters and latency histograms, shared by every client that talks to the mod db
+    # recording is a couple of additions under one lock, cheap next to the request it describes
+    def __init__(self):
+        self.started = time.time()
+        self.endpoints:dict[str, EndpointMetrics] = {}
+        self._lock = threading.Lock()
+
+    def endpoint(self, name:str) -> EndpointMetrics:
+        metrics = self.endpoints.get(name)
+        if metrics is None:
+            metrics = self.endpoints[name] = EndpointMetrics()
+        return metrics
+
+    def record_request(self, name:str, seconds:float, size:int = 0, error:bool = False, not_modified:bool = False):
+        with self._lock:
+            metrics = self.endpoint(name)
+            metrics.requests += 1
+            metrics.bytes += size
+            metrics.latency_total += seconds
+            metrics.latency_max = max(metrics.latency_max, seconds)
+            metrics.latency_buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+            if error:
+                metrics.errors += 1
+            if not_modified:
+                metrics.not_modified += 1
+
+    def record_cache(self, name:str, outcome:str):
+        with self._lock:
+            self.endpoint(name).cache[outcome] += 1
+
+    def totals(self) -> dict[str, int]:
+        with self._lock:
+            endpoints = list(self.endpoints.values())
+            return {
+                "requests": sum(metrics.requests for metrics in endpoints),
+                "errors": sum(metrics.errors for metrics in endpoints),
+                "bytes": sum(metrics.bytes for metrics in endpoints),
+                **{outcome: sum(metrics.cache[outcome] for metrics in endpoints) for outcome in CACHE_OUTCOMES},
+            }
+
+    def snapshot(self) -> dict[str, object]:
+        with self._lock:
+            return {
+                "started": self.started,
+                "taken": time.time(),
+                "endpoints": {name: metrics.to_dict() for name, metrics in sorted(self.endpoints.items())},
+            }
+
+    def export(self, location:str):
+        with open(location, 'w') as f:
+            json.dump(self.snapshot(), f, indent=4)
+
+    def reset(self):
+        with self._lock:
+            self.started = time.time()
+            self.endpoints = {}
+
+
+class RequestTimer:
+    # with RequestTimer(metrics, name) as timer: ... timer.size = n
+    # an exception leaving the block is recorded as an error and passed on, a generator closed early is not an error
+    def __init__(self, metrics:RequestMetrics, name:str):
+        self.metrics = metrics
+        self.name = name
+        self.size = 0
+        self.not_modified = False
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        error = exc_type is not None and not issubclass(exc_type, GeneratorExit)
+        self.metrics.record_request(self.name, time.perf_counter() - self.start, self.size, error, self.not_modified)
+        return False
@@ -1,16 +1,65 @@
 import json
+from array import array
+from collections import deque
 from enum import Enum
 from datetime import datetime
+from itertools import accumulate
+from operator import itemgetter
 
 
 def parse_datetime(string:str) -> datetime:
+    try:
+        return datetime.fromisoformat(string)
+    except ValueError:
+        pass
+    
     raw:list[str] = string.split(' ', 1)
     year:list[str] = raw[0].split('-')
-    time:list[str] = raw[1].split(':')
-    result:datetime = datetime(int(year[0]), int(year[1]), int(year[2]), int(time[0]), int(time[1]), int(time[2]))
+    try:
+        time:list[str] = raw[1].split(':')
+        result:datetime = datetime(int(year[0]), int(year[1]), int(year[2]), int(time[0]), int(time[1]), int(time[2]))
+    except IndexError as e:
+        raise ValueError(f"Invalid date: {string}") from e
     return result
 
 
+# values with only a handful of distinct strings across the whole catalog (side, type), every model holds the copy kept here
+SHARED_VALUES:dict[str | None, str | None] = {}
+
+
+class SlottedModel:
+    # models keep rarely used raw api values in "_<name>" slots and only decode them when the matching property is first read
+    # dates are parsed up front: checking one costs as much as parsing it, and bad api data has to fail while the client builds the model
+    __slots__ = ()
+    
+    def _decode_datetime(self, slot:str) -> datetime:
+        # strings are only left in models unpickled from before dates were parsed up front
+        value = getattr(self, slot)
+        if isinstance(value, str):
+            value = parse_datetime(value)
+            setattr(self, slot, value)
+        return value
+    
+    def __getstate__(self):
+        state = {}
+        for cls in type(self).__mro__:
+            for slot in getattr(cls, '__slots__', ()):
+                if hasattr(self, slot):
+                    state[slot] = getattr(self, slot)
+        return state
+    
+    def __setstate__(self, state):
+        # also takes the __dict__ state of models pickled before they used slots
+        cls = type(self)
+        for key, value in state.items():
+            if isinstance(getattr(cls, key, None), property):
+                key = '_' + key
+            try:
+                setattr(self, key, value)
+            except AttributeError:
+                pass
+
+
 class SearchOrderBy(Enum):
     CREATED = "asset.created"
     LAST_RELEASED = "lastreleased"
@@ -23,7 +72,9 @@ class SearchOrderDirection(Enum):
     ASC = "asc"
     DESC = "desc"
 
-class User:
+class User(SlottedModel):
+    __slots__ = ('user_id', 'name')
+    
     def __init__(self, user_id:int, name:str):
         self.user_id:int = user_id
         self.name:str = name
@@ -32,27 +83,47 @@ class User:
         return self.name
 
 
-class Comment:
+class Comment(SlottedModel):
+    __slots__ = ('comment_id', 'asset_id', 'user', 'text', '_created', '_last_modified')
+    
     def __init__(self, raw:dict, user:User):
         self.comment_id = int(raw['commentid'])
         self.asset_id = int(raw['assetid'])
         self.user = user
         self.text = str(raw['text'])
-        self.created = parse_datetime(raw['created'])
-        self.last_modified = parse_datetime(raw['lastmodified'])
-        
+        self._created = parse_datetime(raw['created'])
+        self._last_modified = parse_datetime(raw['lastmodified'])
+    
+    @property
+    def created(self) -> datetime:
+        return self._decode_datetime('_created')
+    
+    @property
+    def last_modified(self) -> datetime:
+        return self._decode_datetime('_last_modified')
+    
     def __str__(self):
         return f"comment id: {self.comment_id} by: {self.user_id}"
 
 
-class ChangeLog:
+class ChangeLog(SlottedModel):
+    __slots__ = ('changelog_id', 'asset_id', 'user_id', 'text', '_created', '_last_modified')
+    
     def __init__(self, raw:dict):
         self.changelog_id = int(raw['changelogid'])
         self.asset_id = int(raw['assetid'])
         self.user_id = int(raw['userid'])
         self.text = str(raw['text'])
-        self.created = parse_datetime(raw['created'])
-        self.last_modified = parse_datetime(raw['lastmodified'])
+        self._created = parse_datetime(raw['created'])
+        self._last_modified = parse_datetime(raw['lastmodified'])
+    
+    @property
+    def created(self) -> datetime:
+        return self._decode_datetime('_created')
+    
+    @property
+    def last_modified(self) -> datetime:
+        return self._decode_datetime('_last_modified')
     
     def __str__(self):
         return f"changelog id: {self.changelog_id} by: {self.user_id}"
@@ -80,7 +151,9 @@ class TagType(Enum):
     MOD = "mod"
 
 
-class Tag:
+class Tag(SlottedModel):
+    __slots__ = ('id', 'name', 'color', 'type', 'major_version', 'minor_version', 'patch_version', 'version_modifier')
+    
     def __init__(self, id:int, name:str, color:str, type:TagType):
         self.id:int = id
         self.name:str = name
@@ -113,8 +186,10 @@ class Tag:
         return f"{self.name} type: {self.type.value}"
 
 
-class ModRelease:
-    def __init__(self, raw:dict, tags:list[Tag], parent_mod_id:int):
+class ModRelease(SlottedModel):
+    __slots__ = ('release_id', 'main_file', 'filename', 'file_id', 'downloads', 'tags', 'mod_id_str', 'mod_id', 'mod_version', '_created', '_changelog')
+    
+    def __init__(self, raw:dict, tags:tuple[Tag, ...], parent_mod_id:int):
         self.release_id = int(raw['releaseid'])
         self.main_file = str(raw['mainfile'])
         self.filename = str(raw['filename'])
@@ -124,66 +199,294 @@ class ModRelease:
         self.mod_id_str = str(raw['modidstr'])
         self.mod_id = parent_mod_id
         self.mod_version = str(raw['modversion'])
-        self.created = parse_datetime(raw['created'])
-        self.changelog = str(raw['changelog'])
+        self._created = parse_datetime(raw['created'])
+        self._changelog = raw['changelog']
+    
+    @property
+    def created(self) -> datetime:
+        return self._decode_datetime('_created')
+    
+    @property
+    def changelog(self) -> str:
+        return str(self._changelog)
 
 
-class ModScreenshot:
+class ModScreenshot(SlottedModel):
+    __slots__ = ('file_id', 'main_file', 'filename', 'thumbnail_name', '_created')
+    
     def __init__(self, raw:dict):
         self.file_id = int(raw['fileid'])
         self.main_file = str(raw['mainfile'])
         self.filename = str(raw['filename'])
         self.thumbnail_name = str(raw['thumbnailfilename'])
-        self.created = parse_datetime(raw['created'])
+        self._created = parse_datetime(raw['created'])
+    
+    @property
+    def created(self) -> datetime:
+        return self._decode_datetime('_created')
 
 
-class PartialMod:
-    def __init__(self, raw:dict, tags:list[Tag], author:User):
-        self.mod_id = int(raw['modid'])
-        self.asset_id = int(raw['assetid'])
-        self.downloads = int(raw['downloads'])
-        self.follows = int(raw['follows'])
-        self.trending_points = int(raw['trendingpoints'])
-        self.comments = int(raw['comments'])
-        self.name = str(raw['name'])
-        self.summary = str(raw['summary'])
-        self.mod_id_strs:list[str] = raw['modidstrs']
-        self.author = author
-        self.url_alias = str(raw['urlalias'])
-        self.side = ModSupportSide.match(raw['side'])
-        self.type = str(raw['type'])
-        self.logo = str(raw['logo'])
+class TextColumn:
+    # one string per row stored back to back: as one str when every row is ascii, utf-8 encoded and decoded on each read otherwise,
+    # a single non ascii character would make a joined str take 2 or 4 bytes for every character of the column
+    __slots__ = ('data', 'offsets')
+    
+    def __init__(self, strings:list[str]):
+        joined = "".join(strings)
+        if joined.isascii():
+            self.data = joined
+            lengths = map(len, strings)
+        else:
+            encoded = list(map(str.encode, strings))
+            self.data = b"".join(encoded)
+            lengths = map(len, encoded)
+        self.offsets = array('I', accumulate(lengths, initial=0))
+    
+    def __getitem__(self, row:int) -> str:
+        value = self.data[self.offsets[row]:self.offsets[row + 1]]
+        return value if type(value) is str else value.decode()
+
+
+class PartialModColumns:
+    # the catalog entries of one response (or one streamed batch of it) stored column wise: numbers in arrays, text in
+    # TextColumns, tags, authors and the few distinct side and type values as shared references
+    # every column is filled from the whole batch at once, so the per field loops run in C; values of the wrong type fail the
+    # batch with a TypeError, normalize() converts a single entry the way the models used to
+    __slots__ = (
+        'mod_ids', 'asset_ids', 'downloads', 'follows', 'trending_points', 'comments', 'names', 'summaries', 'mod_id_strs',
+        'logos', 'last_released', 'authors', 'tags', 'url_aliases', 'sides', 'types',
+    )
+    
+    def __init__(self, raw_mods:list[dict], tags:list[tuple[Tag, ...]], authors:list[User]):
+        def column(key:str) -> list:
+            return list(map(itemgetter(key), raw_mods))
+        
+        self.mod_ids = array('q', column('modid'))
+        self.asset_ids = array('q', column('assetid'))
+        self.downloads = array('q', column('downloads'))
+        self.follows = array('q', column('follows'))
+        self.trending_points = array('q', column('trendingpoints'))
+        self.comments = array('q', column('comments'))
+        self.names = TextColumn(column('name'))
+        self.summaries = TextColumn(column('summary'))
+        self.mod_id_strs = TextColumn(list(map("\n".join, column('modidstrs'))))
+        self.logos = TextColumn(column('logo'))
+        # dates are checked up front so bad api data fails while the client builds the models, the string is smaller to keep than a datetime
+        dates = column('lastreleased')
+        deque(map(datetime.fromisoformat, dates), maxlen=0)
+        self.last_released = TextColumn(dates)
+        self.authors = authors
         self.tags = tags
-        self.last_released = parse_datetime(raw['lastreleased'])
+        self.url_aliases = column('urlalias')
+        sides = column('side')
+        self.sides = list(map(SHARED_VALUES.setdefault, sides, sides))
+        types = column('type')
+        self.types = list(map(SHARED_VALUES.setdefault, types, types))
+    
+    @staticmethod
+    def normalize(raw_mod:dict) -> dict:
+        # raises TypeError or ValueError for an entry that can't be read at all
+        return dict(
+            raw_mod,
+            modid=int(raw_mod['modid']),
+            assetid=int(raw_mod['assetid']),
+            downloads=int(raw_mod['downloads']),
+            follows=int(raw_mod['follows']),
+            trendingpoints=int(raw_mod['trendingpoints']),
+            comments=int(raw_mod['comments']),
+            name=str(raw_mod['name']),
+            summary=str(raw_mod['summary']),
+            modidstrs=list(map(str, raw_mod['modidstrs'])),
+            logo=str(raw_mod['logo']),
+            # dates fromisoformat doesn't take are fine as long as parse_datetime can read them
+            lastreleased=parse_datetime(raw_mod['lastreleased']).isoformat(' '),
+        )
+    
+    def __len__(self):
+        return len(self.mod_ids)
 
-class Mod:
-    def __init__(self, raw:dict, author:User, tags:list[Tag], releases:list[ModRelease], screenshots:list[ModScreenshot]):
+
+class PartialMod:
+    # one row of a PartialModColumns, the fields are read (and text decoded) from the columns on every access
+    __slots__ = ('_columns', '_row')
+    
+    def __init__(self, columns:PartialModColumns, row:int):
+        self._columns = columns
+        self._row = row
+    
+    @property
+    def mod_id(self) -> int:
+        return self._columns.mod_ids[self._row]
+    
+    @property
+    def asset_id(self) -> int:
+        return self._columns.asset_ids[self._row]
+    
+    @property
+    def downloads(self) -> int:
+        return self._columns.downloads[self._row]
+    
+    @property
+    def follows(self) -> int:
+        return self._columns.follows[self._row]
+    
+    @property
+    def trending_points(self) -> int:
+        return self._columns.trending_points[self._row]
+    
+    @property
+    def comments(self) -> int:
+        return self._columns.comments[self._row]
+    
+    @property
+    def name(self) -> str:
+        return self._columns.names[self._row]
+    
+    @property
+    def summary(self) -> str:
+        return self._columns.summaries[self._row]
+    
+    @property
+    def mod_id_strs(self) -> list[str]:
+        joined = self._columns.mod_id_strs[self._row]
+        return joined.split("\n") if joined else []
+    
+    @property
+    def author(self) -> User | None:
+        return self._columns.authors[self._row]
+    
+    @property
+    def logo(self) -> str:
+        return self._columns.logos[self._row]
+    
+    @property
+    def tags(self) -> tuple[Tag, ...]:
+        return self._columns.tags[self._row]
+    
+    @property
+    def url_alias(self) -> str:
+        return str(self._columns.url_aliases[self._row])
+    
+    @property
+    def side(self) -> ModSupportSide | None:
+        return ModSupportSide.match(self._columns.sides[self._row])
+    
+    @property
+    def type(self) -> str:
+        return str(self._columns.types[self._row])
+    
+    @property
+    def last_released(self) -> datetime:
+        return datetime.fromisoformat(self._columns.last_released[self._row])
+    
+    def __getstate__(self):
+        # pickled as the row alone, under the slot names models had before the columns
+        columns, row = self._columns, self._row
+        return {
+            'mod_id': self.mod_id, 'asset_id': self.asset_id, 'downloads': self.downloads, 'follows': self.follows,
+            'trending_points': self.trending_points, 'comments': self.comments, 'name': self.name, 'summary': self.summary,
+            'mod_id_strs': self.mod_id_strs, 'author': self.author, 'logo': self.logo, 'tags': self.tags,
+            '_url_alias': columns.url_aliases[row], '_side': columns.sides[row], '_type': columns.types[row],
+            '_last_released': self.last_released,
+        }
+    
+    def __setstate__(self, state):
+        # also takes the state of models pickled before the columns, lazy fields with or without their "_" and dates as strings
+        def get(name:str, default = None):
+            return state.get(name, state.get('_' + name, default))
+        
+        last_released = get('last_released', datetime.min)
+        if isinstance(last_released, str):
+            last_released = parse_datetime(last_released)
+        raw_mod = {
+            'modid': get('mod_id', 0), 'assetid': get('asset_id', 0), 'downloads': get('downloads', 0), 'follows': get('follows', 0),
+            'trendingpoints': get('trending_points', 0), 'comments': get('comments', 0), 'name': get('name', ""),
+            'summary': get('summary', ""), 'modidstrs': get('mod_id_strs', []), 'logo': get('logo', ""),
+            'lastreleased': last_released.isoformat(' '), 'urlalias': get('url_alias'), 'side': get('side'), 'type': get('type'),
+        }
+        self._columns = PartialModColumns([raw_mod], [tuple(get('tags', ()))], [get('author')])
+        self._row = 0
+
+
+class Mod(SlottedModel):
+    __slots__ = (
+        'mod_id', 'asset_id', 'name', 'description', 'author', 'logo_filename', 'logo_file', 'downloads', 'follows',
+        'trending_points', 'comments', 'tags', 'releases', 'screenshots', 'mod_id_str', '_url_alias', '_homepage_url',
+        '_source_code_url', '_trailer_video_url', '_issue_tracker_url', '_wiki_url', '_side', '_type', '_created',
+        '_last_released', '_last_modified',
+    )
+    
+    def __init__(self, raw:dict, author:User, tags:tuple[Tag, ...], releases:list[ModRelease], screenshots:list[ModScreenshot]):
         self.mod_id = int(raw['modid'])
         self.asset_id = int(raw['assetid'])
         self.name = str(raw['name'])
         self.description = str(raw['text'])
         self.author = author
-        self.url_alias = str(raw['urlalias'])
         self.logo_filename = str(raw['logofilename'])
         self.logo_file = str(raw['logofile'])
-        self.homepage_url = str(raw['homepageurl'])
-        self.source_code_url = str(raw['sourcecodeurl'])
-        self.trailer_video_url = str(raw['trailervideourl'])
-        self.issue_tracker_url = str(raw['issuetrackerurl'])
-        self.wiki_url = str(raw['wikiurl'])
         self.downloads = int(raw['downloads'])
         self.follows = int(raw['follows'])
         self.trending_points = int(raw['trendingpoints'])
         self.comments = int(raw['comments'])
-        self.side = ModSupportSide.match(raw['side'])
-        self.type = str(raw['type'])
-        self.created = parse_datetime(raw['created'])
-        self.last_released = parse_datetime(raw['lastreleased'])
-        self.last_modified = parse_datetime(raw['lastmodified'])
         self.tags = tags
         self.releases = releases
         self.screenshots = screenshots
         self.mod_id_str = releases[0].mod_id_str
+        self._url_alias = raw['urlalias']
+        self._homepage_url = raw['homepageurl']
+        self._source_code_url = raw['sourcecodeurl']
+        self._trailer_video_url = raw['trailervideourl']
+        self._issue_tracker_url = raw['issuetrackerurl']
+        self._wiki_url = raw['wikiurl']
+        self._side = raw['side']
+        self._type = raw['type']
+        self._created = parse_datetime(raw['created'])
+        self._last_released = parse_datetime(raw['lastreleased'])
+        self._last_modified = parse_datetime(raw['lastmodified'])
+    
+    @property
+    def url_alias(self) -> str:
+        return str(self._url_alias)
+    
+    @property
+    def homepage_url(self) -> str:
+        return str(self._homepage_url)
+    
+    @property
+    def source_code_url(self) -> str:
+        return str(self._source_code_url)
+    
+    @property
+    def trailer_video_url(self) -> str:
+        return str(self._trailer_video_url)
+    
+    @property
+    def issue_tracker_url(self) -> str:
+        return str(self._issue_tracker_url)
+    
+    @property
+    def wiki_url(self) -> str:
+        return str(self._wiki_url)
+    
+    @property
+    def side(self) -> ModSupportSide | None:
+        return ModSupportSide.match(self._side)
+    
+    @property
+    def type(self) -> str:
+        return str(self._type)
+    
+    @property
+    def created(self) -> datetime:
+        return self._decode_datetime('_created')
+    
+    @property
+    def last_released(self) -> datetime:
+        return self._decode_datetime('_last_released')
+    
+    @property
+    def last_modified(self) -> datetime:
+        return self._decode_datetime('_last_modified')
     
     def get_releases_for_version(self, version:Tag, include_pre_release=False, strict_match=False):
         if version.type != TagType.VERSION:
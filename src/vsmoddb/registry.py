@@ -0,0 +1,90 @@
+import threading
+
+from .models import Tag, User
+
+
+class RegistrySnapshot:
+    def __init__(self, tags:list[Tag], versions:list[Tag], authors:list[User]):
+        self.tags = tags
+        self.versions = versions
+        self.authors = authors
+
+        # first match wins, same as the old linear lookups (mod tags before game versions)
+        self.tags_by_id:dict[int, Tag] = {}
+        self.tags_by_name:dict[str, Tag] = {}
+        for tag in tags + versions:
+            self.tags_by_id.setdefault(tag.id, tag)
+            self.tags_by_name.setdefault(tag.name, tag)
+
+        # mods share one tuple per distinct combination of tag names instead of each holding its own list
+        self.tag_lists:dict[tuple[str, ...], tuple[Tag | None, ...]] = {}
+
+        self.users_by_id:dict[int, User] = {}
+        self.users_by_name:dict[str, User] = {}
+        for user in authors:
+            self.users_by_id.setdefault(user.user_id, user)
+            self.users_by_name.setdefault(user.name, user)
+
+
+class ModDbRegistry:
+    def __init__(self, tags:list[Tag] = None, versions:list[Tag] = None, authors:list[User] = None):
+        self._snapshot = RegistrySnapshot(tags or [], versions or [], authors or [])
+        self._update_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> RegistrySnapshot:
+        return self._snapshot
+
+    def update(self, tags:list[Tag] = None, versions:list[Tag] = None, authors:list[User] = None) -> None:
+        # indexes are built on the side and swapped in with a single assignment, so readers on other threads never see a half built registry
+        with self._update_lock:
+            current = self._snapshot
+            self._snapshot = RegistrySnapshot(
+                tags if tags is not None else current.tags,
+                versions if versions is not None else current.versions,
+                authors if authors is not None else current.authors,
+            )
+
+    @property
+    def tags(self) -> list[Tag]:
+        return self._snapshot.tags
+
+    @property
+    def versions(self) -> list[Tag]:
+        return self._snapshot.versions
+
+    @property
+    def authors(self) -> list[User]:
+        return self._snapshot.authors
+
+    def tag_from_id(self, id:int) -> Tag | None:
+        return self._snapshot.tags_by_id.get(id)
+
+    def tag_from_name(self, name:str) -> Tag | None:
+        return self._snapshot.tags_by_name.get(name)
+
+    def tags_from_names(self, names:list[str]) -> tuple[Tag | None, ...]:
+        snapshot = self._snapshot
+        key = tuple(names)
+        tags = snapshot.tag_lists.get(key)
+        if tags is None:
+            tags = snapshot.tag_lists.setdefault(key, tuple(snapshot.tags_by_name.get(name) for name in key))
+        return tags
+
+    def tag_lists_from_names(self, name_lists:list[list[str]]) -> list[tuple[Tag | None, ...]]:
+        # tags_from_names for a whole batch, the lookups of combinations seen before run in C
+        snapshot = self._snapshot
+        keys = list(map(tuple, name_lists))
+        tag_lists = list(map(snapshot.tag_lists.get, keys))
+        for index in [index for index, tags in enumerate(tag_lists) if tags is None]:
+            tag_lists[index] = self.tags_from_names(keys[index])
+        return tag_lists
+
+    def user_from_id(self, id:int) -> User | None:
+        return self._snapshot.users_by_id.get(id)
+
+    def user_from_name(self, name:str) -> User | None:
+        return self._snapshot.users_by_name.get(name)
+
+    def users_from_names(self, names:list[str]) -> list[User | None]:
+        return list(map(self._snapshot.users_by_name.get, names))
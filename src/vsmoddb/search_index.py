@@ -0,0 +1,238 @@
+import os
+import re
+import math
+import pickle
+import threading
+import traceback
+from bisect import bisect_left
+
+from .models import PartialMod
+
+SEARCH_INDEX_FILE = "search_index.dat"
+SEARCH_INDEX_VERSION = 3 # bumped whenever tokenize or the saved layout changes, older saved indexes are rebuilt
+TOKEN_PATTERN = re.compile(r"[^\W_]+") # \w without the underscore, so letters and digits of any script
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "mod_id": 3.0,
+    "author": 2.0,
+    "summary": 1.0,
+}
+PREFIX_WEIGHT = 0.5 # a word that only starts with the search term counts for less than an exact one
+FUZZY_WEIGHT = 0.3 # a word one typo away from the search term counts for less again
+FUZZY_MIN_LENGTH = 4 # shorter terms are one typo away from too many words to be useful
+MAX_PREFIX_EXPANSIONS = 256 # keeps short terms from walking most of the vocabulary
+MIN_PREFIX_LENGTH = 3 # shorter terms only match whole words, as prefixes they match most of the catalog
+
+
+def tokenize(text:str) -> list[str]:
+    if not text:
+        return []
+    return TOKEN_PATTERN.findall(text.casefold())
+
+def deletions(token:str) -> set[str]:
+    # every string one character shorter, two words within one typo of each other share at least one of these (or are equal)
+    return {token[:index] + token[index + 1:] for index in range(len(token))}
+
+def within_one_typo(a:str, b:str) -> bool:
+    # one inserted, removed or replaced character, or two neighbouring characters swapped
+    if a == b or abs(len(a) - len(b)) > 1:
+        return a == b
+    start = 0
+    while start < min(len(a), len(b)) and a[start] == b[start]:
+        start += 1
+    if len(a) == len(b):
+        if a[start + 1:] == b[start + 1:]:
+            return True
+        return a[start] == b[start + 1] and a[start + 1] == b[start] and a[start + 2:] == b[start + 2:]
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    return shorter[start:] == longer[start + 1:]
+
+
+class ModSearchIndex:
+    # inverted index over mod names, summaries, mod id strings and author names: token -> {mod_id: weight}
+    # an index other threads search is never modified, updated() hands back a new one to swap in instead
+    def __init__(self):
+        self.postings:dict[str, dict[int, float]] = {}
+        self.documents:dict[int, tuple[tuple, dict[str, float]]] = {} # mod_id -> (signature, token weights)
+        self._vocabulary:list[str] | None = None
+        self._deletions:dict[str, list[str]] | None = None # one character deleted -> the tokens it came from, for typo matching
+
+    def __len__(self):
+        return len(self.documents)
+
+    def _signature(self, mod:PartialMod) -> tuple:
+        author_name = mod.author.name if mod.author is not None else ""
+        return (mod.name, mod.summary, tuple(mod.mod_id_strs or ()), author_name)
+
+    def _weights(self, signature:tuple) -> dict[str, float]:
+        name, summary, mod_id_strs, author_name = signature
+        weights:dict[str, float] = {}
+        fields = [
+            ("name", name),
+            ("summary", summary),
+            ("mod_id", " ".join(mod_id_strs)),
+            ("author", author_name),
+        ]
+        for field, text in fields:
+            for token in tokenize(text):
+                weights[token] = weights.get(token, 0) + FIELD_WEIGHTS[field]
+        return weights
+
+    def _add(self, mod_id:int, document:tuple[tuple, dict[str, float]]):
+        self.documents[mod_id] = document
+        for token, weight in document[1].items():
+            posting = self.postings.get(token)
+            if posting is None:
+                posting = self.postings[token] = {}
+                self._vocabulary = None
+                self._deletions = None
+            posting[mod_id] = weight
+
+    def _remove(self, mod_id:int):
+        document = self.documents.pop(mod_id, None)
+        if document is None:
+            return
+        for token in document[1]:
+            posting = self.postings.get(token)
+            if posting is None:
+                continue
+            posting.pop(mod_id, None)
+            if len(posting) == 0:
+                del self.postings[token]
+                self._vocabulary = None
+                self._deletions = None
+
+    def update(self, mods:list[PartialMod]) -> bool:
+        # only mods whose searchable text changed are re-indexed, mods missing from the list are dropped
+        changed = False
+        seen = set()
+        for mod in mods:
+            seen.add(mod.mod_id)
+            signature = self._signature(mod)
+            current = self.documents.get(mod.mod_id)
+            if current is not None and current[0] == signature:
+                continue
+            self._remove(mod.mod_id)
+            self._add(mod.mod_id, (signature, self._weights(signature)))
+            changed = True
+
+        for mod_id in [mod_id for mod_id in self.documents if mod_id not in seen]:
+            self._remove(mod_id)
+            changed = True
+        return changed
+
+    def changed(self, mods:list[PartialMod]) -> bool:
+        if len(mods) != len(self.documents):
+            return True
+        for mod in mods:
+            current = self.documents.get(mod.mod_id)
+            if current is None or current[0] != self._signature(mod):
+                return True
+        return False
+
+    def updated(self, mods:list[PartialMod]) -> 'ModSearchIndex':
+        # self when nothing changed, otherwise a copy with update() applied, self is left untouched either way
+        if not self.changed(mods):
+            return self
+        index = ModSearchIndex()
+        index.postings = {token: dict(posting) for token, posting in self.postings.items()}
+        index.documents = dict(self.documents)
+        index.update(mods)
+        return index
+
+    @property
+    def vocabulary(self) -> list[str]:
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self.postings)
+        return self._vocabulary
+
+    @property
+    def typo_lookup(self) -> dict[str, list[str]]:
+        # built on first use after the vocabulary changes, every token that can be one typo away from a search term is
+        # listed under itself and each of its deletions
+        if self._deletions is None:
+            lookup:dict[str, list[str]] = {}
+            for token in self.postings:
+                if len(token) >= FUZZY_MIN_LENGTH - 1:
+                    for deleted in deletions(token) | {token}:
+                        lookup.setdefault(deleted, []).append(token)
+            self._deletions = lookup
+        return self._deletions
+
+    def expand(self, term:str) -> list[tuple[str, float]]:
+        # the term itself, every indexed word that starts with it and every word one typo away from it
+        vocabulary = self.vocabulary
+        expansions = {}
+        if term in self.postings:
+            expansions[term] = 1.0
+        if len(term) >= MIN_PREFIX_LENGTH:
+            index = bisect_left(vocabulary, term)
+            while index < len(vocabulary) and vocabulary[index].startswith(term) and len(expansions) < MAX_PREFIX_EXPANSIONS:
+                expansions.setdefault(vocabulary[index], PREFIX_WEIGHT)
+                index += 1
+
+        if len(term) >= FUZZY_MIN_LENGTH:
+            lookup = self.typo_lookup
+            for deleted in deletions(term) | {term}:
+                for token in lookup.get(deleted, ()):
+                    if token not in expansions and within_one_typo(term, token):
+                        expansions[token] = FUZZY_WEIGHT
+        return list(expansions.items())
+
+    def search(self, query:str, limit:int = None) -> list[tuple[int, float]]:
+        # every term has to match (as a word or word prefix), results are ranked by weighted tf-idf
+        terms = tokenize(query)
+        if len(terms) == 0:
+            return []
+
+        document_count = max(len(self.documents), 1)
+        scores:dict[int, float] | None = None
+        for term in terms:
+            term_scores:dict[int, float] = {}
+            for token, match_weight in self.expand(term):
+                posting = self.postings[token]
+                idf = math.log(1 + document_count / len(posting))
+                for mod_id, weight in posting.items():
+                    score = weight * idf * match_weight
+                    if score > term_scores.get(mod_id, 0):
+                        term_scores[mod_id] = score
+
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {mod_id: score + term_scores[mod_id] for mod_id, score in scores.items() if mod_id in term_scores}
+            if len(scores) == 0:
+                return []
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit] if limit is not None else ranked
+
+    def save_to_file(self, location:str) -> None:
+        # the typo lookup is saved as well, it takes longer to rebuild than to load
+        path = os.path.join(location, SEARCH_INDEX_FILE)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                pickle.dump((SEARCH_INDEX_VERSION, self.postings, self.documents, self.typo_lookup), f)
+            os.replace(temp_path, path)
+        except OSError:
+            traceback.print_exc()
+
+    @staticmethod
+    def load_from_file(location:str) -> 'ModSearchIndex':
+        index = ModSearchIndex()
+        path = os.path.join(location, SEARCH_INDEX_FILE)
+        if not os.path.exists(path):
+            return index
+
+        try:
+            with open(path, 'rb') as f:
+                saved = pickle.load(f)
+            if len(saved) != 4 or saved[0] != SEARCH_INDEX_VERSION:
+                return index # tokenized or saved differently, rebuilt from the next catalog
+            _version, index.postings, index.documents, index._deletions = saved
+        except Exception:
+            print("Failed to load the mod search index, it will be rebuilt")
+            traceback.print_exc()
+            return ModSearchIndex()
+        return index
@@ -0,0 +1,109 @@
+import re
+import json
+
+_STRUCTURAL = re.compile(r'[{}\[\]"]')
+_STRING_END = re.compile(r'["\\]')
+_SEPARATOR = re.compile(r'[\s,]*')
+
+_decoder = json.JSONDecoder()
+
+
+class JsonArrayStreamer:
+    # incrementally pulls the objects out of one top level array (ie. {"statuscode": "200", "mods": [{...}, {...}]})
+    # as text arrives, everything else in the document is kept and returned from close()
+    def __init__(self, object_key:str):
+        self.object_key = object_key
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._string_start = 0
+        self._last_string = None
+        self._in_array = False
+        self._array_done = False
+        self._skeleton:list[str] = []
+
+    def feed(self, text:str) -> list[dict]:
+        self._buffer += text
+        if self._array_done:
+            return []
+        if not self._in_array and not self._find_array():
+            return []
+        return self._read_elements()
+
+    def close(self) -> dict:
+        if self._in_array:
+            raise ValueError(f"Stream ended inside the '{self.object_key}' array")
+        self._skeleton.append(self._buffer)
+        return json.loads("".join(self._skeleton))
+
+    def _find_array(self) -> bool:
+        # walks the document up to the opening bracket of the array, only the structure is tracked here, values are parsed in close()
+        buffer = self._buffer
+        pos = self._pos
+
+        while True:
+            if self._in_string:
+                match = _STRING_END.search(buffer, pos)
+                if match is None:
+                    self._pos = len(buffer)
+                    return False
+                if match.group() == '\\':
+                    if match.end() >= len(buffer):
+                        # escape split across chunks, wait for the next one
+                        self._pos = match.start()
+                        return False
+                    pos = match.end() + 1
+                    continue
+
+                self._in_string = False
+                pos = match.end()
+                if self._depth == 1:
+                    self._last_string = buffer[self._string_start + 1:pos - 1]
+                continue
+
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                self._pos = len(buffer)
+                return False
+
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+                self._string_start = match.start()
+            elif char == '{' or char == '[':
+                self._depth += 1
+                if char == '[' and self._depth == 2 and self._last_string == self.object_key:
+                    self._in_array = True
+                    self._skeleton.append(buffer[:pos])
+                    self._buffer = buffer[pos:]
+                    self._pos = 0
+                    return True
+            else:
+                self._depth -= 1
+
+    def _read_elements(self) -> list[dict]:
+        objects = []
+        buffer = self._buffer
+        pos = self._pos
+
+        while True:
+            pos = _SEPARATOR.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ']':
+                self._in_array = False
+                self._array_done = True
+                break
+            try:
+                object, pos_after = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # the element is still arriving
+                break
+            objects.append(object)
+            pos = pos_after
+
+        self._buffer = buffer[pos:]
+        self._pos = 0
+        return objects
@@ -0,0 +1,25 @@
+import os
+import tempfile
+
+import pytest
+
+# ui builds its settings, cache and client at import time from the home directory, tests never touch the real one
+from stand_in_api import StandInApi, synthetic_catalog, make_home
+
+TEST_HOME = make_home(tempfile.mkdtemp(prefix="vs-mod-manager-tests-"))
+os.environ["HOME"] = TEST_HOME
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+@pytest.fixture(scope="session")
+def catalog() -> dict[str, list[dict]]:
+    return synthetic_catalog()
+
+
+@pytest.fixture
+def stand_in_api(monkeypatch):
+    import vsmoddb.client
+    api = StandInApi().start()
+    monkeypatch.setattr(vsmoddb.client, "BASE_URL", api.url)
+    yield api
+    api.stop()
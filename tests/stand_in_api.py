@@ -0,0 +1,227 @@
+import json
+import os
+import random
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "storage farming carry capacity better ruins wolf cheese trader map quest smithing pottery "
+    "vanity lanterns chisel tailor armor primitive survival expanded wildcraft hud compass"
+).split()
+SYLLABLES = "ka ri to mu sen da lo vi ne ru ba shi go te ma pel kor an".split()
+
+
+def make_home(home:str, game_version:str = "1.20.0") -> str:
+    # a home directory as an already configured install leaves it: settings past the first launch popup,
+    # the mod download folder and the game's Mods folder
+    manager_path = os.path.join(home, ".local", "share", "VsModManager")
+    game_data_path = os.path.join(home, ".config", "VintagestoryData")
+    os.makedirs(os.path.join(manager_path, "mods"), exist_ok=True)
+    os.makedirs(os.path.join(game_data_path, "Mods"), exist_ok=True)
+    profile = {"name": "Default", "description": "", "mods": {}, "game_version": game_version}
+    settings = {
+        "game": {"path": home, "version": game_version, "data_path": game_data_path, "current_enabled_mods": []},
+        "mod_manager": {
+            "download_location": os.path.join(manager_path, "mods"),
+            "cache_location": os.path.join(manager_path, "cache"),
+            "first_launch": False,
+            "profiles": [profile],
+            "active_profile": profile,
+        },
+    }
+    with open(os.path.join(manager_path, "settings.json"), "w") as f:
+        json.dump(settings, f)
+    return home
+
+
+def synthetic_catalog(mod_count:int = 10000, author_count:int = 8000, seed:int = 1) -> dict[str, list[dict]]:
+    # raw api payloads shaped like the real /api/tags, /api/gameversions, /api/authors and /api/mods responses
+    rng = random.Random(seed)
+    # summaries draw from a few thousand made up words as well, so common words are not in every other mod
+    vocabulary = WORDS + ["".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(3000)]
+    tags = [{"tagid": tag_id, "name": f"Tag {tag_id}", "color": "#C9C9C9"} for tag_id in range(1, 41)]
+    versions = [
+        {"tagid": 1000 + index, "name": f"v1.{18 + index // 5}.{index % 5}", "color": "#CCCCCC"}
+        for index in range(25)
+    ]
+    authors = [{"userid": user_id, "name": f"author{user_id}"} for user_id in range(1, author_count + 1)]
+    mods = []
+    for mod_id in range(1, mod_count + 1):
+        mods.append({
+            "modid": mod_id,
+            "assetid": mod_id + 1000,
+            "downloads": rng.randint(0, 1000000),
+            "follows": rng.randint(0, 2000),
+            "trendingpoints": rng.randint(0, 500),
+            "comments": rng.randint(0, 300),
+            "name": f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {mod_id}",
+            "summary": " ".join(rng.choices(vocabulary, k=12)),
+            "modidstrs": [f"{rng.choice(WORDS)}mod{mod_id}"],
+            "author": f"author{rng.randint(1, author_count)}",
+            "urlalias": None,
+            "side": rng.choice(["both", "client", "server"]),
+            "type": "mod",
+            "logo": f"https://moddbcdn.vintagestory.at/{mod_id}/logo_{rng.getrandbits(32):08x}.png",
+            "tags": [tag["name"] for tag in rng.sample(tags, rng.randint(0, 3))],
+            "lastreleased": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}",
+        })
+    return {"tags": tags, "gameversions": versions, "authors": authors, "mods": mods}
+
+
+def full_mod(partial:dict, releases:int = 3) -> dict:
+    # what /api/mod/<id> returns for one of the synthetic partial mods
+    mod = dict(partial)
+    mod.update({
+        "text": f"<p>{partial['summary']}</p>",
+        "logofilename": "logo.png",
+        "logofile": partial["logo"],
+        "homepageurl": None,
+        "sourcecodeurl": None,
+        "trailervideourl": None,
+        "issuetrackerurl": None,
+        "wikiurl": None,
+        "created": "2023-01-01 00:00:00",
+        "lastmodified": partial["lastreleased"],
+        "screenshots": [],
+        "releases": [
+            {
+                "releaseid": partial["modid"] * 100 + index,
+                "mainfile": f"/files/{partial['modidstrs'][0]}_1.{index}.0.zip",
+                "filename": f"{partial['modidstrs'][0]}_1.{index}.0.zip",
+                "fileid": partial["modid"] * 100 + index,
+                "downloads": 10 * index,
+                "tags": ["v1.20.0"],
+                "modidstr": partial["modidstrs"][0],
+                "modversion": f"1.{index}.0",
+                "created": f"2024-01-{index + 1:02d} 00:00:00",
+                "changelog": "fixes",
+            }
+            for index in reversed(range(releases))
+        ],
+    })
+    return mod
+
+
+class QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        pass # clients going away mid request (the app quitting, a cancelled download) are expected here
+
+
+class StandInApi:
+    # a local http server speaking enough of the mod db api for the clients, with switchable validators,
+    # an optional delay per request, bodies optionally trickled out in chunks, ranged file downloads and a log of every request it answered
+    def __init__(self, catalog:dict[str, list[dict]] = None, validators:str = "etag", delay:float = 0.0):
+        self.catalog = catalog if catalog is not None else synthetic_catalog(200, 50)
+        self.validators = validators # "etag", "last_modified" or "none"
+        self.delay = delay
+        self.trickle:tuple[int, float] | None = None # (bytes per write, seconds between writes)
+        self.last_write:dict[str, float] = {} # path -> time.monotonic() the last piece of its latest body went out
+        self.files:dict[str, bytes] = {}
+        self.requests:list[tuple[str, int, dict[str, str]]] = [] # (path, status, request headers)
+        self.version = 1 # bump to make every response change
+        self._lock = threading.Lock()
+        self.server = QuietServer(("127.0.0.1", 0), self.handler_class())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self) -> "StandInApi":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, path_prefix:str, status:int = None) -> int:
+        with self._lock:
+            return sum(1 for path, answered, _ in self.requests if path.startswith(path_prefix) and (status is None or answered == status))
+
+    def log(self, path:str, status:int, headers:dict[str, str]):
+        with self._lock:
+            self.requests.append((path, status, headers))
+
+    def api_body(self, path:str) -> dict | None:
+        interface = path.removeprefix("/api/")
+        if interface in ("tags", "gameversions", "authors", "mods"):
+            return {"statuscode": "200", interface: self.catalog[interface]}
+        if interface.startswith("mod/"):
+            mod_id = interface.removeprefix("mod/")
+            for mod in self.catalog["mods"]:
+                if str(mod["modid"]) == mod_id or mod_id in mod["modidstrs"]:
+                    return {"statuscode": "200", "mod": full_mod(mod)}
+            return {"statuscode": "404"}
+        if interface.startswith("comments/") or interface.startswith("changelogs/"):
+            return {"statuscode": "200", interface.split("/")[0]: []}
+        return None
+
+    def handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def reply(self, status:int, body:bytes = b"", headers:dict[str, str] = None):
+                api.log(self.path.split("?")[0], status, dict(self.headers))
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                chunk_size, pause = api.trickle or (max(len(body), 1), 0)
+                for start in range(0, len(body), chunk_size):
+                    if start > 0:
+                        time.sleep(pause)
+                    if start + chunk_size >= len(body):
+                        with api._lock:
+                            api.last_write[self.path.split("?")[0]] = time.monotonic()
+                    self.wfile.write(body[start:start + chunk_size])
+                    self.wfile.flush()
+
+            def do_GET(self):
+                if api.delay > 0:
+                    time.sleep(api.delay)
+                path = self.path.split("?")[0]
+                if path.startswith("/files/"):
+                    return self.send_file(path.removeprefix("/files/"))
+
+                body = api.api_body(path)
+                if body is None:
+                    return self.reply(404)
+                validators = {}
+                if api.validators == "etag":
+                    validators["ETag"] = f'"{path}-{api.version}"'
+                elif api.validators == "last_modified":
+                    validators["Last-Modified"] = formatdate(1700000000 + api.version, usegmt=True)
+                if ("ETag" in validators and self.headers.get("If-None-Match") == validators["ETag"]) or (
+                    "Last-Modified" in validators and self.headers.get("If-Modified-Since") == validators["Last-Modified"]
+                ):
+                    return self.reply(304, headers=validators)
+                self.reply(200, json.dumps(body).encode(), {"Content-Type": "application/json", **validators})
+
+            def send_file(self, name:str):
+                content = api.files.get(name)
+                if content is None:
+                    return self.reply(404)
+                requested = self.headers.get("Range")
+                if requested is None:
+                    return self.reply(200, content)
+                first, last = requested.removeprefix("bytes=").split("-")
+                if first == "":
+                    # the last bytes of the file, all of it when it is shorter
+                    first, last = max(len(content) - int(last), 0), len(content) - 1
+                start = int(first)
+                end = min(int(last), len(content) - 1) if last != "" else len(content) - 1
+                if start >= len(content):
+                    return self.reply(416, headers={"Content-Range": f"bytes */{len(content)}"})
+                self.reply(206, content[start:end + 1], {"Content-Range": f"bytes {start}-{end}/{len(content)}"})
+
+        return Handler
@@ -0,0 +1,95 @@
+import random
+import threading
+import traceback
+
+import pytest
+
+from vsmoddb.client import CacheManager
+
+THREADS = 200
+KEYS_PER_WRITER = 25
+
+
+def stress(managers:list[CacheManager], threads:int = THREADS) -> list[BaseException]:
+    # half the threads write their own keys and overwrite shared ones, the other half read everything back while they do
+    errors = []
+    start = threading.Barrier(threads)
+
+    def writer(index:int):
+        manager = managers[index % len(managers)]
+        start.wait()
+        for key_index in range(KEYS_PER_WRITER):
+            manager.set(f"mods_writer{index}_{key_index}", {"writer": index, "key": key_index, "padding": "x" * random.randint(0, 4000)})
+            manager.set(f"mods_shared_{key_index}", {"writer": index, "key": key_index})
+            manager.set(f"https://images/{index}_{key_index}.jpg", bytes(random.randint(1, 8000)))
+
+    def reader(index:int):
+        manager = managers[index % len(managers)]
+        rng = random.Random(index)
+        start.wait()
+        for _ in range(KEYS_PER_WRITER * 4):
+            writer_index = rng.randrange(0, threads, 2)
+            key_index = rng.randrange(KEYS_PER_WRITER)
+            value = manager.get(f"mods_writer{writer_index}_{key_index}")
+            assert value is None or (value["writer"], value["key"]) == (writer_index, key_index)
+            shared = manager.get(f"mods_shared_{key_index}")
+            assert shared is None or shared["key"] == key_index
+            manager.stats()
+
+    def run(target, index:int):
+        try:
+            target(index)
+        except BaseException as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=run, args=(writer if index % 2 == 0 else reader, index)) for index in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return errors
+
+
+@pytest.fixture
+def printed_errors(monkeypatch) -> list[str]:
+    # the manager prints and swallows sqlite and pickle errors, the stress tests must not hit any
+    printed = []
+    monkeypatch.setattr(traceback, "print_exc", lambda *args, **kwargs: printed.append(traceback.format_exc()))
+    return printed
+
+
+def check_everything_written(manager:CacheManager, threads:int = THREADS):
+    for index in range(0, threads, 2):
+        for key_index in range(KEYS_PER_WRITER):
+            value = manager.get(f"mods_writer{index}_{key_index}")
+            assert value is not None and (value["writer"], value["key"]) == (index, key_index)
+    for key_index in range(KEYS_PER_WRITER):
+        assert manager.get(f"mods_shared_{key_index}")["key"] == key_index
+
+
+def check_accounting(manager:CacheManager):
+    with manager._lock:
+        for kind, entries in manager.memory.items():
+            assert manager.usage[kind] == sum(entry["size"] for entry in entries.values())
+            assert manager.usage[kind] <= manager.budgets[kind]
+
+
+def test_concurrent_readers_and_writers(tmp_path, printed_errors):
+    # small budgets so eviction runs all the time while the threads race
+    manager = CacheManager(str(tmp_path), json_budget=256 * 1024, blob_budget=128 * 1024)
+    assert stress([manager]) == []
+    assert printed_errors == []
+    check_accounting(manager)
+    # evicted entries come back from the database, nothing written is lost
+    check_everything_written(manager)
+    check_everything_written(CacheManager(str(tmp_path)))
+
+
+def test_managers_sharing_a_database(tmp_path, printed_errors):
+    # two managers on one cache folder stand in for two app instances
+    managers = [CacheManager(str(tmp_path), json_budget=128 * 1024), CacheManager(str(tmp_path), json_budget=128 * 1024)]
+    assert stress(managers) == []
+    assert printed_errors == []
+    for manager in managers:
+        check_accounting(manager)
+        check_everything_written(manager)
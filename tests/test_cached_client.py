@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from vsmoddb.client import CacheManager, CachedModDbClient, DEFAULT_CACHE_POLICY, cache_policy
+
+CALLERS = 8
+
+
+def call_at_once(call) -> list[object]:
+    # every caller is released together, the stand in's delay keeps the first request in flight until all have asked
+    barrier = threading.Barrier(CALLERS)
+    results:list[object] = [None] * CALLERS
+
+    def caller(index:int):
+        barrier.wait()
+        try:
+            results[index] = call()
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=caller, args=(index,)) for index in range(CALLERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.mark.parametrize("kind", ["mod", "file"])
+def test_concurrent_misses_share_one_request(stand_in_api, tmp_path, kind):
+    client = CachedModDbClient(CacheManager(str(tmp_path)), warm_start=False)
+    mod_id = stand_in_api.catalog["mods"][0]["modid"]
+    stand_in_api.files["icon.png"] = b"\x89PNG" + bytes(range(256))
+    stand_in_api.delay = 0.5
+    path = f"/api/mod/{mod_id}" if kind == "mod" else "/files/icon.png"
+    call = (lambda: client.get_mod(mod_id)) if kind == "mod" else (lambda: client.fetch_to_memory("/files/icon.png"))
+
+    before = client.metrics.totals() # the client loads tags, versions and authors on its own
+    results = call_at_once(call)
+
+    assert stand_in_api.count(path) == 1
+    totals = client.metrics.totals()
+    assert (totals["misses"] - before["misses"], totals["coalesced"]) == (1, CALLERS - 1)
+    if kind == "mod":
+        assert all(result.mod_id == mod_id for result in results)
+    else:
+        assert all(result == stand_in_api.files["icon.png"] for result in results)
+
+
+@pytest.mark.parametrize("kind", ["mod", "file"])
+def test_owners_exception_reaches_every_waiter(stand_in_api, tmp_path, kind):
+    client = CachedModDbClient(CacheManager(str(tmp_path)), warm_start=False)
+    stand_in_api.delay = 0.5
+    path = "/api/mod/not-a-mod" if kind == "mod" else "/files/missing.png"
+    call = (lambda: client.get_mod("not-a-mod")) if kind == "mod" else (lambda: client.fetch_to_memory("/files/missing.png"))
+
+    results = call_at_once(call)
+
+    assert stand_in_api.count(path) == 1
+    assert client.metrics.totals()["coalesced"] == CALLERS - 1
+    assert all(isinstance(result, Exception) for result in results)
+    assert len({type(result) for result in results}) == 1
+    # nothing is left in flight, the next caller sends its own request
+    assert client._in_flight == {}
+    stand_in_api.delay = 0
+    assert isinstance(call_at_once(call)[0], Exception)
+
+
+def test_policy_table():
+    assert cache_policy("tags_None") == (24 * 60, 7 * 24 * 60)
+    assert cache_policy("authors_None") == (6 * 60, 7 * 24 * 60)
+    assert cache_policy("comments/12_None") == (2, 60)
+    assert cache_policy("mod/12_None") == cache_policy("mods_orderby=downloads") == (15, 24 * 60)
+    assert cache_policy("https://moddbcdn.vintagestory.at/12/logo.png") == (7 * 24 * 60, 30 * 24 * 60)
+    assert cache_policy("something_else") == DEFAULT_CACHE_POLICY
+
+
+def test_stale_entry_is_served_while_one_refresh_runs(stand_in_api, tmp_path, monkeypatch):
+    client = CachedModDbClient(CacheManager(str(tmp_path)), warm_start=False)
+    asset_id = stand_in_api.catalog["mods"][0]["assetid"]
+    path = f"/api/comments/{asset_id}"
+    clock = [time.time()]
+    monkeypatch.setattr(time, "time", lambda: clock[0])
+    first = client.get_api(f"comments/{asset_id}")
+    assert stand_in_api.count(path) == 1
+
+    # comments are fresh for 2 minutes and served stale for an hour after that
+    clock[0] += 3 * 60
+    stand_in_api.delay = 0.5
+    before = client.metrics.totals()
+    start = time.perf_counter()
+    stale = [client.get_api(f"comments/{asset_id}") for _ in range(5)]
+    assert time.perf_counter() - start < stand_in_api.delay # none of them waited for the refresh
+    assert all(response is first for response in stale)
+    assert client.metrics.totals()["stale_hits"] - before["stale_hits"] == 5
+
+    deadline = time.monotonic() + 10
+    while stand_in_api.count(path) < 2 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(stand_in_api.delay + 0.2)
+    assert stand_in_api.count(path) == 2 # one background refresh for all five stale hits
+    assert client.metrics.totals()["hits"] == before["hits"]
+    client.get_api(f"comments/{asset_id}")
+    assert client.metrics.totals()["hits"] == before["hits"] + 1 # the refresh made it fresh again
+
+    # past fresh and stale the entry is gone, the caller waits for a new request
+    clock[0] += 2 * 60 + 60 * 60 + 1
+    before = client.metrics.totals()
+    client.get_api(f"comments/{asset_id}")
+    assert stand_in_api.count(path) == 3
+    assert client.metrics.totals()["misses"] - before["misses"] == 1
+    assert client.metrics.totals()["stale_hits"] == before["stale_hits"]
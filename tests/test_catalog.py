@@ -0,0 +1,120 @@
+import random
+
+import pytest
+
+from vsmoddb.catalog import FilterMode, ModCatalog
+from vsmoddb.client import BaseModDbClient
+from vsmoddb.models import SearchOrderBy, SearchOrderDirection
+from stand_in_api import synthetic_catalog
+from test_registry import registry_client
+from test_search_index import make_mods, raw_mod
+
+SORT_KEYS = {
+    SearchOrderBy.TRENDING: lambda mod: mod.trending_points,
+    SearchOrderBy.DOWNLOADS: lambda mod: mod.downloads,
+    SearchOrderBy.COMMENTS: lambda mod: mod.comments,
+    SearchOrderBy.FOLLOWS: lambda mod: mod.follows,
+    SearchOrderBy.CREATED: lambda mod: mod.asset_id,
+    SearchOrderBy.LAST_RELEASED: lambda mod: mod.last_released,
+}
+
+
+def version_catalog() -> ModCatalog:
+    catalog = ModCatalog(make_mods(BaseModDbClient(), [raw_mod(mod_id, f"Mod {mod_id}") for mod_id in range(1, 6)]))
+    catalog.set_version_members(100, [1, 2, 3])
+    catalog.set_version_members(101, [2, 3, 4])
+    catalog.set_version_members(102, [3])
+    return catalog
+
+
+def mod_ids(catalog:ModCatalog, bits:int) -> set[int]:
+    return {mod.mod_id for mod in catalog.select(bits)}
+
+
+def test_version_modes():
+    catalog = version_catalog()
+    assert mod_ids(catalog, catalog.filter_bits(versions=[100, 101], version_mode=FilterMode.ANY)) == {1, 2, 3, 4}
+    assert mod_ids(catalog, catalog.filter_bits(versions=[100, 101], version_mode=FilterMode.ALL)) == {2, 3}
+    assert mod_ids(catalog, catalog.filter_bits(versions=[100, 101, 102], version_mode=FilterMode.ALL)) == {3}
+    assert catalog.filter_bits(versions=[100, 999]) is None # membership never fetched, the api has to answer
+
+
+def test_version_facet_counts():
+    catalog = version_catalog()
+    counts = catalog.facet_counts(catalog.all_bits, catalog.version_bits)
+    assert counts == {100: 3, 101: 3, 102: 1}
+
+    # counts within the current results, what the ui shows in "match all versions" mode
+    results = catalog.filter_bits(versions=[100, 101], version_mode=FilterMode.ALL)
+    assert catalog.facet_counts(results, catalog.version_bits) == {100: 2, 101: 2, 102: 1}
+
+    # and narrowed by a text search
+    narrowed = catalog.filter_bits(mod_ids=[1, 4])
+    assert catalog.facet_counts(narrowed, catalog.version_bits) == {100: 1, 101: 1, 102: 0}
+
+
+@pytest.fixture(scope="module")
+def synthetic():
+    # few enough authors that some have several mods, and plenty of equal comment counts to check ties
+    raw = synthetic_catalog(400, 60, seed=7)
+    client = registry_client(BaseModDbClient, raw)
+    mods = []
+    client.add_partial_mods(mods, raw["mods"])
+    return ModCatalog(mods)
+
+
+def plain_order(mods:list, orderby:SearchOrderBy, order_direction:SearchOrderDirection) -> list:
+    # equal values keep catalog order going up, and the reverse of it going down
+    ordered = sorted(mods, key=SORT_KEYS[orderby])
+    return ordered if order_direction == SearchOrderDirection.ASC else ordered[::-1]
+
+
+@pytest.mark.parametrize("order_direction", list(SearchOrderDirection))
+@pytest.mark.parametrize("orderby", list(SearchOrderBy))
+def test_select_orders_like_sorted(synthetic, orderby, order_direction):
+    assert synthetic.select(synthetic.all_bits, orderby, order_direction) == plain_order(synthetic.mods, orderby, order_direction)
+
+    tag_id = synthetic.mods[0].tags[0].id if synthetic.mods[0].tags else next(iter(synthetic.tag_bits))
+    bits = synthetic.filter_bits(mod_tags=[tag_id])
+    tagged = [mod for mod in synthetic.mods if tag_id in [tag.id for tag in mod.tags]]
+    assert synthetic.select(bits, orderby, order_direction) == plain_order(tagged, orderby, order_direction)
+
+
+@pytest.mark.parametrize("order_direction", list(SearchOrderDirection))
+@pytest.mark.parametrize("orderby", list(SearchOrderBy))
+def test_select_ranked_breaks_score_ties_by_the_sort_order(synthetic, orderby, order_direction):
+    rng = random.Random(orderby.value + order_direction.value)
+    scores = {mod.mod_id: float(rng.randint(1, 4)) for mod in rng.sample(synthetic.mods, 150)}
+    scores[10 ** 9] = 5.0 # not in the catalog
+    tag_ids = sorted(synthetic.tag_bits)[:10]
+    bits = synthetic.filter_bits(mod_tags=tag_ids, tag_mode=FilterMode.ANY)
+
+    matching = [mod for mod in plain_order(synthetic.mods, orderby, order_direction) if mod.mod_id in scores and any(tag.id in tag_ids for tag in mod.tags)]
+    expected = sorted(matching, key=lambda mod: scores[mod.mod_id], reverse=True)
+    assert synthetic.select_ranked(bits, scores, orderby, order_direction) == expected
+
+
+@pytest.mark.parametrize("tag_mode", list(FilterMode))
+def test_tag_and_author_filters_match_a_plain_filter(synthetic, tag_mode):
+    authors = {}
+    for mod in synthetic.mods:
+        authors.setdefault(mod.author.user_id, (mod.author, []))[1].append(mod)
+    author = max(authors.values(), key=lambda entry: len(entry[1]))[0]
+    common = [tag_id for tag_id, bits in sorted(synthetic.tag_bits.items(), key=lambda item: -item[1].bit_count())]
+
+    # the tags of one mod, so matching all of them finds at least that mod
+    own_tags = [tag.id for tag in next(mod for mod in synthetic.mods if len(mod.tags) == 3).tags]
+
+    for tag_ids in (common[:1], common[:2], common[:3], own_tags, [common[0], 10 ** 6]):
+        def matches(mod) -> bool:
+            mod_tag_ids = {tag.id for tag in mod.tags}
+            return (any if tag_mode == FilterMode.ANY else all)(tag_id in mod_tag_ids for tag_id in tag_ids)
+
+        expected = [mod for mod in synthetic.mods if matches(mod)]
+        assert len(expected) > 0 or tag_ids is not own_tags
+        assert mod_ids(synthetic, synthetic.filter_bits(mod_tags=tag_ids, tag_mode=tag_mode)) == {mod.mod_id for mod in expected}
+
+        by_author = synthetic.filter_bits(author=author, mod_tags=tag_ids, tag_mode=tag_mode)
+        assert mod_ids(synthetic, by_author) == {mod.mod_id for mod in expected if mod.author.user_id == author.user_id}
+
+    assert mod_ids(synthetic, synthetic.filter_bits(author=author)) == {mod.mod_id for mod in authors[author.user_id][1]}
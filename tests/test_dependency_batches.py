@@ -0,0 +1,189 @@
+import io
+import json
+import os
+import random
+import time
+import zipfile
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+from PySide6.QtWidgets import QApplication, QMessageBox
+
+import vsmoddb.async_client
+from mod_store import ModStore
+from vsmoddb.client import CacheManager, CachedModDbClient
+from stand_in_api import full_mod
+
+
+def mod_zip(mod_id_str:str, version:str, dependencies:dict[str, str], padding:int = 0) -> bytes:
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w') as zip_file:
+        zip_file.writestr("modinfo.json", json.dumps({"type": "code", "modid": mod_id_str, "name": mod_id_str, "version": version, "dependencies": {"game": "1.20.0", **dependencies}}))
+        if padding > 0:
+            zip_file.writestr("assets/padding.bin", random.Random(padding).randbytes(padding), compress_type=zipfile.ZIP_STORED)
+    return data.getvalue()
+
+
+@pytest.fixture
+def downloads(stand_in_api, tmp_path, monkeypatch):
+    # first: a -> b (1.1.0 or newer) -> c, second: a -> c, every release of every mod has its own zip on the stand in
+    app = QApplication.instance() or QApplication([])
+    monkeypatch.setattr(vsmoddb.async_client, "BASE_URL", stand_in_api.url)
+    from ui import mod_index, mod_watcher, user_settings
+
+    mods = [full_mod(partial) for partial in stand_in_api.catalog["mods"][:4]]
+    a, b, c, second = [mod["modidstrs"][0] for mod in mods]
+    dependencies = {a: {b: "1.1.0"}, b: {c: "*"}, c: {}, second: {a: "1.0.0", c: "1.2.0"}}
+    for mod in mods:
+        for release in mod["releases"]:
+            stand_in_api.files[release["filename"]] = mod_zip(release["modidstr"], release["modversion"], dependencies[release["modidstr"]])
+
+    download_location = tmp_path / "mods"
+    download_location.mkdir()
+    client = CachedModDbClient(CacheManager(str(tmp_path / "cache")), warm_start=False)
+    monkeypatch.setattr(mod_index, "moddb_client", client)
+    monkeypatch.setattr(mod_index, "mod_store", ModStore(str(download_location / ".store")))
+    monkeypatch.setattr(user_settings, "mod_download_location", str(download_location))
+    monkeypatch.setattr(user_settings, "downloaded_mods", [])
+    monkeypatch.setattr(user_settings, "save", lambda: None)
+    monkeypatch.setattr(mod_watcher, "registered_downloads", {})
+
+    plans = []
+    resolve_dependencies = mod_index.resolve_dependencies
+    def recording_resolve(local_mods):
+        plan = resolve_dependencies(local_mods)
+        plans.append(([mod.mod_id_str for mod in local_mods], plan))
+        return plan
+    monkeypatch.setattr(mod_index, "resolve_dependencies", recording_resolve)
+    shown = []
+    def accept(message_box):
+        shown.append(message_box.detailedText())
+        return QMessageBox.StandardButton.Yes
+    monkeypatch.setattr(QMessageBox, "exec", accept)
+
+    downloader = mod_index.ModDownloader()
+    finished = []
+    downloader.signals.finished.connect(lambda: finished.append([mod.mod_id_str for mod in user_settings.downloaded_mods]))
+    yield downloader, client, (a, b, c, second), plans, shown, finished
+    downloader.progress_timer.stop()
+
+
+def run_until(condition, timeout:float = 15.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+        time.sleep(0.01)
+    # anything the batch would still have queued after finishing has to show up here too
+    for _ in range(20):
+        QCoreApplication.processEvents()
+        time.sleep(0.01)
+
+
+def test_batch_resolves_once_and_finishes_after_its_dependencies(downloads):
+    downloader, client, (a, b, c, second), plans, shown, finished = downloads
+    for mod_id_str in (a, second):
+        release = client.get_mod(mod_id_str).releases[0]
+        downloader.add_download_job(downloader.prepare_mod_download(release, downloader.release_download_path(release)))
+    downloader.start_download()
+    run_until(lambda: len(finished) > 0)
+
+    # one resolve for both mods of the batch, its plan shown before being queued
+    assert [sorted(requested) for requested, _ in plans] == [sorted([a, second])]
+    plan = plans[0][1]
+    # c is asked for by the second mod and by b, it is planned once at the version that satisfies both
+    assert plan.ok and [(step.mod_id_str, step.action) for step in plan.steps] == [(c, "install"), (b, "install"), (a, "keep")]
+    assert plan.steps[0].version == "1.2.0"
+    assert len(shown) == 1 and f"install {b}" in shown[0] and f"install {c}" in shown[0]
+
+    # the batch is reported finished once, with the dependencies already installed
+    assert len(finished) == 1
+    assert sorted(finished[0]) == sorted([a, second, b, c])
+    assert downloader.total_job_count == 0 and downloader.resolve_worker is None
+
+
+def test_profile_pins_exact_versions(downloads):
+    downloader, client, (a, b, c, second), plans, shown, finished = downloads
+    from ui import mod_index
+    plan = mod_index.resolve_profile_mods({a: "1.0.0"})
+    assert plan.ok
+    # a is pinned, b and c only have to satisfy the lowest versions they are asked for, so they get the newest release
+    assert [(step.mod_id_str, step.version) for step in plan.steps] == [(c, "1.2.0"), (b, "1.2.0"), (a, "1.0.0")]
+
+    # a pinned release is honoured even when it isn't tagged for the profiles game version
+    pinned = mod_index.resolve_profile_mods({c: "1.1.0"}, "1.18.0")
+    assert pinned.ok and [(step.mod_id_str, step.version) for step in pinned.steps] == [(c, "1.1.0")]
+    assert not mod_index.resolve_profile_mods({a: "1.3.0"}).ok
+
+
+def test_declined_plan_leaves_nothing_behind_in_the_store(downloads, monkeypatch):
+    downloader, client, (a, b, c, second), plans, shown, finished = downloads
+    from ui import mod_index, thread_pool
+    monkeypatch.setattr(QMessageBox, "exec", lambda message_box: shown.append(message_box.detailedText()) or QMessageBox.StandardButton.No)
+    release = client.get_mod(a).releases[0]
+    downloader.add_download_job(downloader.prepare_mod_download(release, downloader.release_download_path(release)))
+    downloader.start_download()
+    run_until(lambda: len(finished) > 0)
+    thread_pool.waitForDone()
+
+    assert len(shown) == 1 and finished == [[a]]
+    # only the object the downloaded file links to is left, nothing the resolver looked at for the declined mods
+    store = mod_index.mod_store
+    assert len(store.list_objects()) == 1 and list(store.index) == [release.main_file]
+
+
+def test_dependencies_are_read_with_ranged_requests(downloads, stand_in_api):
+    downloader, client, (a, b, c, second), plans, shown, finished = downloads
+    from ui import mod_index
+    from vsmoddb.client import RANGE_READ_AHEAD
+    release = client.get_mod(b).releases[0]
+    # content pack sized, megabytes of assets besides the modinfo
+    stand_in_api.files[release.filename] = mod_zip(b, release.mod_version, {c: "*"}, padding=4 * 1024 * 1024)
+
+    assert mod_index.read_release_dependencies(release) == {c: "*"}
+    ranges = [headers.get("Range") for path, _, headers in stand_in_api.requests if path == f"/files/{release.filename}"]
+    # the end of the zip, then the modinfo entry at its start, nothing in between and nothing stored
+    assert ranges == [f"bytes=-{RANGE_READ_AHEAD}", f"bytes=0-{RANGE_READ_AHEAD - 1}"]
+    assert mod_index.mod_store.list_objects() == []
+
+
+def test_urgent_jobs_start_first_and_take_over_freed_slots(downloads, monkeypatch):
+    downloader, client, (a, b, c, second), plans, shown, finished = downloads
+    from ui import mod_index
+    downloader.max_concurrent_jobs = 1
+    started = []
+    fetch_to_file = mod_index.mod_store.fetch_to_file
+    def recording_fetch_to_file(moddb_client, url, *args):
+        started.append(url.rsplit("/", 1)[-1])
+        return fetch_to_file(moddb_client, url, *args)
+    monkeypatch.setattr(mod_index.mod_store, "fetch_to_file", recording_fetch_to_file)
+    # which jobs hold a slot by the time a finished download is being processed
+    running_when_processed = []
+    register_download = mod_index.register_download
+    def recording_register_download(file_name):
+        running_when_processed.append((os.path.basename(file_name), [job.mod_release.filename for job in downloader.running_jobs]))
+        return register_download(file_name)
+    monkeypatch.setattr(mod_index, "register_download", recording_register_download)
+
+    def queue(release, priority):
+        job = downloader.add_download_job(downloader.prepare_mod_download(release, downloader.release_download_path(release)), priority)
+        job.resolved = True # nothing to resolve, only the order is of interest here
+        return job
+
+    c_releases = client.get_mod(c).releases
+    first = queue(c_releases[0], mod_index.DownloadPriority.BULK)
+    downloader.start_download()
+    assert downloader.running_jobs == [first]
+    bulk = queue(c_releases[1], mod_index.DownloadPriority.BULK)
+    dependency = queue(c_releases[2], mod_index.DownloadPriority.DEPENDENCY)
+    user = queue(client.get_mod(a).releases[0], mod_index.DownloadPriority.USER)
+    # asked for again by the user while still waiting: the same job, moved up behind the other user job
+    assert queue(c_releases[1], mod_index.DownloadPriority.USER) is bulk
+    assert downloader.pending_job_count == 3 and len(downloader.pending_jobs) == 4
+    run_until(lambda: len(finished) > 0)
+
+    order = [job.mod_release.filename for job in (first, user, bulk, dependency)]
+    assert started == order # the bulk job moved up started once, its left behind heap entry was skipped
+    assert all(job.started and job.finished and not job.failed for job in (first, bulk, dependency, user))
+    # each freed slot went to the next job before the finished download was processed
+    assert running_when_processed == [(finished_name, [next_name]) for finished_name, next_name in zip(order, order[1:])] + [(order[-1], [])]
+    assert downloader.pending_jobs == [] and downloader.queued_jobs == {}
@@ -0,0 +1,56 @@
+import hashlib
+import os
+
+from vsmoddb.client import ModDbClient, PARTIAL_DOWNLOAD_SUFFIX
+
+CONTENT = bytes(range(256)) * 400
+
+
+def download(api, tmp_path, part:bytes = None) -> tuple[ModDbClient, str, list[str], list[int]]:
+    api.files["mod.zip"] = CONTENT
+    client = ModDbClient(warm_start=False)
+    location = str(tmp_path / "mod.zip")
+    if part is not None:
+        with open(location + PARTIAL_DOWNLOAD_SUFFIX, 'wb') as file:
+            file.write(part)
+    digests = []
+    progress = []
+    assert client.fetch_to_file(f"{api.url}/files/mod.zip", location, progress_callback=progress.append, hash_callback=digests.append)
+    return client, location, digests, progress
+
+
+def read(location:str) -> bytes:
+    with open(location, 'rb') as file:
+        return file.read()
+
+
+def test_resume_partial_download(stand_in_api, tmp_path):
+    client, location, digests, progress = download(stand_in_api, tmp_path, CONTENT[:1000])
+    assert read(location) == CONTENT
+    assert digests == [hashlib.sha256(CONTENT).hexdigest()]
+    assert sum(progress) == len(CONTENT)
+    assert stand_in_api.count("/files/", 206) == 1
+
+
+def test_finished_part_file_is_not_downloaded_again(stand_in_api, tmp_path):
+    # complete but never renamed, the server answers the range with 416 "bytes */<size>"
+    client, location, digests, progress = download(stand_in_api, tmp_path, CONTENT)
+    assert read(location) == CONTENT
+    assert not os.path.exists(location + PARTIAL_DOWNLOAD_SUFFIX)
+    assert digests == [hashlib.sha256(CONTENT).hexdigest()]
+    assert sum(progress) == len(CONTENT)
+    assert stand_in_api.count("/files/") == 1
+    downloads = [metrics for name, metrics in client.metrics.endpoints.items() if name.startswith("download")]
+    assert [metrics.requests for metrics in downloads] == [1]
+    assert downloads[0].errors == 0 and downloads[0].bytes == 0
+
+
+def test_unusable_part_file_starts_over(stand_in_api, tmp_path):
+    client, location, digests, progress = download(stand_in_api, tmp_path, CONTENT + b"stale")
+    assert read(location) == CONTENT
+    assert digests == [hashlib.sha256(CONTENT).hexdigest()]
+    assert stand_in_api.count("/files/", 416) == 1 and stand_in_api.count("/files/", 200) == 1
+    # one record per request, the retry is no longer counted inside the request that got the 416
+    downloads = [metrics for name, metrics in client.metrics.endpoints.items() if name.startswith("download")]
+    assert [metrics.requests for metrics in downloads] == [2]
+    assert downloads[0].bytes == len(CONTENT)
@@ -0,0 +1,85 @@
+import multiprocessing
+import os
+import random
+
+from icon_store import IconStore, RECORD_HEADER
+
+
+def icons(seed:int, count:int) -> list[bytes]:
+    rng = random.Random(seed)
+    return [rng.randbytes(rng.randint(100, 2000)) for _ in range(count)]
+
+
+def add_icons(location:str, seed:int, count:int):
+    store = IconStore(location)
+    for icon in icons(seed, count):
+        store.add(icon)
+
+
+def test_other_instances_appends_are_kept(tmp_path):
+    location = str(tmp_path / "icons.pack")
+    first, second = IconStore(location), IconStore(location)
+    a, b, c = icons(1, 3)
+
+    handle_a = first.add(a)
+    handle_b = second.add(b) # second never walked the pack before, it appends after a
+    handle_c = first.add(c) # first has to walk past b instead of cutting it off
+
+    assert handle_b.offset > handle_a.offset and handle_c.offset > handle_b.offset
+    assert [first.read(handle) for handle in (handle_a, handle_b, handle_c)] == [a, b, c]
+    assert [second.read(handle) for handle in (handle_a, handle_b, handle_c)] == [a, b, c]
+    size = os.path.getsize(location)
+    assert second.add(c) == handle_c and os.path.getsize(location) == size
+
+
+def test_torn_record_is_overwritten(tmp_path):
+    location = str(tmp_path / "icons.pack")
+    a, b = icons(2, 2)
+    IconStore(location).add(a)
+    with open(location, 'ab') as f:
+        f.write(RECORD_HEADER.pack(b"x" * 20, 5000) + b"cut short")
+
+    store = IconStore(location)
+    handle = store.add(b)
+    assert store.read(handle) == b
+    assert os.path.getsize(location) == 2 * RECORD_HEADER.size + len(a) + len(b)
+
+
+def test_processes_appending_at_once(tmp_path):
+    location = str(tmp_path / "icons.pack")
+    context = multiprocessing.get_context("spawn")
+    # both add the same first icons, those must land once
+    processes = [context.Process(target=add_icons, args=(location, seed, 40)) for seed in (3, 3, 4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+
+    store = IconStore(location)
+    store.load_offsets()
+    expected = set(icons(3, 40)) | set(icons(4, 40))
+    assert len(store.offsets) == len(expected)
+    assert store.size == os.path.getsize(location) == sum(RECORD_HEADER.size + len(icon) for icon in expected)
+    assert {store.read(store.add(icon)) for icon in expected} == expected
+
+
+def test_compact_keeps_referenced_icons(tmp_path):
+    location = str(tmp_path / "icons.pack")
+    store = IconStore(location)
+    kept, *dropped = icons(5, 4)
+    dropped_handles = [store.add(icon) for icon in dropped]
+    kept_handle = store.add(kept)
+    other = IconStore(location) # another instance holding a handle from before the rewrite
+    assert other.read(kept_handle) == kept
+
+    assert store.compact({kept_handle.digest})
+    assert os.path.getsize(location) == RECORD_HEADER.size + len(kept)
+    # handles made before the rewrite find the icon again by digest
+    assert store.read(kept_handle) == kept and other.read(kept_handle) == kept
+    assert all(store.read(handle) is None for handle in dropped_handles)
+    assert store.add(kept).offset == RECORD_HEADER.size
+
+    # too little to win, left alone
+    store.add(dropped[0])
+    assert not store.compact({kept_handle.digest} | {handle.digest for handle in dropped_handles})
@@ -0,0 +1,60 @@
+import os
+
+from PySide6.QtCore import QBuffer, QByteArray, QIODevice
+from PySide6.QtGui import QColor, QImage
+
+from vsmoddb.client import CacheManager, CachedModDbClient
+
+
+def jpeg(seed:int) -> bytes:
+    image = QImage(600, 400, QImage.Format.Format_RGB32)
+    for x in range(0, 600, 20):
+        image.fill(QColor((seed * 40 + x) % 256, x % 256, (seed * 90) % 256))
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "JPG")
+    return bytes(data)
+
+
+def folder_size(location:str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(location) for name in names)
+
+
+def image_cache(api, tmp_path, budget:int):
+    # importing ui builds its client against the api, so only once BASE_URL points at the stand in
+    from ui.image_cache import ImageCache
+    client = CachedModDbClient(CacheManager(str(tmp_path / "cache")), warm_start=False)
+    urls = []
+    for index in range(6):
+        api.files[f"logo{index}.jpg"] = jpeg(index)
+        urls.append(f"{api.url}/files/logo{index}.jpg")
+    return ImageCache(str(tmp_path / "images"), client, budget=budget), client, urls
+
+
+def test_originals_skip_the_response_cache(stand_in_api, tmp_path):
+    cache, client, urls = image_cache(stand_in_api, tmp_path, 64 * 1024 * 1024)
+    assert not cache.get_scaled(urls[0], 280).isNull()
+    assert client.cache_manager.lookup(urls[0]) is None
+    assert not cache.get_scaled(urls[0], 200).isNull()
+    assert stand_in_api.count("/files/") == 1
+
+
+def test_image_folder_stays_under_budget(stand_in_api, tmp_path):
+    probe, _, urls = image_cache(stand_in_api, tmp_path / "probe", 64 * 1024 * 1024)
+    probe.get_scaled(urls[0], 280)
+    entry_size = folder_size(probe.location)
+
+    budget = int(entry_size * 3.5)
+    cache, _, urls = image_cache(stand_in_api, tmp_path, budget)
+    for url in urls:
+        assert not cache.get_scaled(url, 280).isNull()
+        assert folder_size(cache.location) <= budget
+        assert cache.usage == folder_size(cache.location)
+    assert cache.evictions >= 2
+    assert os.path.exists(cache.entry_path(urls[-1]))
+    assert not os.path.exists(cache.entry_path(urls[0]))
+
+    # a smaller budget applies right away
+    cache.set_budget(entry_size)
+    assert folder_size(cache.location) <= entry_size * 1.5
@@ -0,0 +1,60 @@
+import pytest
+
+from vsmoddb.metrics import LATENCY_BUCKETS, EndpointMetrics, RequestMetrics, RequestTimer, api_endpoint, url_endpoint
+
+
+def test_endpoint_names_fold_ids():
+    assert api_endpoint("mod/123") == api_endpoint("/mod/7/") == "api/mod/{id}"
+    assert api_endpoint("comments/42") == "api/comments/{id}"
+    # string ids and numbers inside a segment are left alone
+    assert api_endpoint("mod/carryon") == "api/mod/carryon"
+    assert api_endpoint("mod/12abc") == "api/mod/12abc"
+    assert api_endpoint("mods") == "api/mods"
+    assert url_endpoint("fetch", "https://moddbcdn.vintagestory.at/12/logo.png") == "fetch moddbcdn.vintagestory.at/12"
+    assert url_endpoint("download", "/files/mod.zip") == "download /files"
+
+
+def endpoint_with(latencies:list[float]) -> EndpointMetrics:
+    metrics = RequestMetrics()
+    for seconds in latencies:
+        metrics.record_request("api/mods", seconds)
+    return metrics.endpoint("api/mods")
+
+
+def test_latency_percentiles():
+    assert endpoint_with([]).latency_percentile(0.5) == 0.0
+    assert endpoint_with([]).to_dict()["latency_mean"] == 0.0
+    # everything slower than the last bound: the slowest request seen
+    assert endpoint_with([20.0, 30.0]).latency_percentile(0.5) == 30.0
+    assert endpoint_with([20.0]).latency_buckets[-1] == 1
+    # a bound is the upper end of its own bucket, and nothing is reported slower than the slowest request
+    assert endpoint_with([LATENCY_BUCKETS[0]]).latency_buckets[0] == 1
+    assert endpoint_with([0.01]).latency_percentile(0.5) == 0.01
+    metrics = endpoint_with([0.01] * 9 + [3.0])
+    assert metrics.latency_percentile(0.5) == LATENCY_BUCKETS[0]
+    assert metrics.latency_percentile(0.95) == 3.0
+    assert metrics.to_dict()["latency_histogram"] == {
+        **{f"le_{bound}": 0 for bound in LATENCY_BUCKETS}, "le_0.025": 9, "le_5.0": 1, "inf": 0
+    }
+
+
+def test_request_timer_errors():
+    metrics = RequestMetrics()
+    with RequestTimer(metrics, "fine") as timer:
+        timer.size = 10
+    with pytest.raises(ValueError):
+        with RequestTimer(metrics, "failed"):
+            raise ValueError("broken")
+
+    def streamed():
+        with RequestTimer(metrics, "closed early"):
+            yield 1
+            yield 2
+    generator = streamed()
+    next(generator)
+    generator.close() # GeneratorExit leaves the block, the consumer just stopped reading
+
+    endpoints = {name: (endpoint.requests, endpoint.errors) for name, endpoint in metrics.endpoints.items()}
+    assert endpoints == {"fine": (1, 0), "failed": (1, 1), "closed early": (1, 0)}
+    assert metrics.endpoint("fine").bytes == 10
+    assert metrics.totals()["errors"] == 1
@@ -0,0 +1,110 @@
+import io
+import os
+import threading
+import zipfile
+
+from mod_store import ModStore
+from vsmoddb.client import ModDbClient
+
+
+def mod_zip(size:int = 200_000) -> bytes:
+    data = io.BytesIO()
+    with zipfile.ZipFile(data, 'w', zipfile.ZIP_STORED) as zip_file:
+        zip_file.writestr("modinfo.json", '{"modid": "stored"}')
+        zip_file.writestr("assets/blob.bin", os.urandom(size))
+    return data.getvalue()
+
+
+def fetch_concurrently(store:ModStore, url:str, callers:int = 16) -> tuple[list, list]:
+    client = ModDbClient(warm_start=False)
+    results = []
+    errors = []
+    start = threading.Barrier(callers)
+
+    def fetch():
+        start.wait()
+        try:
+            results.append(store.fetch_object(client, url))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=fetch) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, errors
+
+
+def test_concurrent_fetches_download_once(stand_in_api, tmp_path):
+    stand_in_api.files["stored.zip"] = mod_zip()
+    stand_in_api.delay = 0.2 # every caller arrives while the first download is still running
+    store = ModStore(str(tmp_path / ".store"))
+    url = f"{stand_in_api.url}/files/stored.zip"
+
+    results, errors = fetch_concurrently(store, url)
+    assert errors == []
+    assert len(set(results)) == 1 and results[0] is not None
+    assert stand_in_api.count("/files/") == 1
+    with open(results[0], 'rb') as f:
+        assert f.read() == stand_in_api.files["stored.zip"]
+    assert os.listdir(store.temp_location) == []
+    assert store._in_flight == {}
+
+
+def test_concurrent_fetches_share_a_failure(stand_in_api, tmp_path):
+    stand_in_api.files["broken.zip"] = b"not a zip at all"
+    stand_in_api.delay = 0.2
+    store = ModStore(str(tmp_path / ".store"))
+
+    results, errors = fetch_concurrently(store, f"{stand_in_api.url}/files/broken.zip")
+    assert errors == [] and results == [None] * 16
+    assert stand_in_api.count("/files/") == 1
+    assert store._in_flight == {}
+
+
+def test_prune_drops_objects_nothing_links_to(stand_in_api, tmp_path):
+    downloads = tmp_path / "mods"
+    game_mods = tmp_path / "Mods"
+    downloads.mkdir()
+    game_mods.mkdir()
+    store = ModStore(str(downloads / ".store"))
+    client = ModDbClient(warm_start=False)
+    urls = {}
+    for name in ("kept", "enabled", "symlinked", "deleted", "only_read"):
+        stand_in_api.files[f"{name}.zip"] = mod_zip(1000)
+        urls[name] = f"{stand_in_api.url}/files/{name}.zip"
+
+    assert store.fetch_to_file(client, urls["kept"], str(downloads / "kept.zip"))
+    assert store.fetch_to_file(client, urls["enabled"], str(downloads / "enabled.zip"))
+    os.rename(downloads / "enabled.zip", game_mods / "enabled.zip") # what enabling a mod does
+    symlinked = store.fetch_object(client, urls["symlinked"])
+    os.symlink(symlinked, downloads / "symlinked.zip")
+    assert store.fetch_to_file(client, urls["deleted"], str(downloads / "deleted.zip"))
+    os.remove(downloads / "deleted.zip")
+    assert store.fetch_object(client, urls["only_read"]) is not None # fetched for its modinfo, never installed
+
+    assert store.prune([str(downloads), str(game_mods)]) == 2
+    assert sorted(store.index) == sorted([urls["kept"], urls["enabled"], urls["symlinked"]])
+    assert len(store.list_objects()) == 3
+    for name in ("kept", "enabled", "symlinked"):
+        assert store.lookup(urls[name]) is not None
+    with open(downloads / "symlinked.zip", 'rb') as f:
+        assert f.read() == stand_in_api.files["symlinked.zip"]
+    # the index on disk agrees
+    assert sorted(ModStore(str(downloads / ".store")).index) == sorted(store.index)
+
+    # once the last file linking to an object is gone, so is the object
+    os.remove(game_mods / "enabled.zip")
+    assert store.prune([str(downloads), str(game_mods)]) == 1
+    assert store.lookup(urls["enabled"]) is None
+
+
+def test_prune_waits_for_files_being_placed(tmp_path):
+    store = ModStore(str(tmp_path / ".store"))
+    with store._placement:
+        store._placing += 1
+    assert store.prune([str(tmp_path)]) == 0
+    with store._placement:
+        store._placing -= 1
+    assert store.prune([str(tmp_path)]) == 0 and not store._pruning
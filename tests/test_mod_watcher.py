@@ -0,0 +1,146 @@
+import json
+import os
+import time
+import zipfile
+
+import pytest
+from PySide6.QtCore import QCoreApplication
+from PySide6.QtWidgets import QApplication
+
+
+def write_mod(directory:str, mod_id:str, version:str = "1.0.0") -> str:
+    path = os.path.normpath(os.path.join(directory, f"{mod_id}.zip"))
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        zip_file.writestr("modinfo.json", json.dumps({"type": "code", "modid": mod_id, "name": mod_id, "version": version}))
+    return path
+
+
+@pytest.fixture
+def watcher(stand_in_api, monkeypatch):
+    # importing ui builds its client against the api, so only once BASE_URL points at the stand in
+    app = QApplication.instance() or QApplication([])
+    from ui import mod_watcher, user_settings
+    parsed = []
+    get_mod_info = mod_watcher.get_mod_info
+    def counting_get_mod_info(mod_path, *args, **kwargs):
+        parsed.append(mod_path)
+        return get_mod_info(mod_path, *args, **kwargs)
+    monkeypatch.setattr(mod_watcher, "get_mod_info", counting_get_mod_info)
+    monkeypatch.setattr(user_settings, "downloaded_mods", [])
+    watcher = mod_watcher.ModWatcher()
+    events = []
+    watcher.mod_added.connect(lambda mod: events.append(("added", mod)))
+    watcher.mod_changed.connect(lambda old, new: events.append(("changed", old, new)))
+    watcher.mod_removed.connect(lambda mod: events.append(("removed", mod)))
+    yield watcher, mod_watcher, user_settings, parsed, events
+    mod_watcher.registered_downloads.clear()
+    for directory in (watcher.download_directory, watcher.game_mods_directory):
+        for mod_path in mod_watcher.list_mod_files(directory):
+            os.remove(mod_path)
+
+
+def settle(watcher, directory:str):
+    # what the debounce timer ends up doing, then waits for the parse worker to hand its results back
+    from ui import thread_pool
+    watcher.on_directory_changed(directory)
+    watcher.process_changes()
+    thread_pool.waitForDone()
+    deadline = time.monotonic() + 5
+    while watcher.parse_worker is not None and time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+    QCoreApplication.processEvents()
+
+
+def test_watcher_skips_registered_downloads(watcher):
+    watcher, mod_watcher, user_settings, parsed, events = watcher
+    mod_path = write_mod(watcher.download_directory, "fresh")
+    local_mod = mod_watcher.register_download(mod_path)
+    assert user_settings.get_mod_at_path(mod_path) is local_mod
+
+    watcher.on_directory_changed(watcher.download_directory)
+    watcher.process_changes()
+    assert watcher.parse_worker is None # nothing left to parse
+    assert parsed == [mod_path] and events == []
+
+    # downloaded again over the same path: registered again, still parsed only once
+    os.remove(mod_path)
+    write_mod(watcher.download_directory, "fresh", "1.1.0")
+    updated = mod_watcher.register_download(mod_path)
+    watcher.on_directory_changed(watcher.download_directory)
+    watcher.process_changes()
+    assert watcher.parse_worker is None
+    assert updated.version == "1.1.0" and user_settings.downloaded_mods == [updated]
+    assert len(parsed) == 2 and events == []
+
+
+def test_download_registered_after_the_watcher_parsed_it(watcher):
+    watcher, mod_watcher, user_settings, parsed, events = watcher
+    mod_path = write_mod(watcher.download_directory, "early")
+    signature = mod_watcher.path_signature(mod_path)
+    watcher.apply_parsed_mods(mod_watcher.parse_mod_files([(mod_path, signature)]))
+    assert [event[0] for event in events] == ["added"]
+
+    # the downloader reuses what the watcher parsed instead of opening the zip again
+    local_mod = mod_watcher.register_download(mod_path)
+    assert local_mod is events[0][1]
+    assert parsed == [mod_path] and user_settings.downloaded_mods == [local_mod]
+
+
+def test_parse_finishing_after_registration_is_dropped(watcher):
+    watcher, mod_watcher, user_settings, parsed, events = watcher
+    mod_path = write_mod(watcher.download_directory, "racing")
+    results = mod_watcher.parse_mod_files([(mod_path, mod_watcher.path_signature(mod_path))])
+    local_mod = mod_watcher.register_download(mod_path)
+    watcher.apply_parsed_mods(results)
+    assert user_settings.downloaded_mods == [local_mod] and events == []
+
+
+def test_deleted_zip_is_removed(watcher):
+    watcher, mod_watcher, user_settings, parsed, events = watcher
+    mod_path = write_mod(watcher.download_directory, "doomed")
+    settle(watcher, watcher.download_directory)
+    local_mod = user_settings.get_mod_at_path(mod_path)
+    assert [event[0] for event in events] == ["added"] and mod_path in user_settings.scan_index.entries
+
+    os.remove(mod_path)
+    settle(watcher, watcher.download_directory)
+    assert events[1:] == [("removed", local_mod)]
+    assert user_settings.downloaded_mods == []
+    assert mod_path not in user_settings.scan_index.entries
+
+
+def test_zip_rewritten_in_place_is_changed(watcher):
+    watcher, mod_watcher, user_settings, parsed, events = watcher
+    mod_path = write_mod(watcher.download_directory, "rewritten")
+    settle(watcher, watcher.download_directory)
+    old_mod = user_settings.get_mod_at_path(mod_path)
+    inode = os.stat(mod_path).st_ino
+
+    write_mod(watcher.download_directory, "rewritten", "1.10.0")
+    assert os.stat(mod_path).st_ino == inode # same file, new contents
+    settle(watcher, watcher.download_directory)
+    assert [event[0] for event in events] == ["added", "changed"]
+    _, changed_from, changed_to = events[1]
+    assert changed_from is old_mod and changed_to.version == "1.10.0"
+    assert user_settings.downloaded_mods == [changed_to] and not changed_to.is_enabled
+    signature, indexed = user_settings.scan_index.entries[mod_path]
+    assert signature == mod_watcher.path_signature(mod_path) and indexed.version == "1.10.0"
+
+
+def test_zip_dropped_into_game_mods_is_added_enabled(watcher):
+    watcher, mod_watcher, user_settings, parsed, events = watcher
+    os.makedirs(watcher.game_mods_directory, exist_ok=True)
+    mod_path = write_mod(watcher.game_mods_directory, "dropped")
+    settle(watcher, watcher.game_mods_directory)
+
+    assert [event[0] for event in events] == ["added"]
+    local_mod = events[0][1]
+    assert user_settings.downloaded_mods == [local_mod] and local_mod.is_enabled
+    assert local_mod.current_path == mod_path
+    assert local_mod.install_location == os.path.join(user_settings.mod_download_location, "dropped.zip")
+    assert mod_path in user_settings.scan_index.entries
+
+    os.remove(mod_path)
+    settle(watcher, watcher.game_mods_directory)
+    assert [event[0] for event in events] == ["added", "removed"]
+    assert mod_path not in user_settings.scan_index.entries
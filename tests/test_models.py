@@ -0,0 +1,156 @@
+import gc
+import json
+import pickle
+import time
+import tracemalloc
+from datetime import datetime
+
+import pytest
+
+from stand_in_api import full_mod
+from vsmoddb.client import BaseModDbClient
+from vsmoddb.models import Mod, PartialMod, ModSupportSide, parse_datetime
+from test_registry import registry_client
+
+
+def split_datetime(string:str) -> datetime:
+    raw = string.split(' ', 1)
+    year = raw[0].split('-')
+    time = raw[1].split(':')
+    return datetime(int(year[0]), int(year[1]), int(year[2]), int(time[0]), int(time[1]), int(time[2]))
+
+
+class DictPartialMod:
+    # PartialMod as it was before slots: a __dict__ per mod and every field decoded up front
+    def __init__(self, raw:dict, tags:list, author):
+        self.mod_id = int(raw['modid'])
+        self.asset_id = int(raw['assetid'])
+        self.downloads = int(raw['downloads'])
+        self.follows = int(raw['follows'])
+        self.trending_points = int(raw['trendingpoints'])
+        self.comments = int(raw['comments'])
+        self.name = str(raw['name'])
+        self.summary = str(raw['summary'])
+        self.mod_id_strs = raw['modidstrs']
+        self.author = author
+        self.url_alias = str(raw['urlalias'])
+        self.side = ModSupportSide.match(raw['side'])
+        self.type = str(raw['type'])
+        self.logo = str(raw['logo'])
+        self.tags = tags
+        self.last_released = split_datetime(raw['lastreleased'])
+
+
+def hydrate_dict_partial_mods(client:BaseModDbClient, raw_mods:list[dict]) -> list:
+    mods = []
+    for raw_mod in raw_mods:
+        tags = [client.tag_from_name(tag) for tag in raw_mod['tags']]
+        mods.append(DictPartialMod(raw_mod, tags, client.user_from_name(raw_mod['author'])))
+    return mods
+
+
+def hydrate_partial_mods(client:BaseModDbClient, raw_mods:list[dict], batch_size:int = None) -> list:
+    # all at once like get_mods, or in the batches a streamed response is hydrated in
+    mods = []
+    batch_size = batch_size or len(raw_mods)
+    for start in range(0, len(raw_mods), batch_size):
+        client.add_partial_mods(mods, raw_mods[start:start + batch_size])
+    return mods
+
+
+def hydrate_catalog(payload:bytes, hydrate) -> tuple[list, int, int]:
+    # (mods, bytes the models themselves allocate, bytes kept alive once the parsed json is dropped)
+    # the second number also counts the names, summaries, urls and numbers the models share with the parsed json
+    gc.collect()
+    tracemalloc.start()
+    raw_mods = json.loads(payload)["mods"]
+    before = tracemalloc.get_traced_memory()[0]
+    mods = hydrate(raw_mods)
+    allocated = tracemalloc.get_traced_memory()[0] - before
+    del raw_mods
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return mods, allocated, retained
+
+
+def untraced_time(payload:bytes, hydrate) -> float:
+    # tracemalloc slows allocation down a lot, the time is taken again without it
+    raw_mods = json.loads(payload)["mods"]
+    start = time.perf_counter()
+    hydrate(raw_mods)
+    return time.perf_counter() - start
+
+
+def test_invalid_dates_fail_while_building():
+    client = BaseModDbClient()
+    raw_mod = {
+        "modid": 1, "assetid": 2, "downloads": 3, "follows": 4, "trendingpoints": 5, "comments": 6, "name": "a",
+        "summary": "b", "modidstrs": ["a"], "author": "x", "urlalias": None, "side": "both", "type": "mod",
+        "logo": "https://x/logo.png", "tags": [], "lastreleased": "2024-01-01 00:00:00",
+    }
+    mods = []
+    client.add_partial_mod(mods, raw_mod)
+    client.add_partial_mod(mods, dict(raw_mod, modid=7, lastreleased=None))
+    client.add_partial_mod(mods, dict(raw_mod, modid=8, lastreleased="yesterday"))
+    assert [mod.mod_id for mod in mods] == [1]
+    assert mods[0].last_released == datetime(2024, 1, 1)
+
+    raw_full = full_mod(raw_mod)
+    raw_full["releases"][0]["created"] = "not a date"
+    mod = client.build_mod(raw_full)
+    assert [release.mod_version for release in mod.releases] == ["1.1.0", "1.0.0"]
+
+
+def test_models_round_trip_through_pickle(catalog):
+    client = registry_client(BaseModDbClient, catalog)
+    mods = []
+    client.add_partial_mod(mods, catalog["mods"][0])
+    mod = client.build_mod(full_mod(catalog["mods"][0]))
+    restored_partial, restored = pickle.loads(pickle.dumps((mods[0], mod)))
+    assert restored_partial.last_released == mods[0].last_released
+    assert restored_partial.side == mods[0].side
+    assert [release.created for release in restored.releases] == [release.created for release in mod.releases]
+    assert isinstance(restored, Mod) and isinstance(restored_partial, PartialMod)
+
+
+def test_old_lazy_pickles_still_decode():
+    # models pickled while dates were still kept as strings
+    mod = PartialMod.__new__(PartialMod)
+    mod.__setstate__({"mod_id": 1, "_last_released": "2024-02-03 04:05:06", "_type": "mod"})
+    assert mod.last_released == parse_datetime("2024-02-03 04:05:06")
+    assert mod.type == "mod"
+
+
+@pytest.mark.benchmark
+def test_catalog_memory_and_hydration_time(catalog):
+    client = registry_client(BaseModDbClient, catalog)
+    payload = json.dumps({"statuscode": "200", "mods": catalog["mods"]}).encode()
+    hydrate_old = lambda raw_mods: hydrate_dict_partial_mods(client, raw_mods)
+    hydrate_new = lambda raw_mods: hydrate_partial_mods(client, raw_mods)
+    hydrate_streamed = lambda raw_mods: hydrate_partial_mods(client, raw_mods, 100)
+    # the registry keeps one tags tuple per combination of tag names for as long as it lives, filled in before measuring
+    # so both numbers are what hydrating another response costs
+    hydrate_new(json.loads(payload)["mods"])
+
+    old_mods, old_allocated, old_retained = hydrate_catalog(payload, hydrate_old)
+    new_mods, new_allocated, new_retained = hydrate_catalog(payload, hydrate_new)
+    streamed_mods, _, streamed_retained = hydrate_catalog(payload, hydrate_streamed)
+    old_time = min(untraced_time(payload, hydrate_old) for _ in range(5))
+    new_time = min(untraced_time(payload, hydrate_new) for _ in range(5))
+    streamed_time = min(untraced_time(payload, hydrate_streamed) for _ in range(5))
+
+    print(
+        f"\n{len(new_mods)} mods, dict models -> column backed models (streamed in batches of 100)"
+        f"\nallocated by the models: {old_allocated / 1e6:.2f}MB -> {new_allocated / 1e6:.2f}MB ({old_allocated / new_allocated:.1f}x)"
+        f"\nkept alive once the json is dropped: {old_retained / 1e6:.2f}MB -> {new_retained / 1e6:.2f}MB ({old_retained / new_retained:.1f}x)"
+        f" ({streamed_retained / 1e6:.2f}MB, {old_retained / streamed_retained:.1f}x)"
+        f"\nhydration: {old_time * 1000:.1f}ms -> {new_time * 1000:.1f}ms ({old_time / new_time:.1f}x) ({streamed_time * 1000:.1f}ms, {old_time / streamed_time:.1f}x)"
+    )
+    for mods in (new_mods, streamed_mods):
+        assert [(mod.mod_id, mod.name, mod.summary, mod.logo, mod.mod_id_strs, mod.last_released, mod.downloads) for mod in mods] == [
+            (mod.mod_id, mod.name, mod.summary, mod.logo, mod.mod_id_strs, mod.last_released, mod.downloads) for mod in old_mods
+        ]
+    assert new_retained * 2 < old_retained and streamed_retained * 2 < old_retained
+    # a bit under half of it is spent looking up the mod id, downloads, follows... keys row by row, which no layout avoids
+    assert new_time * 1.25 < old_time and streamed_time * 1.25 < old_time
@@ -0,0 +1,108 @@
+import time
+
+import pytest
+
+from vsmoddb.client import BaseModDbClient
+from vsmoddb.models import Tag, User
+from vsmoddb.registry import ModDbRegistry
+
+
+class LinearLookups(BaseModDbClient):
+    # the lookups as they were before the registry, scanning the lists on every call
+    tag_lookups = 0
+    def tag_from_id(self, id:int) -> Tag | None:
+        for tag in self.tags + self.versions:
+            if tag.id == id:
+                return tag
+        return None
+
+    def tag_from_name(self, name:str) -> Tag | None:
+        self.tag_lookups += 1
+        for tag in self.tags + self.versions:
+            if tag.name == name:
+                return tag
+        return None
+
+    def tags_from_names(self, names:list[str]) -> tuple[Tag | None, ...]:
+        return tuple(self.tag_from_name(name) for name in names)
+
+    def tag_lists_from_names(self, name_lists:list[list[str]]) -> list[tuple[Tag | None, ...]]:
+        return [self.tags_from_names(names) for names in name_lists]
+
+    def user_from_id(self, id:int) -> User | None:
+        for user in self.authors:
+            if user.user_id == id:
+                return user
+        return None
+
+    def user_from_name(self, name:str) -> User | None:
+        for user in self.authors:
+            if user.name == name:
+                return user
+        return None
+
+    def users_from_names(self, names:list[str]) -> list[User | None]:
+        return [self.user_from_name(name) for name in names]
+
+
+def registry_client(client_class, catalog:dict[str, list[dict]]) -> BaseModDbClient:
+    client = client_class()
+    tags, versions, authors = [], [], []
+    for tag in catalog["tags"]:
+        client.add_tag(tags, tag)
+    for version in catalog["gameversions"]:
+        client.add_game_version(versions, version)
+    for author in catalog["authors"]:
+        client.add_user(authors, author)
+    client.registry.update(tags=tags, versions=versions, authors=authors)
+    return client
+
+
+def hydrate(client:BaseModDbClient, raw_mods:list[dict]) -> tuple[list, float]:
+    start = time.perf_counter()
+    mods = []
+    client.add_partial_mods(mods, raw_mods)
+    return mods, time.perf_counter() - start
+
+
+def test_lookups_by_id_and_name():
+    tags = [Tag(1, "Storage", "#fff", type=None), Tag(2, "QoL", "#fff", type=None)]
+    authors = [User(5, "Tyron"), User(6, "Saraty")]
+    registry = ModDbRegistry(tags=tags, authors=authors)
+    assert registry.tag_from_id(2) is tags[1]
+    assert registry.tag_from_name("Storage") is tags[0]
+    assert registry.user_from_id(6) is authors[1]
+    assert registry.user_from_name("Tyron") is authors[0]
+    assert registry.tag_from_name("missing") is None
+    assert registry.user_from_id(99) is None
+
+
+def test_update_swaps_only_the_given_lists():
+    registry = ModDbRegistry(tags=[Tag(1, "Storage", "#fff", type=None)], authors=[User(5, "Tyron")])
+    before = registry.snapshot
+    registry.update(authors=[User(7, "Radfast")])
+    assert registry.snapshot is not before
+    assert before.users_by_name.keys() == {"Tyron"} # readers holding the old snapshot keep a consistent view
+    assert registry.user_from_name("Radfast").user_id == 7
+    assert registry.tag_from_name("Storage").id == 1
+
+
+@pytest.mark.benchmark
+def test_hydrating_10k_mods(catalog):
+    indexed = registry_client(BaseModDbClient, catalog)
+    linear = registry_client(LinearLookups, catalog)
+    raw_mods = catalog["mods"]
+
+    indexed_mods, indexed_time = hydrate(indexed, raw_mods)
+    # the linear version is timed on a slice, the full catalog takes long enough to slow the suite down
+    sample = raw_mods[:1000]
+    linear_mods, linear_time = hydrate(linear, sample)
+    linear_time *= len(raw_mods) / len(sample)
+
+    print(f"\nhydrating {len(raw_mods)} mods: indexed {indexed_time * 1000:.1f}ms, linear ~{linear_time * 1000:.0f}ms ({linear_time / indexed_time:.0f}x)")
+    assert len(indexed_mods) == len(raw_mods)
+    # the baseline really went through its own linear tag lookups, and found the same tags
+    assert linear.tag_lookups == sum(len(raw_mod["tags"]) for raw_mod in sample)
+    assert [[tag.name for tag in mod.tags] for mod in linear_mods] == [[tag.name for tag in mod.tags] for mod in indexed_mods[:len(sample)]]
+    assert all(mod.author is not None for mod in indexed_mods)
+    assert linear_time / indexed_time > 10
@@ -0,0 +1,79 @@
+import functools
+import threading
+
+import pytest
+
+import vsmoddb.client
+from vsmoddb.client import CacheManager, CachedModDbClient
+from vsmoddb.models import SearchOrderBy, SearchOrderDirection
+from stand_in_api import StandInApi, synthetic_catalog
+
+
+@pytest.fixture(params=["etag", "last_modified", "none"])
+def api(request, monkeypatch):
+    api = StandInApi(synthetic_catalog(200, 50), validators=request.param).start()
+    monkeypatch.setattr(vsmoddb.client, "BASE_URL", api.url)
+    yield api
+    api.stop()
+
+
+def revalidate(client:CachedModDbClient, get_params:str):
+    # what a stale hit does in the background, run in place
+    key = f"mods_{get_params}"
+    client._revalidate(key, functools.partial(client.fetch_api, key, "mods", get_params))
+
+
+def test_unchanged_response_keeps_hydrated_models(api, tmp_path):
+    client = CachedModDbClient(CacheManager(str(tmp_path)), warm_start=False)
+    get_params = client.mods_get_params()
+    mods = client.get_mods()
+    assert api.count("/api/mods", 200) == 1
+
+    revalidate(client, get_params)
+    if api.validators == "none":
+        # nothing to send a conditional request with, the body hash shows it is the same response
+        assert api.count("/api/mods", 200) == 2
+    else:
+        assert api.count("/api/mods", 304) == 1
+        headers = api.requests[-1][2]
+        assert headers.get("If-None-Match" if api.validators == "etag" else "If-Modified-Since") is not None
+
+    # the cached response object is kept, so the memo hands back the very same models without hydrating again
+    again = client.get_mods()
+    assert all(a is b for a, b in zip(mods, again)) and len(mods) == len(again)
+
+
+def test_changed_response_is_hydrated_again(api, tmp_path):
+    client = CachedModDbClient(CacheManager(str(tmp_path)), warm_start=False)
+    get_params = client.mods_get_params()
+    client.get_mods()
+
+    api.catalog["mods"][0] = {**api.catalog["mods"][0], "downloads": 123456789}
+    api.version += 1
+    revalidate(client, get_params)
+    assert api.count("/api/mods", 304) == 0
+    changed = client.get_mods()
+    assert any(mod.downloads == 123456789 for mod in changed)
+
+
+def test_hydrated_memo_under_concurrent_readers(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(vsmoddb.client, "HYDRATED_MEMO_SIZE", 3)
+    client = CachedModDbClient(CacheManager(str(tmp_path)), warm_start=False)
+    queries = [(orderby, direction) for orderby in SearchOrderBy for direction in SearchOrderDirection]
+    errors = []
+
+    def reader(offset:int):
+        try:
+            for index in range(40):
+                orderby, direction = queries[(offset + index) % len(queries)]
+                assert len(client.get_mods(orderby=orderby, order_direction=direction)) == len(api.catalog["mods"])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=reader, args=(offset,)) for offset in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(client.hydrated) <= 3
@@ -0,0 +1,96 @@
+import json
+import os
+import random
+import time
+import zipfile
+
+import pytest
+
+from mod_info_parser import ScanIndex, scan_mod_directory
+
+MOD_COUNT = 300
+BROKEN = ("broken_truncated.zip", "broken_no_modinfo.zip")
+
+
+def write_mod(path:str, index:int, rng:random.Random):
+    # roughly the shape of a real mod: modinfo, a png icon (stored, pngs don't deflate) and a pile of compressed assets
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr("modinfo.json", json.dumps({
+            "type": "code", "modid": f"mod{index}", "name": f"Mod {index}", "version": f"1.{index % 7}.0",
+            "authors": [f"author{index % 40}"], "description": "generated for the scan benchmark",
+            "dependencies": {"game": "1.20.0", f"mod{(index + 1) % MOD_COUNT}": "*"} if index % 3 == 0 else {"game": "1.20.0"},
+        }))
+        zip_file.writestr("modicon.png", rng.randbytes(rng.randint(4, 40) * 1024), compress_type=zipfile.ZIP_STORED)
+        for asset in range(rng.randint(10, 60)):
+            zip_file.writestr(f"assets/mod{index}/textures/block/{asset}.json", json.dumps({"code": f"block{asset}", "variants": list(range(rng.randint(10, 200)))}))
+
+
+@pytest.fixture(scope="module")
+def mod_directory(tmp_path_factory) -> str:
+    directory = tmp_path_factory.mktemp("scan")
+    rng = random.Random(21)
+    for index in range(MOD_COUNT):
+        write_mod(str(directory / f"mod{index}.zip"), index, rng)
+    with open(directory / BROKEN[0], 'wb') as f:
+        with open(directory / "mod0.zip", 'rb') as source:
+            f.write(source.read()[:500])
+    with zipfile.ZipFile(directory / BROKEN[1], 'w') as zip_file:
+        zip_file.writestr("readme.txt", "no modinfo in here")
+    return str(directory)
+
+
+def scanned(mods) -> list[tuple[str, str, str, dict, int]]:
+    return [(os.path.basename(mod.install_location), mod.mod_id_str, mod.version, mod.dependencies, len(mod.icon)) for mod in mods]
+
+
+def timed_scan(directory:str, **options) -> tuple[list, dict, float]:
+    errors = {}
+    start = time.perf_counter()
+    mods = scan_mod_directory(directory, errors=errors, **options)
+    return mods, errors, time.perf_counter() - start
+
+
+def test_scan_modes_agree(mod_directory):
+    serial, serial_errors, _ = timed_scan(mod_directory, max_workers=1)
+    threads, thread_errors, _ = timed_scan(mod_directory, max_workers=8)
+    processes, process_errors, _ = timed_scan(mod_directory, max_workers=4, use_processes=True)
+
+    assert len(serial) == MOD_COUNT
+    assert scanned(serial) == scanned(threads) == scanned(processes)
+    assert [mod.install_location for mod in serial] == sorted(mod.install_location for mod in serial)
+    for errors in (serial_errors, thread_errors, process_errors):
+        assert sorted(os.path.basename(path) for path in errors) == sorted(BROKEN)
+
+
+def test_index_skips_unchanged_zips(mod_directory, tmp_path):
+    index = ScanIndex(str(tmp_path / "scan_index.dat"))
+    first, _, _ = timed_scan(mod_directory, index=index)
+    index.save_to_file()
+
+    reloaded = ScanIndex(str(tmp_path / "scan_index.dat"))
+    again, _, _ = timed_scan(mod_directory, index=reloaded, max_workers=1)
+    assert scanned(first) == scanned(again)
+    assert not reloaded.changed # nothing was opened or stored again
+
+
+@pytest.mark.benchmark
+def test_scan_benchmark(mod_directory, tmp_path):
+    results = {}
+    for name, options in (
+        ("serial", {"max_workers": 1}),
+        ("threads", {}),
+        ("processes", {"use_processes": True}),
+    ):
+        # best of three, the first run also warms the page cache for the others
+        timings = [timed_scan(mod_directory, **options)[2] for _ in range(3)]
+        results[name] = min(timings)
+
+    index = ScanIndex(str(tmp_path / "scan_index.dat"))
+    timed_scan(mod_directory, index=index)
+    _, _, indexed = timed_scan(mod_directory, index=index)
+
+    print(
+        f"\nscanning {MOD_COUNT} zips: serial {results['serial'] * 1000:.0f}ms, threads {results['threads'] * 1000:.0f}ms, "
+        f"processes {results['processes'] * 1000:.0f}ms, unchanged with index {indexed * 1000:.1f}ms ({os.cpu_count()} cpus)"
+    )
+    assert indexed < results["serial"] / 5
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+
+import pytest
+
+from vsmoddb.catalog import ModCatalog
+from vsmoddb.client import BaseModDbClient
+from vsmoddb.models import SearchOrderBy, SearchOrderDirection
+from vsmoddb.search_index import ModSearchIndex, SEARCH_INDEX_FILE, tokenize, within_one_typo
+from test_registry import registry_client
+
+
+def make_mods(client:BaseModDbClient, rows:list[dict]) -> list:
+    mods = []
+    for row in rows:
+        client.add_partial_mod(mods, row)
+    return mods
+
+
+def raw_mod(mod_id:int, name:str, summary:str = "", mod_id_str:str = None, downloads:int = 0) -> dict:
+    return {
+        "modid": mod_id, "assetid": mod_id, "downloads": downloads, "follows": 0, "trendingpoints": 0, "comments": 0,
+        "name": name, "summary": summary, "modidstrs": [mod_id_str or f"mod{mod_id}"], "author": "nobody", "urlalias": None,
+        "side": "both", "type": "mod", "logo": "", "tags": [], "lastreleased": "2024-01-01 00:00:00",
+    }
+
+
+@pytest.fixture
+def small_index() -> tuple[ModSearchIndex, list]:
+    mods = make_mods(BaseModDbClient(), [
+        raw_mod(1, "Better Storage", "more shelves", downloads=10),
+        raw_mod(2, "Storage Plus", "crates", downloads=500),
+        raw_mod(3, "Carry Capacity", "carry more stuff in your storage", "carry_capacity", downloads=900),
+        raw_mod(4, "Тёплые печи", "русский мод про печи", downloads=5),
+        raw_mod(5, "Äpfel und Birnen", "Obstbäume", downloads=7),
+        raw_mod(6, "Storehouse", "a building", downloads=1000),
+    ])
+    index = ModSearchIndex()
+    index.update(mods)
+    return index, mods
+
+
+def test_tokenize_keeps_any_script():
+    assert tokenize("Тёплые ПЕЧИ, Äpfel & carry_capacity Straße") == ["тёплые", "печи", "äpfel", "carry", "capacity", "strasse"]
+
+
+def test_within_one_typo():
+    assert within_one_typo("storage", "storgae") # swapped
+    assert within_one_typo("storage", "stoage") # missing
+    assert within_one_typo("storage", "storagex") # extra
+    assert within_one_typo("storage", "storbge") # replaced
+    assert not within_one_typo("storage", "strogae")
+    assert not within_one_typo("storage", "storehouse")
+
+
+def test_search_ranks_and_matches(small_index):
+    index, _ = small_index
+    assert {mod_id for mod_id, _ in index.search("печи")} == {4}
+    assert {mod_id for mod_id, _ in index.search("äpf")} == {5} # prefix
+    assert {mod_id for mod_id, _ in index.search("capacity")} == {3} # mod id strings split on underscores
+    ranked = [mod_id for mod_id, _ in index.search("storage")]
+    assert set(ranked[:2]) == {1, 2} and ranked[-1] == 3 # names weigh more than summaries
+    assert [mod_id for mod_id, _ in index.search("stroage")] == ranked # one typo away
+    assert index.search("storgae shelves")[0][0] == 1
+    assert index.search("zzzz") == []
+
+
+def test_exact_matches_rank_before_typos(small_index):
+    index, mods = small_index
+    index.update(mods + make_mods(BaseModDbClient(), [raw_mod(7, "Storages", "")]))
+    ranked = [mod_id for mod_id, _ in index.search("storages")]
+    assert ranked[0] == 7
+
+
+def test_saved_index_round_trips(small_index, tmp_path):
+    index, _ = small_index
+    index.save_to_file(str(tmp_path))
+    loaded = ModSearchIndex.load_from_file(str(tmp_path))
+    assert loaded.search("storgae") == index.search("storgae")
+
+
+def test_saved_index_keeps_its_typo_lookup(small_index, tmp_path):
+    index, _ = small_index
+    index.save_to_file(str(tmp_path))
+    assert os.listdir(tmp_path) == [SEARCH_INDEX_FILE] # written next to it and moved into place
+    loaded = ModSearchIndex.load_from_file(str(tmp_path))
+    # loaded with the index, not rebuilt on the first search
+    assert loaded._deletions is not None and loaded._deletions == index.typo_lookup
+
+
+def test_updated_leaves_the_searched_index_alone(small_index):
+    index, mods = small_index
+    assert index.updated(mods) is index
+    postings = {token: dict(posting) for token, posting in index.postings.items()}
+    renamed = make_mods(BaseModDbClient(), [raw_mod(1, "Better Shelves", "more shelves", downloads=10)]) + mods[1:]
+    updated = index.updated(renamed)
+    assert updated is not index and index.postings == postings
+    assert {mod_id for mod_id, _ in index.search("shelves")} == {1}
+    assert {mod_id for mod_id, _ in index.search("storage")} == {1, 2, 3}
+    assert {mod_id for mod_id, _ in updated.search("storage")} == {2, 3}
+    assert len(updated.updated(mods[:3])) == 3 and len(updated) == 6
+
+
+def test_concurrent_catalog_updates_while_searching(catalog, tmp_path):
+    # what two catalog loads racing each other and the search box do to one index
+    client = registry_client(BaseModDbClient, catalog)
+    mods = make_mods(client, catalog["mods"][:2000])
+    shared = ModSearchIndex()
+    shared.update(mods[:1000])
+    errors = []
+
+    def load(part:list):
+        try:
+            for _ in range(3):
+                updated = shared.updated(part)
+                updated.save_to_file(str(tmp_path))
+                updated.typo_lookup
+        except Exception as e:
+            errors.append(e)
+
+    def search():
+        try:
+            for _ in range(50):
+                shared.search("storgae")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=load, args=(mods[1000:],)), threading.Thread(target=load, args=(mods[500:1500],)), threading.Thread(target=search)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(shared) == 1000 and os.listdir(tmp_path) == [SEARCH_INDEX_FILE]
+    assert len(ModSearchIndex.load_from_file(str(tmp_path))) == 1000
+
+
+def test_index_saved_by_an_older_version_is_rebuilt(tmp_path):
+    import pickle
+    with open(tmp_path / SEARCH_INDEX_FILE, "wb") as f:
+        pickle.dump(({"storage": {1: 3.0}}, {1: ((), {"storage": 3.0})}), f)
+    assert len(ModSearchIndex.load_from_file(str(tmp_path))) == 0
+
+
+def test_ranked_select_keeps_the_match_order(small_index):
+    index, mods = small_index
+    catalog = ModCatalog(mods)
+    scores = dict(index.search("storage"))
+    # Better Storage and Storage Plus match equally well, downloads only decides between those two,
+    # Carry Capacity only mentions storage in its summary and stays last despite having more downloads than either
+    descending = [mod.mod_id for mod in catalog.select_ranked(catalog.all_bits, scores, SearchOrderBy.DOWNLOADS, SearchOrderDirection.DESC)]
+    ascending = [mod.mod_id for mod in catalog.select_ranked(catalog.all_bits, scores, SearchOrderBy.DOWNLOADS, SearchOrderDirection.ASC)]
+    assert descending == [2, 1, 3]
+    assert ascending == [1, 2, 3]
+    # filters still apply
+    only_first = catalog.filter_bits(mod_ids=[1])
+    assert [mod.mod_id for mod in catalog.select_ranked(only_first, scores)] == [1]
+
+
+@pytest.mark.benchmark
+def test_query_latency_on_the_full_catalog(catalog, tmp_path):
+    client = registry_client(BaseModDbClient, catalog)
+    mods = make_mods(client, catalog["mods"])
+    index = ModSearchIndex()
+    start = time.perf_counter()
+    index.update(mods)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    index.typo_lookup
+    typo_build_time = time.perf_counter() - start
+    index.save_to_file(str(tmp_path))
+    start = time.perf_counter()
+    loaded = ModSearchIndex.load_from_file(str(tmp_path))
+    load_time = time.perf_counter() - start
+    start = time.perf_counter()
+    loaded.search("storgae")
+    first_search_time = time.perf_counter() - start
+
+    queries = ["storage", "stor", "sto", "kar", "ka", "s", "carry capacity", "wolf cheese trader", "storgae", "smithng pottery", "author12", "mod9999", "zzzz"]
+    catalog_model = ModCatalog(mods)
+    timings = {}
+    for query in queries:
+        # what the ui does per keystroke: the index query and the ranked page of catalog results
+        runs = []
+        for _ in range(10):
+            start = time.perf_counter()
+            catalog_model.select_ranked(catalog_model.all_bits, dict(index.search(query)))
+            runs.append(time.perf_counter() - start)
+        timings[query] = min(runs)
+
+    print(f"\nindexing {len(mods)} mods: {build_time * 1000:.0f}ms, typo lookup {typo_build_time * 1000:.0f}ms, loading it all {load_time * 1000:.0f}ms, first typo search after loading {first_search_time * 1000:.1f}ms, query and ranked select:")
+    for query, elapsed in timings.items():
+        print(f"  {query!r}: {elapsed * 1000:.2f}ms")
+    assert max(timings.values()) < 0.010
+    assert first_search_time < typo_build_time / 4 # nothing left to build after loading
@@ -0,0 +1,56 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from stand_in_api import StandInApi, make_home
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DELAY = 0.5 # seconds every stand-in api request takes
+# starts the app the way main.py does and quits once the first window has painted, pointed at the stand-in api
+LAUNCH_SCRIPT = """
+import sys
+import vsmoddb.client
+vsmoddb.client.BASE_URL = sys.argv[1]
+import main
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import QTimer
+app = QApplication([])
+window = main.MainWindow()
+window.resize(800, 600)
+def first_window():
+    main.report_startup_time()
+    app.quit()
+QTimer.singleShot(0, first_window)
+app.exec()
+"""
+
+
+def time_to_first_window(api_url:str, home:str) -> float:
+    environment = dict(os.environ, HOME=home, PYTHONPATH=os.path.join(REPO_ROOT, "src"), QT_QPA_PLATFORM="offscreen")
+    result = subprocess.run(
+        [sys.executable, "-c", LAUNCH_SCRIPT, api_url],
+        cwd=REPO_ROOT, env=environment, capture_output=True, text=True, timeout=120,
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("Time to first window:"):
+            return float(line.split(":")[1].strip().removesuffix("s"))
+    raise AssertionError(f"the app did not report its startup time\n{result.stdout}\n{result.stderr}")
+
+
+@pytest.mark.benchmark
+def test_time_to_first_window(tmp_path):
+    home = make_home(str(tmp_path))
+    api = StandInApi(delay=API_DELAY).start()
+    try:
+        cold = time_to_first_window(api.url, home) # no registry snapshot yet, tags, versions and authors are fetched
+        warm = time_to_first_window(api.url, home) # starts from the snapshot the cold start saved
+    finally:
+        api.stop()
+
+    print(f"\ntime to first window with {API_DELAY}s per request: cold {cold:.2f}s, warm {warm:.2f}s")
+    # cold start waits for one round trip, the three requests run side by side rather than one after another
+    assert cold - warm < 2 * API_DELAY
+    assert warm < cold
+    assert warm < API_DELAY + 1.5
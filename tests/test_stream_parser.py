@@ -0,0 +1,88 @@
+import codecs
+import json
+import random
+import time
+
+import pytest
+
+from vsmoddb.client import ModDbClient
+from vsmoddb.stream_parser import JsonArrayStreamer
+
+DOCUMENT = {
+    "statuscode": "200",
+    "label": "mods", # the key as a value, before the array
+    "meta": {"mods": [{"not": "these"}], "nested": [[1, [2]], {"mods": []}]},
+    "mods": [
+        {"modid": 1, "name": "Quote \" and backslash \\ and ] and [", "tags": ["a", "b"]},
+        {"modid": 2, "name": "Тёплые печи ☃ ä", "nested": [[1, 2], [{"deep": [3, {"mods": [4]}]}]]},
+        {"modid": 3, "name": "mods", "summary": "\\\"}{][\\", "empty": {}, "none": None, "numbers": [1.5e3, -2, 0]},
+        {"modid": 4, "name": "unicode escape ☃ 😀", "tags": []},
+    ],
+    "after": {"mods": "again", "list": [1, 2]},
+}
+
+
+def stream(text:bytes, cuts:list[int]) -> tuple[list[dict], dict]:
+    # decoded the way ModDbClient.stream_api does, so a cut may fall inside a multi byte character too
+    streamer = JsonArrayStreamer("mods")
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    objects = []
+    start = 0
+    for end in cuts + [len(text)]:
+        objects += streamer.feed(decoder.decode(text[start:end]))
+        start = end
+    objects += streamer.feed(decoder.decode(b"", final=True))
+    return objects, streamer.close()
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_every_single_cut(indent):
+    text = json.dumps(DOCUMENT, ensure_ascii=False, indent=indent).encode()
+    rest = {key: value for key, value in DOCUMENT.items() if key != "mods"}
+    for cut in range(1, len(text)):
+        objects, document = stream(text, [cut])
+        assert objects == DOCUMENT["mods"], cut
+        assert document == {**rest, "mods": []}, cut
+
+
+def test_random_cuts_and_one_byte_chunks():
+    rng = random.Random(4)
+    text = json.dumps(DOCUMENT).encode() # ascii, every escape spelled out
+    for _ in range(200):
+        cuts = sorted(rng.sample(range(1, len(text)), rng.randint(2, 40)))
+        assert stream(text, cuts)[0] == DOCUMENT["mods"]
+    assert stream(text, list(range(1, len(text))))[0] == DOCUMENT["mods"]
+
+
+def test_objects_come_out_as_soon_as_they_are_complete():
+    streamer = JsonArrayStreamer("mods")
+    assert streamer.feed('{"statuscode": "200", "mods": [{"modid": 1}, {"mod') == [{"modid": 1}]
+    assert streamer.feed('id": 2}') == [{"modid": 2}]
+    assert streamer.feed('], "tail": true}') == []
+    assert streamer.close() == {"statuscode": "200", "mods": [], "tail": True}
+
+
+def test_stream_ending_inside_the_array_fails():
+    streamer = JsonArrayStreamer("mods")
+    streamer.feed('{"mods": [{"modid": 1}, {"mo')
+    with pytest.raises(ValueError):
+        streamer.close()
+
+
+def test_get_mods_hands_out_batches_while_the_body_downloads(stand_in_api):
+    client = ModDbClient(warm_start=False)
+    expected = client.get_mods()
+    stand_in_api.trickle = (2048, 0.02)
+
+    batches = []
+    mods = client.get_mods(batch_callback=lambda batch: batches.append((time.monotonic(), list(batch))), batch_size=25)
+    last_write = stand_in_api.last_write["/api/mods"]
+
+    assert len(batches) == len(expected) // 25
+    assert all(len(batch) == 25 for _, batch in batches)
+    # the first batches were handed out while the server was still writing the body
+    assert batches[0][0] < last_write and batches[1][0] < last_write
+    # together they are the full list, in order, and the same list comes back at the end
+    streamed = [mod for _, batch in batches for mod in batch]
+    assert [mod.mod_id for mod in streamed] == [mod.mod_id for mod in expected]
+    assert [mod.mod_id for mod in mods] == [mod.mod_id for mod in expected]